@@ -0,0 +1,112 @@
+"""bench_nesting.py
+
+Stress benchmark for the tree walkers in misc/ on a synthetic schematic that
+is both deep and wide.
+
+The generated (kicad_sch ...) has a chain of nested lib symbols ``--depth``
+levels deep (by default five times Python's recursion limit), each with a
+property, a pin and a misplaced (hide yes) for reformat_kicad to fix, plus
+``--items`` wires and labels whose quoted/wrapped uuids kicad_sch_debug_fix
+rewrites. Every parser, traversal and writer then runs over it and reports
+its time and throughput; any RecursionError fails the run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import compact_tree
+import kicad_sch_debug_fix
+import reformat_kicad
+from cst import loads_cst, parse_raw_cst
+from kicad_sch_debug_fix import head
+from sexpr import Str, dump_kicad, from_raw, loads, parse_raw
+
+_UUID = "01234567-89ab-cdef-0123-{:012x}"
+
+
+def synthetic_schematic(depth: int, items: int) -> str:
+    parts = ['(kicad_sch\n\t(version 20250114)\n\t(generator "eeschema")\n\t(paper "A4")\n\t(lib_symbols\n']
+    for i in range(depth):
+        parts.append(f'\t\t(symbol "Deep:N{i}" (property "Reference" "U" (hide yes) (effects (font (size 1.27 1.27))))'
+                     f' (pin passive line (at 0 {i * 2.54:g} 0) (length 2.54))\n')
+    parts.append(")" * depth + "\n\t)\n")
+    for i in range(items):
+        x = (i % 100) * 2.54
+        y = (i // 100) * 2.54
+        parts.append(f'\t(wire (pts (xy {x:g} {y:g}) (xy {x + 2.54:g} {y:g})) (stroke (width 0) (type default))'
+                     f' (uuid "{_UUID.format(2 * i)}"))\n')
+        parts.append(f'\t(label "N{i}" (at {x:g} {y:g} 0) (effects (font (size 1.27 1.27)) (justify left bottom))'
+                     f' (uuid "{_UUID.format(2 * i + 1)}"))\n')
+    parts.append(")\n")
+    return "".join(parts)
+
+
+def _innermost(root: list) -> list:
+    """The deepest (symbol ...) of the chain, found without recursion."""
+    node = next(x for x in root if head(x) == "lib_symbols")[1]
+    while True:
+        inner = next((x for x in reversed(node) if head(x) == "symbol"), None)
+        if inner is None:
+            return node
+        node = inner
+
+
+def run(text: str) -> List[Tuple[str, float, int]]:
+    """(phase, milliseconds, nodes handled) for every phase."""
+    results: List[Tuple[str, float, int]] = []
+
+    def timed(name: str, fn: Callable[[], object], count: Callable[[object], int]) -> object:
+        t = time.perf_counter()
+        value = fn()
+        results.append((name, (time.perf_counter() - t) * 1000, count(value)))
+        return value
+
+    nodes = timed("loads", lambda: loads(text), lambda r: sum(1 for _ in kicad_sch_debug_fix.walk(r)))
+    n = results[-1][2]
+    raw = timed("parse_raw", lambda: parse_raw(text)[0], lambda r: n)
+    tree = timed("CompactTree", lambda: compact_tree.CompactTree(text), len)
+    timed("CompactTree.to_sexpr", lambda: tree.root.to_sexpr(), lambda r: n)
+    timed("walk", lambda: sum(1 for _ in kicad_sch_debug_fix.walk(nodes)), lambda c: c)
+    timed("collect_issues", lambda: kicad_sch_debug_fix.collect_issues(nodes), lambda r: n)
+    timed("from_raw", lambda: from_raw(raw), lambda r: n)
+    timed("dump_kicad", lambda: dump_kicad(raw), lambda r: n)
+    timed("fix_structure", lambda: reformat_kicad.fix_structure(raw), lambda r: n)
+
+    root, smap = timed("loads_cst", lambda: loads_cst(text), lambda r: n)
+    timed("fix_in_place", lambda: kicad_sch_debug_fix.fix_in_place(root), lambda r: n)
+    # Dirty the whole chain so the source map patches every level.
+    _innermost(root)[1] = Str("Deep:edited")
+    timed("SourceMap.dumps", lambda: smap.dumps([root], kicad_sch_debug_fix.render), lambda r: n)
+    timed("render", lambda: kicad_sch_debug_fix.render(root), lambda r: n)
+
+    items, raw_map = timed("parse_raw_cst", lambda: parse_raw_cst(text), lambda r: n)
+    timed("SourceMap.dumps (unchanged)", lambda: raw_map.dumps(items, dump_kicad), lambda r: n)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Time the misc/ parsers, walkers and writers on a synthetic deep and wide schematic")
+    ap.add_argument("--depth", type=int, default=5 * sys.getrecursionlimit(),
+                    help="Levels of nested lib symbols (default: 5x the recursion limit)")
+    ap.add_argument("--items", type=int, default=5000, help="Number of wires and of labels")
+    ap.add_argument("-o", "--output", default=None, help="Also write the synthetic schematic here")
+    args = ap.parse_args()
+
+    text = synthetic_schematic(args.depth, args.items)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(f"Synthetic schematic: depth {args.depth}, {2 * args.items} items, {len(text) / 1e6:.1f} MB "
+          f"(recursion limit {sys.getrecursionlimit()})")
+    try:
+        results = run(text)
+    except RecursionError as e:
+        print(f"RecursionError: {e}")
+        sys.exit(1)
+    for name, ms, count in results:
+        rate = count / ms / 1000 if ms > 0 else float("inf")
+        print(f"  {name:<28} {ms:9.1f} ms  {rate:6.2f} M nodes/s")
@@ -0,0 +1,145 @@
+"""bench_writer.py
+
+Timing harness for the KiCad writer: sexpr.dump_kicad() and write_kicad()
+against the two dump_kicad() copies they replaced, kept here verbatim (minus
+comments) as the baseline.
+
+The schematic (default src/device.kicad_sch) is parsed once with parse_raw;
+each writer then renders it ``--runs`` times and the best run is reported.
+The same is done for a synthetic tree of nested lists ``--depth`` levels
+deep, which is where building a string per level cost the old writers most.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import Callable, List, Tuple
+
+from sexpr import RawExpr, dump_kicad, parse_raw, write_kicad
+
+
+def isolate_error_dump_kicad(sexp, indent=0):
+    """isolate_error.py's writer before the shared one."""
+    if not isinstance(sexp, list):
+        return str(sexp)
+    if not sexp: return "()"
+    head = sexp[0]
+    s = "\t" * indent + "(" + str(head)
+    is_complex = False
+    for item in sexp[1:]:
+        if isinstance(item, list):
+            is_complex = True
+            break
+    if not is_complex:
+        for item in sexp[1:]:
+            s += " " + str(item)
+        s += ")"
+        return s
+    for item in sexp[1:]:
+        if not isinstance(item, list):
+            s += " " + str(item)
+    for item in sexp[1:]:
+        if isinstance(item, list):
+            s += "\n" + isolate_error_dump_kicad(item, indent + 1)
+    s += "\n" + "\t" * indent + ")"
+    return s
+
+
+def reformat_kicad_dump_kicad(sexp, indent=0):
+    """reformat_kicad.py's writer before the shared one."""
+    if not isinstance(sexp, list):
+        return str(sexp)
+    if not sexp: return "()"
+    head = sexp[0]
+    oneline = False
+    if head in ['at', 'size', 'offset', 'xy', 'pts', 'start', 'end', 'stroke', 'fill', 'uuid', 'version', 'generator', 'generator_version', 'paper', 'date', 'rev', 'company', 'comment', 'page', 'path', 'exclude_from_sim', 'in_bom', 'on_board', 'dnp', 'fields_autoplaced', 'embedded_fonts', 'pin_names']:
+        if head != 'pin_names':
+            oneline = True
+            for item in sexp[1:]:
+                 if isinstance(item, list):
+                      if item[0] in ['effects', 'font']:
+                           oneline = False
+    s = "\t" * indent + "(" + head
+    atoms = []
+    lists = []
+    for item in sexp[1:]:
+        if isinstance(item, list):
+            lists.append(item)
+        else:
+            atoms.append(item)
+    if atoms:
+        s += " " + " ".join(atoms)
+    if oneline and not lists:
+        s += ")"
+        return s
+    if lists:
+        if head == 'pts':
+            s += "\n"
+            for l in lists:
+                s += reformat_kicad_dump_kicad(l, indent + 1) + "\n"
+            s += "\t" * indent + ")"
+            return s.strip()
+        for l in lists:
+             s += "\n" + reformat_kicad_dump_kicad(l, indent + 1)
+        s += "\n" + "\t" * indent + ")"
+    else:
+        s += ")"
+    return s
+
+
+def _write_kicad(expr: RawExpr) -> str:
+    out = io.StringIO()
+    write_kicad(out, expr)
+    return out.getvalue()
+
+
+WRITERS: List[Tuple[str, Callable[[RawExpr], str]]] = [
+    ("isolate_error dump_kicad (old)", isolate_error_dump_kicad),
+    ("reformat_kicad dump_kicad (old)", reformat_kicad_dump_kicad),
+    ("sexpr.dump_kicad", dump_kicad),
+    ("sexpr.write_kicad", _write_kicad),
+]
+
+
+def nested_tree(depth: int) -> list:
+    """(n0 (at 0 0) (n1 (at 0 1) (n2 ...))), built without recursion."""
+    root = node = ["n0", ["at", "0", "0"]]
+    for i in range(1, depth):
+        child = [f"n{i}", ["at", "0", str(i)]]
+        node.append(child)
+        node = child
+    return root
+
+
+def best_of(fn: Callable[[RawExpr], str], tree: RawExpr, runs: int) -> float:
+    """Fastest of ``runs`` renderings of ``tree``, in milliseconds."""
+    best = float("inf")
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn(tree)
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Time the shared KiCad writer against the ones it replaced")
+    ap.add_argument("input", nargs="?", default="../src/device.kicad_sch")
+    ap.add_argument("--runs", type=int, default=40, help="Renderings per writer; the best is reported")
+    ap.add_argument("--depth", type=int, default=400, help="Levels of the synthetic nested tree")
+    args = ap.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        text = f.read()
+    tree = parse_raw(text)[0]
+    same = dump_kicad(tree) + "\n" == text
+    print(f"Best of {args.runs} runs rendering the parsed {args.input} "
+          f"({'identical to the file' if same else 'differs from the file'}):")
+    for name, fn in WRITERS:
+        print(f"  {name:<32} {best_of(fn, tree, args.runs):7.1f} ms")
+
+    deep = nested_tree(args.depth)
+    print(f"Synthetic tree nested {args.depth} levels deep:")
+    for name, fn in WRITERS:
+        print(f"  {name:<32} {best_of(fn, deep, args.runs):7.1f} ms")
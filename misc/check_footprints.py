@@ -0,0 +1,164 @@
+"""check_footprints.py
+
+Check every component's assigned footprint against fp-info-cache and its
+symbol's footprint filters (``ki_fp_filters``), in bulk.
+
+All filters of the netlist are compiled once into a ``FilterSet``: one
+anchored regex per distinct glob, grouped by the literal prefix in front of
+the first wildcard. A single pass over the cache then only tries, for each
+footprint name, the filters whose prefix the name actually starts with (plus
+the ones that start with a wildcard), instead of every filter against every
+footprint. As in KiCad, filters are case insensitive and a filter with a ':'
+is matched against ``lib:name`` rather than the bare name.
+
+Reported per component: no footprint assigned, footprint not in the cache,
+and footprint not satisfying any of its filters (with the number of cache
+footprints that would).
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+import fp_info
+from fp_info import FootprintIndex, glob_to_regex
+from netlist import load as load_netlist
+
+
+def literal_prefix(pattern: str) -> str:
+    m = re.search(r"[*?]", pattern)
+    return pattern[:m.start()] if m else pattern
+
+
+def longest_literal(pattern: str) -> str:
+    """The longest wildcard-free run of ``pattern``; every match contains it."""
+    return max(re.split(r"[*?]", pattern), key=len)
+
+
+class FilterSet:
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self.regex: Dict[str, "re.Pattern[str]"] = {}
+        # (with_lib, prefix) -> (pattern, literal it must contain, regex)
+        # for the patterns with that literal prefix
+        self.groups: Dict[Tuple[bool, str], List[Tuple[str, str, "re.Pattern[str]"]]] = {}
+        self.prefix_lengths: Dict[bool, List[int]] = {False: [], True: []}
+        for pattern in patterns:
+            key = pattern.lower()
+            if key in self.regex:
+                continue
+            self.patterns.append(key)
+            self.regex[key] = re.compile(glob_to_regex(key), re.DOTALL)
+            with_lib = ":" in key
+            prefix = literal_prefix(key)
+            self.groups.setdefault((with_lib, prefix), []).append((key, longest_literal(key), self.regex[key]))
+            if len(prefix) not in self.prefix_lengths[with_lib]:
+                self.prefix_lengths[with_lib].append(len(prefix))
+
+    def _matching(self, with_lib: bool, key: str) -> Iterable[str]:
+        groups = self.groups
+        for length in self.prefix_lengths[with_lib]:
+            group = groups.get((with_lib, key[:length]))
+            if group is not None:
+                for pattern, literal, rx in group:
+                    if literal in key and rx.fullmatch(key):
+                        yield pattern
+
+    def matches(self, pattern: str, name: str, footprint_id: str) -> bool:
+        """Whether one footprint satisfies ``pattern``."""
+        key = pattern.lower()
+        return self.regex[key].fullmatch((footprint_id if ":" in key else name).lower()) is not None
+
+    def match_index(self, index: FootprintIndex) -> Dict[str, array]:
+        """Footprint numbers matching each pattern, from one pass over the cache."""
+        found = {pattern: array("I") for pattern in self.patterns}
+        need_lib = bool(self.prefix_lengths[True])
+        need_name = bool(self.prefix_lengths[False])
+        libs = [lib.lower() for lib in index.libs]
+        for n, name in enumerate(index.names):
+            name = name.lower()
+            if need_name:
+                for pattern in self._matching(False, name):
+                    found[pattern].append(n)
+            if need_lib:
+                full = libs[index.lib[n]] + ":" + name
+                for pattern in self._matching(True, full):
+                    found[pattern].append(n)
+        return found
+
+
+@dataclass
+class Finding:
+    ref: str
+    footprint: str
+    filters: List[str]
+    problems: List[str] = field(default_factory=list)
+    candidates: int = 0
+
+
+def check(components, index: FootprintIndex) -> List[Finding]:
+    components = list(components)
+    filters_of = {c.ref: c.properties.get("ki_fp_filters", "").split() for c in components}
+    filters = FilterSet(p for ps in filters_of.values() for p in ps)
+    matched = filters.match_index(index)
+    matched_sets = {pattern: set(hits) for pattern, hits in matched.items()}
+
+    findings = []
+    for comp in components:
+        finding = Finding(comp.ref, comp.footprint, filters_of[comp.ref])
+        patterns = [p.lower() for p in finding.filters]
+        candidates = set()
+        for pattern in patterns:
+            candidates.update(matched_sets[pattern])
+        finding.candidates = len(candidates)
+
+        if not comp.footprint:
+            finding.problems.append("no footprint assigned")
+        else:
+            n = index.find(comp.footprint)
+            if n is None:
+                finding.problems.append("footprint not in fp-info-cache")
+            if patterns:
+                if n is not None:
+                    ok = n in candidates
+                else:
+                    _, _, name = comp.footprint.rpartition(":")
+                    ok = any(filters.matches(p, name, comp.footprint) for p in patterns)
+                if not ok:
+                    finding.problems.append(f"footprint does not match filters {' '.join(finding.filters)}")
+        findings.append(finding)
+    return findings
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check assigned footprints against fp-info-cache and ki_fp_filters")
+    ap.add_argument("netlist", nargs="?", default='../src/device.net')
+    ap.add_argument("--cache", default='../src/fp-info-cache')
+    ap.add_argument("--no-sidecar", action="store_true", help="Neither read nor write the fp-info-cache .idx sidecar")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Also list components without problems")
+    args = ap.parse_args()
+
+    index = fp_info.load(args.cache, None if args.no_sidecar else "")
+    netlist = load_netlist(args.netlist)
+    t0 = time.perf_counter()
+    findings = check(netlist.components, index)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    bad = [f for f in findings if f.problems]
+    for f in findings:
+        if not f.problems and not args.verbose:
+            continue
+        filters = f" [filters {' '.join(f.filters)}: {f.candidates} candidate(s) in cache]" if f.filters else ""
+        print(f"{f.ref}: {f.footprint or '-'}{filters}")
+        for problem in f.problems:
+            print(f"  {problem}")
+    print(f"Checked {len(findings)} components against {len(index)} footprints in {elapsed:.1f} ms; "
+          f"{len(bad)} with problems.")
+    if bad:
+        sys.exit(1)
@@ -0,0 +1,452 @@
+"""check_netlist.py
+
+Check an exported netlist against the design intent in NETLIST.md.
+
+NETLIST.md describes each net either as a section
+
+    ### `VSUP_PROT`  (post-diode 12 V feeding TLIN VSUP)
+    **Connects:**
+    * D_VSUP_REV cathode
+    * U1(TLIN) VSUP
+    * C_VSUP 100 nF (+) to GND
+
+or as a bullet of its own (``* `SPI_CS`: U1 PIN/nCS ↔ U2 SPI_CSN``). Every
+bullet is read as a set of claims about that net:
+
+- ``U1 VSUP``, ``J1-RED``, ``U2(nRF) all VDD pins``: a pin of a chip, matched
+  against the pin functions in the netlist ("SPI_CSN" matches "P2.05/SPI.CSN";
+  "GPIO" stands for any pin of the chip);
+- ``C_VSUP``, ``C_VDD_*``: a part, by the role name its value starts with in
+  the schematic ("C_VSUP 100nF"); it must have a pin on the net. Parts
+  in a clause that also mentions another net ("to GND", "between `DCC` and
+  `VDD_nRF`") are claimed on that net as well.
+
+In ``a → b → `NET` `` chains only the parts next to the net are claimed.
+Claims marked optional/DNP/"if used", or in an optional section, are
+reported separately and don't fail the check.
+
+The claims are resolved to (ref, pin) sets once and compared with the pins
+of each net as sets, giving in one pass: connections that are missing,
+pins sitting on another net than intended (misrouted), pins on a described
+net that nothing claims (extra), and spec names that don't resolve.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Set, Tuple
+
+from netlist import Netlist, load
+
+
+@dataclass
+class Claim:
+    net: str
+    line: int
+    text: str
+    # Either a chip pin (ref + pin name) or a part role name (may be a glob).
+    ref: Optional[str] = None
+    pin: Optional[str] = None
+    all_pins: bool = False
+    role: Optional[str] = None
+    optional: bool = False
+    # Claimed on a net the bullet only mentions ("C_PV ... (or `PV`)").
+    mentioned: bool = False
+    # An optional part in series within the net ("optional R_SPI_SER in
+    # series", or any optional *_SER part): its two sides are one net.
+    series: bool = False
+
+
+@dataclass
+class Report:
+    missing: List[str] = field(default_factory=list)
+    misrouted: List[str] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+    unresolved: List[str] = field(default_factory=list)
+    optional: List[str] = field(default_factory=list)
+    missing_nets: List[str] = field(default_factory=list)
+    unnamed: List[str] = field(default_factory=list)
+
+    def failures(self) -> int:
+        return len(self.missing) + len(self.misrouted) + len(self.extra) + len(self.missing_nets)
+
+
+# ------------------------
+# Reading the intent
+# ------------------------
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+_SECTION_NET_RE = re.compile(r"^#{3,6}\s+`([^`]+)`")
+_BULLET_RE = re.compile(r"^\s*[*-]\s+(.*)$")
+_INLINE_NET_RE = re.compile(r"^`([^`]+)`\s*:\s*(.*)$")
+_NET_MENTION_RE = re.compile(r"`([^`]+)`")
+_CHIP_PIN_RE = re.compile(r"\b([UJ]\d+)(?:\([^)]*\))?[ -](all\s+)?([A-Za-z][\w./]*)")
+_ROLE_RE = re.compile(r"\b(?:[A-Z]{1,2}_[\w*]+|FB\d+)")
+_BARE_PIN_RE = re.compile(r"^\s*([A-Z][A-Z0-9_]*)\b")
+_OPTIONAL_RE = re.compile(r"optional|\bDNP\b|if used|recommended", re.IGNORECASE)
+_SERIES_RE = re.compile(r"\bseries\b", re.IGNORECASE)
+# A bullet that leaves the net's list open-ended.
+_OPEN_RE = re.compile(r"\betc\b|any additional|as required", re.IGNORECASE)
+_QUANTITY_RE = re.compile(r"(\d+)(?:\.(\d+))?([pnuµmkM])(\d*)[FH]?$")
+_SCALE = {"p": 1e-12, "n": 1e-9, "u": 1e-6, "µ": 1e-6, "m": 1e-3, "k": 1e3, "M": 1e6}
+
+# Words of spec pin names that the netlist spells differently: the nRF's
+# UARTE.TXD, its SPI.SDO as the controller's MOSI, J1's BLK_GND.
+_PIN_ALIASES = {"UART": "UARTE", "TX": "TXD", "RX": "RXD", "MOSI": "SDO", "MISO": "SDI",
+                "BLACK": "BLK", "YELLOW": "YEL"}
+
+# Words after a chip ref that aren't pin names.
+_NOT_PINS = {"all", "and", "pin", "pins", "side"}
+
+
+def _clauses(text: str) -> List[str]:
+    """Split on commas and semicolons outside parentheses."""
+    clauses, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif ch in ",;" and depth == 0:
+            clauses.append(text[start:i])
+            start = i + 1
+    clauses.append(text[start:])
+    return [c for c in clauses if c.strip()]
+
+
+def _optional_at(clause: str, pos: int) -> bool:
+    """Whether the item at ``pos`` is marked optional: by a marker outside
+    any parentheses ("(Optional) C_X", "D_Y (if used)") or at the start of
+    the parenthesized remark it sits in ("(optional R_SPI_SER in series)")."""
+    top, depth, start, group = [], 0, 0, None
+    for i, ch in enumerate(clause):
+        if ch == "(":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == ")" and depth:
+            depth -= 1
+            if depth == 0:
+                inner = clause[start + 1:i]
+                if _OPTIONAL_RE.fullmatch(inner.strip()):
+                    top.append(inner)
+                elif start < pos < i:
+                    group = inner
+        elif depth == 0:
+            top.append(ch)
+    if _OPTIONAL_RE.search("".join(top)):
+        return True
+    return group is not None and _OPTIONAL_RE.match(group.lstrip()) is not None
+
+
+def parse_intent(text: str, net_names: Set[str] = frozenset()) -> List[Claim]:
+    """Claims made by NETLIST.md-style ``text``. ``net_names`` are words that
+    name nets rather than parts (e.g. RF_50), on top of the ones the text
+    itself defines."""
+    lines = text.splitlines()
+    known_nets = set(net_names)
+    for line in lines:
+        m = _SECTION_NET_RE.match(line)
+        if m:
+            known_nets.add(m.group(1))
+        b = _BULLET_RE.match(line)
+        if b:
+            m = _INLINE_NET_RE.match(b.group(1))
+            if m:
+                known_nets.add(m.group(1))
+    bare_net_re = re.compile(r"\b(" + "|".join(sorted(map(re.escape, known_nets), key=len, reverse=True)) + r")\b") \
+        if known_nets else None
+
+    claims: List[Claim] = []
+    section_net = None
+    section_optional = False
+    for lineno, line in enumerate(lines, 1):
+        h = _HEADING_RE.match(line)
+        if h:
+            m = _SECTION_NET_RE.match(line)
+            section_net = m.group(1) if m else None
+            section_optional = bool(_OPTIONAL_RE.search(h.group(1)))
+            continue
+        b = _BULLET_RE.match(line)
+        if not b:
+            continue
+        body = b.group(1)
+        net = section_net
+        m = _INLINE_NET_RE.match(body)
+        if m:
+            net, body = m.group(1), m.group(2)
+        if net is None:
+            continue
+        if _OPEN_RE.search(body):
+            # "..., etc.": any part may be on the net.
+            claims.append(Claim(net, lineno, body.strip(), role="*", optional=True))
+
+        # In a chain only the segments next to the one naming the net count;
+        # an inline net sits in front of the first segment.
+        segments = body.split("→")
+        if len(segments) > 1:
+            at = next((i for i, s in enumerate(segments) if f"`{net}`" in s), -1)
+            segments = [s for i, s in enumerate(segments) if abs(i - at) <= 1]
+
+        for segment in segments:
+            last_chip = None
+            for clause in _clauses(segment):
+                mentioned = set(_NET_MENTION_RE.findall(clause))
+                if bare_net_re is not None:
+                    mentioned.update(bare_net_re.findall(_NET_MENTION_RE.sub(" ", clause)))
+                mentioned.discard(net)
+
+                chips = list(_CHIP_PIN_RE.finditer(clause))
+                for c in chips:
+                    if c.group(3).lower() in _NOT_PINS:
+                        continue
+                    last_chip = c.group(1)
+                    claims.append(Claim(net, lineno, clause.strip(), ref=c.group(1), pin=c.group(3),
+                                        all_pins=bool(c.group(2)),
+                                        optional=section_optional or _optional_at(clause, c.start())))
+                if not chips and last_chip is not None:
+                    # "U2(nRF) VSS, VSS_PA, ...": later clauses name more pins.
+                    p = _BARE_PIN_RE.match(clause)
+                    if p and p.group(1) not in known_nets and not _ROLE_RE.match(p.group(1)):
+                        claims.append(Claim(net, lineno, clause.strip(), ref=last_chip, pin=p.group(1),
+                                            optional=section_optional or _optional_at(clause, p.start(1))))
+                        continue
+
+                for r in _ROLE_RE.finditer(_NET_MENTION_RE.sub(" ", clause)):
+                    role = r.group(0)
+                    if role in known_nets:
+                        continue
+                    marked = _optional_at(clause, r.start())
+                    series = marked and (role.endswith("_SER") or bool(_SERIES_RE.search(clause)))
+                    # A part in series sits on its own line, not on the
+                    # nets the clause also mentions ("pull-up to `VCC_3V3`").
+                    for target in [net] + ([] if series else sorted(mentioned)):
+                        claims.append(Claim(target, lineno, clause.strip(), role=role,
+                                            optional=section_optional or marked, mentioned=target != net,
+                                            series=series))
+    return claims
+
+
+# ------------------------
+# Checking
+# ------------------------
+
+
+def _norm(name: str) -> str:
+    return re.sub(r"[._\s]", "", name).upper()
+
+
+def _pin_matches(spec: str, function: Optional[str]) -> bool:
+    if not function:
+        return False
+    wants = {_norm(spec), "".join(_PIN_ALIASES.get(w, w) for w in re.split(r"[._\s]", spec.upper()))}
+    for part in function.split("/"):
+        if _norm(part) in wants or _norm(part.split("_")[0]) in wants:
+            return True
+    return _norm(function) in wants
+
+
+def _quantity(text: str) -> Optional[float]:
+    """2u2, 2.2uF, 100n -> farads/henries/ohms; None for anything else."""
+    m = _QUANTITY_RE.match(text)
+    if not m:
+        return None
+    whole, frac, unit, tail = m.groups()
+    return float(f"{whole}.{frac or tail or 0}") * _SCALE[unit]
+
+
+def _role_refs(role: str, roles: Dict[str, List[str]], values: Dict[str, str]) -> List[str]:
+    """Parts with the spec role ``role``. Where the schematic has no such
+    role name, ``X_SER`` stands for the series parts ``X_*`` (R_SPI_SER for
+    R_SPI_SCK, R_SPI_CS, ...), and a value suffix picks parts by value
+    (C_VDD_2u2 for "C_VDD 2.2uF" and "C_VDD2 2.2uF")."""
+    refs = [ref for name, rs in roles.items() if fnmatchcase(name, role) for ref in rs]
+    prefix, _, suffix = role.rpartition("_")
+    if refs or not prefix:
+        return refs
+    if suffix == "SER":
+        return [ref for name, rs in roles.items() if fnmatchcase(name, prefix + "_*") for ref in rs]
+    want = _quantity(suffix)
+    if want is None:
+        return []
+    return [ref for name, rs in roles.items() if name.startswith(prefix) for ref in rs
+            if _quantity(values.get(ref, "")) is not None and abs(_quantity(values[ref]) - want) <= want * 1e-6]
+
+
+def check(claims: List[Claim], netlist: Netlist) -> Report:
+    report = Report()
+
+    roles: Dict[str, List[str]] = {}
+    # ref -> the value after the role name ("2.2uF" of "C_VDD 2.2uF")
+    values: Dict[str, str] = {}
+    for comp in netlist.components:
+        if comp.value:
+            words = comp.value.split()
+            roles.setdefault(words[0], []).append(comp.ref)
+            if len(words) > 1:
+                values[comp.ref] = words[1]
+
+    # Resolve every spec net to a netlist net once.
+    net_index: Dict[str, Optional[int]] = {}
+    for claim in claims:
+        if claim.net not in net_index:
+            net_index[claim.net] = netlist.find_net(claim.net)
+
+    # A spec net the schematic left unnamed is the auto-named net (Net-(U1-LIN))
+    # that holds the pins claimed for it.
+    for name, net in net_index.items():
+        if net is not None:
+            continue
+        candidates = {n for claim in claims if claim.net == name and claim.ref is not None
+                      for p, n in netlist.component_pins(claim.ref) if _pin_matches(claim.pin, p.pinfunction)}
+        if len(candidates) == 1 and next(iter(candidates)).startswith("Net-("):
+            candidate = candidates.pop()
+            net_index[name] = netlist.find_net(candidate)
+            report.unnamed.append(f"{name}: not named in the schematic, checked as {candidate}")
+
+    # Nets joined through an optional series part count as one net.
+    joined: Dict[int, int] = {}
+
+    def group(net: int) -> int:
+        while joined.get(net, net) != net:
+            net = joined[net]
+        return net
+
+    for claim in claims:
+        if not claim.series:
+            continue
+        for ref in _role_refs(claim.role, roles, values):
+            pins = netlist.component_pins(ref)
+            if len(pins) == 2:
+                a, b = (group(netlist.find_net(net)) for _, net in pins)
+                joined[b] = a
+    members: Dict[int, List[int]] = {}
+    for net in range(len(netlist)):
+        members.setdefault(group(net), []).append(net)
+
+    # (ref, pin) sets: what each net has, and what the spec claims for it.
+    actual: Dict[str, Set[Tuple[str, str]]] = {}
+    for name, net in net_index.items():
+        if net is not None:
+            actual[name] = {(p.ref, p.pin) for n in members[group(net)] for p in netlist.pins(netlist.net_codes[n])}
+    claimed_pins: Dict[str, Set[Tuple[str, str]]] = {name: set() for name in net_index}
+    claimed_refs: Dict[str, Set[str]] = {name: set() for name in net_index}
+    found_on: Dict[str, Set[str]] = {name: set() for name in net_index}
+
+    # Nets with a role no part has: their unclaimed pins are most likely
+    # that part's, and are left to the unresolved report.
+    unresolved_roles: Set[str] = set()
+
+    def fail(kind: List[str], claim: Claim, message: str) -> None:
+        (report.optional if claim.optional else kind).append(f"{claim.net}: {message}  [line {claim.line}]")
+
+    for claim in claims:
+        have = actual.get(claim.net)
+        if claim.ref is not None:
+            comp_pins = netlist.component_pins(claim.ref)
+            if not comp_pins:
+                (report.optional if claim.optional else report.unresolved).append(
+                    f"{claim.net}: no component {claim.ref} for '{claim.text}'  [line {claim.line}]")
+                continue
+            if claim.pin.upper() == "GPIO":
+                claimed_refs[claim.net].add(claim.ref)
+                if have is not None and not any(ref == claim.ref for ref, _ in have):
+                    fail(report.missing, claim, f"no pin of {claim.ref} is on the net")
+                continue
+            matches = [(p, net) for p, net in comp_pins if _pin_matches(claim.pin, p.pinfunction)]
+            if not matches:
+                (report.optional if claim.optional else report.unresolved).append(
+                    f"{claim.net}: {claim.ref} has no pin named {claim.pin}  [line {claim.line}]")
+                continue
+            for p, _ in matches:
+                claimed_pins[claim.net].add((p.ref, p.pin))
+            for p, net in matches:
+                found_on[claim.net].add(net)
+            if have is None:
+                continue
+            on_net = [(p, net) for p, net in matches if (p.ref, p.pin) in have]
+            if claim.all_pins:
+                wrong = [(p, net) for p, net in matches if (p.ref, p.pin) not in have]
+            else:
+                wrong = [] if on_net else matches
+            for p, net in wrong:
+                where = f"is on {net}" if not net.startswith("unconnected-") else "is unconnected"
+                fail(report.misrouted if not net.startswith("unconnected-") else report.missing, claim,
+                     f"{p.ref}.{p.pin} ({p.pinfunction}) {where}")
+            continue
+
+        refs = _role_refs(claim.role, roles, values)
+        if claim.role == "*":
+            claimed_refs[claim.net].update(refs)
+            continue
+        if not refs:
+            (report.optional if claim.optional else report.unresolved).append(
+                f"{claim.net}: no part with role {claim.role}  [line {claim.line}]")
+            if not claim.optional:
+                unresolved_roles.add(claim.net)
+            continue
+        claimed_refs[claim.net].update(refs)
+        if have is None:
+            continue
+        # A series role names one part per line (R7..R10 each on their own
+        # SPI line): one of them on the net meets the claim.
+        if claim.series and any(r in refs for r, _ in have):
+            continue
+        for ref in refs:
+            if any(r == ref for r, _ in have):
+                continue
+            nets = sorted({net for _, net in netlist.component_pins(ref)})
+            if nets:
+                fail(report.misrouted, claim, f"{ref} ({claim.role}) is on {', '.join(nets)} instead")
+            else:
+                fail(report.missing, claim, f"{ref} ({claim.role}) is not connected")
+
+    for name, net in net_index.items():
+        if net is None:
+            hint = sorted(found_on[name])
+            optional = all(claim.optional for claim in claims if claim.net == name and not claim.mentioned)
+            (report.optional if optional else report.missing_nets).append(
+                f"{name}: no such net in the netlist" + (f" (its pins are on {', '.join(hint)})" if hint else ""))
+            continue
+        if name in unresolved_roles:
+            continue
+        for ref, pin in sorted(actual[name] - claimed_pins[name]):
+            if ref not in claimed_refs[name]:
+                report.extra.append(f"{name}: {ref}.{pin} is on the net but not in the spec")
+    return report
+
+
+def check_files(spec_path: str, netlist_path: str) -> Report:
+    netlist = load(netlist_path)
+    with open(spec_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    local_names = {name.lstrip("/") for name in netlist.net_names}
+    return check(parse_intent(text, local_names), netlist)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check a netlist export against the intent in NETLIST.md")
+    ap.add_argument("netlist", nargs="?", default='../src/device.net')
+    ap.add_argument("--spec", default='NETLIST.md')
+    ap.add_argument("--optional", action="store_true", help="Also list unmet optional claims")
+    args = ap.parse_args()
+
+    report = check_files(args.spec, args.netlist)
+    sections = [("Missing nets", report.missing_nets), ("Missing connections", report.missing),
+                ("Misrouted", report.misrouted), ("Extra connections", report.extra),
+                ("Unresolved spec references", report.unresolved), ("Unnamed nets", report.unnamed)]
+    if args.optional:
+        sections.append(("Optional, not met", report.optional))
+    for title, entries in sections:
+        if entries:
+            print(f"{title} ({len(entries)}):")
+            for entry in entries:
+                print(f"  {entry}")
+    if report.failures():
+        print(f"Found {report.failures()} conformance problem(s).")
+        sys.exit(1)
+    print("Success: netlist matches NETLIST.md.")
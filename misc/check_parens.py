@@ -1,41 +1,118 @@
-import sys
-
-def check_parens(filename):
-    with open(filename, 'r') as f:
-        content = f.read()
-
-    stack = []
-    in_string = False
-    escaped = False
-    
-    for i, char in enumerate(content):
-        if in_string:
-            if escaped:
-                escaped = False
-            elif char == '\\':
-                escaped = True
-            elif char == '"':
-                in_string = False
-        else:
-            if char == '"':
-                in_string = True
-            elif char == '(':
-                line_num = content[:i].count('\n') + 1
-                stack.append(line_num)
-            elif char == ')':
-                if not stack:
-                    line_num = content[:i].count('\n') + 1
-                    print(f"Error: Unexpected closing parenthesis at line {line_num}")
-                    return
-                stack.pop()
-
-    if stack:
-        print(f"Error: {len(stack)} unclosed parentheses. First unclosed at line {stack[0]}")
+import argparse
+import re
+
+from sexpr import LineIndex, ParseError, as_text, lex, literal, open_source
+
+_LIB_SYMBOL_RE = re.compile(r'\(\s*symbol\s+"')
+
+def is_item_line(content, pos):
+    # KiCad writes every top-level item of (kicad_sch ...) on its own line,
+    # indented by exactly one tab. Generated sheets indent the library
+    # symbols in lib_symbols the same way; those are (symbol "Lib:Name" ...)
+    # where a placed symbol is (symbol (lib_id ...) ...).
+    before = content[max(pos - 2, 0):pos]
+    if not (before == literal(content, '\n\t') or (pos == 1 and before == literal(content, '\t'))):
+        return False
+    return not _LIB_SYMBOL_RE.match(as_text(content, pos, min(pos + 64, len(content))))
+
+def is_root_close(content, pos, last):
+    # ... and closes (kicad_sch ...) itself in column 1, as the last token of
+    # the file. Generated sheets also put ')' in column 1 mid-file.
+    return pos == last and (pos == 0 or content[pos - 1:pos] == literal(content, '\n'))
+
+def last_token(content):
+    # Offset of the last non-whitespace character, -1 if there is none.
+    pos = len(content) - 1
+    space = literal(content, ' \t\r\n')
+    while pos >= 0 and content[pos:pos + 1] in space:
+        pos -= 1
+    return pos
+
+def describe(content, lines, item):
+    if item is None:
+        return "(kicad_sch ...)"
+    name = item['head'] or '?'
+    if item['uuid']:
+        name += f" {item['uuid']}"
+    return f"{name} (line {lines.line(item['start'])})"
+
+def report(problems, content, lines, item, delta):
+    if delta > 0:
+        what = f"{delta} unclosed '('"
+    else:
+        what = f"{-delta} extra ')'"
+    problems.append(f"{describe(content, lines, item)}: {what}")
+
+def check_parens(filename, use_mmap=False):
+    with open_source(filename, use_mmap) as content:
+        return check_content(content)
+
+def check_content(content):
+    lines = LineIndex(content)
+    problems = []
+
+    # depth is allowed to go negative so an extra ')' is counted rather than
+    # stopping the scan; it is resynchronised at the start of every
+    # top-level item so each unbalanced item is reported once, even when the
+    # errors of several items cancel out over the whole file.
+    depth = 0
+    last = last_token(content)
+    indented = content.find(literal(content, '\n\t(')) >= 0
+    item = None
+    prev_kind = None
+    want_uuid = False
+
+    try:
+        for kind, start, end in lex(content):
+            if kind == 'LPAR':
+                item_line = is_item_line(content, start)
+                if depth != 1 and item_line and item is not None:
+                    report(problems, content, lines, item, depth - 1)
+                    depth = 1
+                if depth == 1 and (item_line or not indented):
+                    item = {'start': start, 'head': None, 'uuid': None, 'base': depth, 'uuid_depth': None}
+                depth += 1
+            elif kind == 'RPAR':
+                if depth > 1 and is_root_close(content, start, last) and item is not None:
+                    report(problems, content, lines, item, depth - 1)
+                    depth = 1
+                depth -= 1
+            elif want_uuid:
+                item['uuid'] = as_text(content, start, end).strip('"')
+            elif kind == 'SYM' and prev_kind == 'LPAR' and item is not None:
+                level = depth - item['base']
+                if level == 1 and item['head'] is None:
+                    item['head'] = as_text(content, start, end)
+                elif item['head'] is not None and as_text(content, start, end) == 'uuid' and (
+                        item['uuid_depth'] is None or level < item['uuid_depth']):
+                    # The item's own (uuid ...) is its shallowest one; a
+                    # missing ')' earlier in the item pushes it deeper, an
+                    # extra one shallower.
+                    item['uuid_depth'] = level
+                    want_uuid = True
+                    prev_kind = kind
+                    continue
+            want_uuid = False
+            prev_kind = kind
+    except ParseError as e:
+        line, col = lines.line_col(e.offset)
+        problems.append(f"{describe(content, lines, item)}: unterminated string at line {line}, col {col}")
+        depth = 0
+
+    if depth != 0:
+        report(problems, content, lines, None, depth)
+
+    if problems:
+        for p in problems:
+            print(f"Error: {p}")
+        print(f"Found {len(problems)} imbalance(s).")
     else:
         print("Success: Parentheses are balanced.")
+    return problems
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        check_parens(sys.argv[1])
-    else:
-        check_parens('../src/device.kicad_sch')
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Report unbalanced parentheses per top-level item")
+    ap.add_argument("input", nargs="?", default='../src/device.kicad_sch')
+    ap.add_argument("--mmap", action="store_true", help="Lex a memory map of the file instead of reading it into a str")
+    args = ap.parse_args()
+    check_parens(args.input, args.mmap)
@@ -1,58 +1,96 @@
-
+import argparse
 import re
 
-def check_barewords(filename):
-    with open(filename, 'r') as f:
-        content = f.read()
-
-    # Regex for tokens: 
-    # 1. Quoted string
-    # 2. Parentheses
-    # 3. Bareword (unquoted)
-    token_pattern = re.compile(r'"(?:\\.|[^""])*"|\(|\)|[^\s\(\)"]+')
-    
-    in_string = False
-    escaped = False
-    
-    # We'll just use a simple state machine to find tokens NOT inside quotes
-    pos = 0
-    line_num = 1
-    while pos < len(content):
-        char = content[pos]
-        if char == '\n':
-            line_num += 1
-            pos += 1
-            continue
-        if char.isspace():
-            pos += 1
-            continue
-            
-        if char == '"':
-            # Skip quoted string
-            pos += 1
-            while pos < len(content):
-                if content[pos] == '"' and content[pos-1] != '\\':
-                    pos += 1
-                    break
-                pos += 1
-            continue
-            
-        if char in '()':
-            pos += 1
-            continue
-            
-        # Bareword
-        match = re.match(r'[^\s\(\)"]+', content[pos:])
-        if match:
-            bareword = match.group(0)
-            # KiCad barewords usually don't have special characters
-            # Let's see if any look suspicious (e.g. containing / or : if not expected)
-            # Actually, let's just print them all for now if they are long or weird
-            if not re.match(r'^[a-zA-Z0-9_\.\-\+]+$', bareword):
-                 print(f"Suspicious bareword at line {line_num}: {bareword}")
-            pos += len(bareword)
-        else:
-            pos += 1
+from sexpr import LineIndex, ParseError, as_text, lex, open_source
+
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+UUID = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+KEYWORD = r'[a-z0-9_]+'
+
+# Token names themselves must be lowercase keywords.
+HEAD = r'[a-z_][a-z0-9_]*'
+
+# Bare (unquoted) attributes allowed inside each token; '*' applies to every
+# token without its own entry. Anything that doesn't fullmatch is reported.
+DEFAULT_ALLOW = {
+    '*': f'{KEYWORD}|{NUMBER}|{UUID}',
+    'uuid': UUID,
+    'at': NUMBER,
+    'xy': NUMBER,
+    'size': NUMBER,
+    'start': NUMBER,
+    'mid': NUMBER,
+    'end': NUMBER,
+    'center': NUMBER,
+    'length': NUMBER,
+    'width': NUMBER,
+    'diameter': NUMBER,
+    'radius': NUMBER,
+    'thickness': NUMBER,
+    'offset': NUMBER,
+    'color': NUMBER,
+    'version': r'\d{8}',
+    'paper': r'A[0-5]|[A-E]|USLetter|USLegal|USLedger|User|portrait|' + NUMBER,
+}
+
+def compile_rules(allow):
+    return {ctx: re.compile(pattern) for ctx, pattern in allow.items()}
+
+def check_barewords(filename, allow=None, use_mmap=False):
+    with open_source(filename, use_mmap) as content:
+        return check_content(content, allow)
+
+def check_content(content, allow=None):
+    rules = compile_rules(allow or DEFAULT_ALLOW)
+    default = rules['*']
+    head_re = re.compile(HEAD)
+    lines = LineIndex(content)
+
+    # Stack of enclosing token names; None until the head of a list is seen.
+    heads = []
+    expect_head = False
+    found = 0
+
+    try:
+        for kind, start, end in lex(content):
+            if kind == 'LPAR':
+                heads.append(None)
+                expect_head = True
+                continue
+            if kind == 'RPAR':
+                if heads:
+                    heads.pop()
+            elif kind == 'SYM':
+                bareword = as_text(content, start, end)
+                if expect_head:
+                    heads[-1] = bareword
+                    if not head_re.fullmatch(bareword):
+                        found += 1
+                        print(f"Suspicious token name at line {lines.line(start)}: {bareword}")
+                else:
+                    ctx = heads[-1] if heads else None
+                    if not rules.get(ctx, default).fullmatch(bareword):
+                        found += 1
+                        print(f"Suspicious bareword at line {lines.line(start)} in ({ctx} ...): {bareword}")
+            expect_head = False
+    except ParseError as e:
+        print(f"Parse error at line {lines.line(e.offset)}: {e}")
+    return found
+
+def parse_allow(specs):
+    allow = dict(DEFAULT_ALLOW)
+    for spec in specs:
+        ctx, sep, pattern = spec.partition('=')
+        if not sep:
+            raise SystemExit(f"--allow expects CONTEXT=REGEX, got {spec!r}")
+        allow[ctx] = pattern
+    return allow
 
 if __name__ == "__main__":
-    check_barewords('../src/device.kicad_sch')
+    ap = argparse.ArgumentParser(description="Report unquoted atoms that don't fit the token they appear in")
+    ap.add_argument("input", nargs="?", default='../src/device.kicad_sch')
+    ap.add_argument("--allow", action="append", default=[], metavar="CONTEXT=REGEX",
+                    help="Bare attributes allowed inside (CONTEXT ...); '*' sets the fallback. May be repeated.")
+    ap.add_argument("--mmap", action="store_true", help="Lex a memory map of the file instead of reading it into a str")
+    args = ap.parse_args()
+    check_barewords(args.input, parse_allow(args.allow), args.mmap)
@@ -0,0 +1,292 @@
+"""compact_tree.py
+
+Array-backed S-expression tree for holding many schematic revisions in memory
+at once.
+
+Instead of one Python object per atom and list (~100+ bytes each), a
+CompactTree keeps one row per node in flat ``array`` columns:
+
+    kind      array('B')  LIST / SYM / STR
+    start     array('I')  offset of the node in the source
+    length    array('I')  length of the node in the source
+    parent    array('i')  index of the enclosing list, -1 for top level
+    first     array('i')  index of the first child, -1 if none
+    next      array('i')  index of the next sibling, -1 if none
+
+i.e. 21 bytes per node, plus the source text itself, which atoms are sliced
+(and decoded, for mmap'd sources) from only when they are looked at. Nodes are
+reached through the lightweight ``Node`` view.
+
+Nothing loads through it by default; it is opt-in. ``load_all()`` loads a
+set of revisions, and running the module reports what they take.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sexpr import ParseError, RawExpr, SExpr, Source, Str, Sym, as_text, lex, open_source, unescape
+
+LIST = 0
+SYM = 1
+STR = 2
+
+_KIND_CODES = {"LPAR": LIST, "SYM": SYM, "STR": STR}
+
+
+class CompactTree:
+    def __init__(self, text: Source):
+        self.text = text
+        self.kind = array("B")
+        self.start = array("I")
+        self.length = array("I")
+        self.parent = array("i")
+        self.first = array("i")
+        self.next = array("i")
+        self.top: List[int] = []
+        self._build()
+
+    @classmethod
+    def from_file(cls, path: str) -> "CompactTree":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read())
+
+    def _build(self) -> None:
+        kinds, starts, lengths = self.kind, self.start, self.length
+        parents, firsts, nexts = self.parent, self.first, self.next
+        open_lists: List[int] = []
+        last_child: List[int] = []
+        prev_top = -1
+
+        for kind, s, e in lex(self.text):
+            if kind == "RPAR":
+                if not open_lists:
+                    raise ParseError(f"Unexpected ')' at offset {s}", s)
+                idx = open_lists.pop()
+                last_child.pop()
+                lengths[idx] = e - starts[idx]
+                continue
+
+            idx = len(kinds)
+            kinds.append(_KIND_CODES[kind])
+            starts.append(s)
+            lengths.append(e - s)
+            firsts.append(-1)
+            nexts.append(-1)
+            if open_lists:
+                p = open_lists[-1]
+                parents.append(p)
+                if last_child[-1] < 0:
+                    firsts[p] = idx
+                else:
+                    nexts[last_child[-1]] = idx
+                last_child[-1] = idx
+            else:
+                parents.append(-1)
+                if prev_top >= 0:
+                    nexts[prev_top] = idx
+                prev_top = idx
+                self.top.append(idx)
+            if kind == "LPAR":
+                open_lists.append(idx)
+                last_child.append(-1)
+
+        if open_lists:
+            raise ParseError("Unclosed '(' at end of file", self.start[open_lists[-1]])
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    @property
+    def root(self) -> "Node":
+        if not self.top:
+            raise ParseError("No s-expression found")
+        return Node(self, self.top[0])
+
+    def node(self, idx: int) -> "Node":
+        return Node(self, idx)
+
+    def nbytes(self) -> int:
+        """Bytes used by the node table (not counting the source text)."""
+        return sum(a.itemsize * len(a) for a in (self.kind, self.start, self.length,
+                                                 self.parent, self.first, self.next))
+
+
+class Node:
+    """View of one node of a CompactTree; cheap to create and throw away."""
+
+    __slots__ = ("tree", "idx")
+
+    def __init__(self, tree: CompactTree, idx: int):
+        self.tree = tree
+        self.idx = idx
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Node) and other.tree is self.tree and other.idx == self.idx
+
+    def __hash__(self) -> int:
+        return hash((id(self.tree), self.idx))
+
+    def __repr__(self) -> str:
+        return f"Node({self.idx}, {self.raw[:40]!r})"
+
+    @property
+    def is_list(self) -> bool:
+        return self.tree.kind[self.idx] == LIST
+
+    @property
+    def kind(self) -> int:
+        return self.tree.kind[self.idx]
+
+    @property
+    def span(self):
+        s = self.tree.start[self.idx]
+        return s, s + self.tree.length[self.idx]
+
+    @property
+    def raw(self) -> str:
+        """Source text of the node, exactly as written."""
+        s, e = self.span
+        return as_text(self.tree.text, s, e)
+
+    @property
+    def value(self) -> str:
+        """Atom value: bare token text, or the unescaped string contents."""
+        t = self.tree
+        s, n = t.start[self.idx], t.length[self.idx]
+        k = t.kind[self.idx]
+        if k == SYM:
+            return as_text(t.text, s, s + n)
+        if k == STR:
+            return unescape(as_text(t.text, s + 1, s + n - 1))
+        raise TypeError("list nodes have no atom value")
+
+    @property
+    def parent(self) -> Optional["Node"]:
+        p = self.tree.parent[self.idx]
+        return Node(self.tree, p) if p >= 0 else None
+
+    def child_indices(self) -> Iterator[int]:
+        t = self.tree
+        c = t.first[self.idx] if t.kind[self.idx] == LIST else -1
+        while c >= 0:
+            yield c
+            c = t.next[c]
+
+    def children(self) -> Iterator["Node"]:
+        for c in self.child_indices():
+            yield Node(self.tree, c)
+
+    def __iter__(self) -> Iterator["Node"]:
+        return self.children()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.child_indices())
+
+    def __getitem__(self, k: int) -> "Node":
+        if k < 0:
+            return list(self.children())[k]
+        for i, c in enumerate(self.child_indices()):
+            if i == k:
+                return Node(self.tree, c)
+        raise IndexError(k)
+
+    @property
+    def head(self) -> Optional[str]:
+        """Token name of a list whose first child is a bare token."""
+        t = self.tree
+        if t.kind[self.idx] != LIST:
+            return None
+        c = t.first[self.idx]
+        if c < 0 or t.kind[c] != SYM:
+            return None
+        s = t.start[c]
+        return as_text(t.text, s, s + t.length[c])
+
+    def find(self, token_name: str) -> Optional["Node"]:
+        """First child list with the given head."""
+        for c in self.children():
+            if c.head == token_name:
+                return c
+        return None
+
+    def find_all(self, token_name: str) -> Iterator["Node"]:
+        for c in self.children():
+            if c.head == token_name:
+                yield c
+
+    def _materialize(self, atom: Callable[[int], object]) -> object:
+        """Nested lists for the subtree, with ``atom(idx)`` for every atom."""
+        t = self.tree
+        kinds, firsts, nexts = t.kind, t.first, t.next
+        if kinds[self.idx] != LIST:
+            return atom(self.idx)
+        root: list = []
+        # (first child, list to fill) of every list not yet filled in; each
+        # is appended to its parent before it is filled, so order is kept.
+        stack = [(firsts[self.idx], root)]
+        while stack:
+            c, dest = stack.pop()
+            while c >= 0:
+                if kinds[c] == LIST:
+                    sub: list = []
+                    dest.append(sub)
+                    stack.append((firsts[c], sub))
+                else:
+                    dest.append(atom(c))
+                c = nexts[c]
+        return root
+
+    def to_sexpr(self) -> SExpr:
+        """Materialize the subtree as a typed Sym/Str tree."""
+        t = self.tree
+        text, kinds, starts, lengths = t.text, t.kind, t.start, t.length
+
+        def atom(c: int) -> SExpr:
+            s = starts[c]
+            if kinds[c] == STR:
+                return Str(unescape(as_text(text, s + 1, s + lengths[c] - 1)))
+            return Sym(as_text(text, s, s + lengths[c]))
+
+        return self._materialize(atom)
+
+    def to_raw(self) -> RawExpr:
+        """Materialize the subtree as a raw-token tree (see sexpr.parse_raw)."""
+        t = self.tree
+        text, starts, lengths = t.text, t.start, t.length
+        return self._materialize(lambda c: as_text(text, starts[c], starts[c] + lengths[c]))
+
+
+def load(path: str, use_mmap: bool = False) -> CompactTree:
+    """Build a CompactTree for ``path``.
+
+    With ``use_mmap`` the tree keeps the file's bytes (copied out of a
+    temporary memory map) rather than a decoded str.
+    """
+    if not use_mmap:
+        return CompactTree.from_file(path)
+    with open_source(path) as buf:
+        return CompactTree(bytes(buf))
+
+
+def load_all(paths: Iterable[str], use_mmap: bool = False) -> Dict[str, CompactTree]:
+    """path -> CompactTree for every path, e.g. all revisions of a sheet."""
+    return {path: load(path, use_mmap) for path in paths}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load schematic revisions as compact trees and report their memory")
+    ap.add_argument("paths", nargs="+", help=".kicad_sch files (or any S-expression files)")
+    ap.add_argument("--mmap", action="store_true", help="Keep each file's bytes rather than a decoded str")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    trees = load_all(args.paths, args.mmap)
+    t1 = time.perf_counter()
+    for path, tree in trees.items():
+        print(f"{path}: {len(tree)} nodes, {tree.nbytes() / 2**20:.2f} MiB table, {len(tree.text) / 2**20:.2f} MiB text")
+    print(f"{len(trees)} revisions: {sum(t.nbytes() for t in trees.values()) / 2**20:.1f} MiB of node tables "
+          f"+ {sum(len(t.text) for t in trees.values()) / 2**20:.1f} MiB of text (loaded in {(t1 - t0) * 1000:.0f} ms)")
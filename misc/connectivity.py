@@ -0,0 +1,528 @@
+"""connectivity.py
+
+Derive the nets of a schematic from its geometry, without kicad-cli.
+
+Every connection point (wire ends, junctions, label anchors and symbol pins
+placed through their symbol's position, rotation and mirroring) is snapped
+to KiCad's internal unit (1 nm) and hashed to a node of a disjoint-set
+forest; points that coincide share a node. Each wire unions its two ends.
+Wires are also bucketed into a grid hash of 1.27 mm cells, so a junction or
+label that sits on the middle of a wire finds that wire by looking in one
+cell rather than at every wire. Labels with the same name, and power symbols
+with the same value, are then unioned as well. All of this is near-linear in
+the number of items. The geometric and the by-name steps are separate methods
+so the per-sheet subgraphs in between can be inspected (erc.py does).
+
+The result is a ``netlist.Netlist``, named the way KiCad names nets (power
+value, label name, ``Net-(REF-PIN)`` / ``unconnected-(REF-PIN-PadN)``), so it
+can be queried and compared exactly like a loaded src/device.net;
+``compare()`` does the latter.
+
+Only what a single-sheet schematic needs is modelled: no buses, bus entries
+or hierarchical sheets. Power symbols (#PWR...) drive their net's name but,
+as in KiCad's export, are not listed as nodes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from netlist import Component, Netlist, Pin, load as load_netlist
+from sexpr import RawExpr, parse_raw, unescape
+
+IU_PER_MM = 1_000_000
+GRID_MM = 1.27
+_CELL = round(GRID_MM * IU_PER_MM)
+
+Point = Tuple[int, int]
+
+
+def to_iu(value: str) -> int:
+    return round(float(value) * IU_PER_MM)
+
+
+class DisjointSet:
+    """Union-find over 0..n-1 with path halving and union by size."""
+
+    def __init__(self):
+        self.parent = array("i")
+        self.size = array("i")
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self) -> int:
+        n = len(self.parent)
+        self.parent.append(n)
+        self.size.append(1)
+        return n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+# ------------------------
+# Schematic items
+# ------------------------
+
+
+@dataclass
+class LibPin:
+    number: str
+    name: str
+    pintype: str
+    x: int
+    y: int
+    shape: str = ""
+
+
+@dataclass
+class LibSymbol:
+    power: bool = False
+    # (unit, body style) -> pins; 0 means common to all units / styles
+    pins: Dict[Tuple[int, int], List[LibPin]] = field(default_factory=dict)
+
+    def unit_pins(self, unit: int, body_style: int) -> Iterable[LibPin]:
+        for (u, b), pins in self.pins.items():
+            if u in (0, unit) and b in (0, body_style):
+                yield from pins
+
+
+@dataclass
+class PlacedPin:
+    ref: str
+    number: str
+    name: str
+    pintype: str
+    x: int
+    y: int
+    # Value of the power symbol the pin belongs to, which names its net.
+    power: Optional[str] = None
+    shape: str = ""
+    uuid: str = ""
+    # uuid of the placed symbol
+    symbol: str = ""
+
+
+@dataclass
+class Label:
+    kind: str
+    text: str
+    x: int
+    y: int
+    uuid: str = ""
+
+    @property
+    def net_name(self) -> str:
+        # Root sheet only: local labels are scoped to "/".
+        return self.text if self.kind == "global_label" else "/" + self.text
+
+
+def _child(expr: List[RawExpr], token_name: str) -> Optional[List[RawExpr]]:
+    for child in expr:
+        if isinstance(child, list) and child and child[0] == token_name:
+            return child
+    return None
+
+
+def _children(expr: List[RawExpr], token_name: str) -> Iterable[List[RawExpr]]:
+    return (child for child in expr if isinstance(child, list) and child and child[0] == token_name)
+
+
+def _text(atom: RawExpr) -> str:
+    if isinstance(atom, list):
+        return ""
+    return unescape(atom[1:-1]) if atom.startswith('"') else atom
+
+
+def _int(expr: Optional[List[RawExpr]], default: int) -> int:
+    try:
+        return int(expr[1]) if expr is not None else default
+    except (IndexError, ValueError, TypeError):
+        return default
+
+
+def _property(expr: List[RawExpr], name: str) -> str:
+    for prop in _children(expr, "property"):
+        if len(prop) > 2 and _text(prop[1]) == name:
+            return _text(prop[2])
+    return ""
+
+
+def read_lib_symbol(sym: List[RawExpr]) -> LibSymbol:
+    lib = LibSymbol(power=_child(sym, "power") is not None)
+    base = _text(sym[1]).rpartition(":")[2]
+    for unit in _children(sym, "symbol"):
+        name = _text(unit[1])
+        u, b = 0, 0
+        if name.startswith(base + "_"):
+            fields = name[len(base) + 1:].split("_")
+            if len(fields) == 2 and all(f.isdigit() for f in fields):
+                u, b = int(fields[0]), int(fields[1])
+        pins = lib.pins.setdefault((u, b), [])
+        for pin in _children(unit, "pin"):
+            at = _child(pin, "at")
+            if at is None or len(at) < 3:
+                continue
+            pins.append(LibPin(_text((_child(pin, "number") or ["", ""])[1]),
+                               _text((_child(pin, "name") or ["", ""])[1]),
+                               _text(pin[1]) if len(pin) > 1 else "", to_iu(at[1]), to_iu(at[2]),
+                               _text(pin[2]) if len(pin) > 2 else ""))
+    return lib
+
+
+def place(px: int, py: int, x: int, y: int, angle: int, mirror: str) -> Point:
+    """Sheet position of the library point (px, py) of a symbol at (x, y)."""
+    # Library y points up, sheet y points down; rotation is counter-clockwise
+    # as drawn, then the symbol is mirrored about its own axes.
+    dx, dy = px, -py
+    angle %= 360
+    if angle == 90:
+        dx, dy = dy, -dx
+    elif angle == 180:
+        dx, dy = -dx, -dy
+    elif angle == 270:
+        dx, dy = -dy, dx
+    if mirror == "x":
+        dy = -dy
+    elif mirror == "y":
+        dx = -dx
+    return x + dx, y + dy
+
+
+# ------------------------
+# Connectivity
+# ------------------------
+
+
+class Connectivity:
+    def __init__(self):
+        self.sets = DisjointSet()
+        self._nodes: Dict[Point, int] = {}
+        # grid cell -> indices of the wires crossing it
+        self._cells: Dict[Point, List[int]] = {}
+        # uuid of the schematic (its root sheet)
+        self.uuid = ""
+        self.wires: List[Tuple[int, int, int, int]] = []
+        # uuid of the (wire ...) each segment came from
+        self.wire_uuids: List[str] = []
+        self.junctions: List[Point] = []
+        self.no_connects: List[Point] = []
+        self.labels: List[Label] = []
+        self.pins: List[PlacedPin] = []
+        self.components: Dict[str, Component] = {}
+
+    def node(self, p: Point) -> int:
+        n = self._nodes.get(p)
+        if n is None:
+            n = self._nodes[p] = self.sets.add()
+        return n
+
+    # ------------------------
+    # Building
+    # ------------------------
+
+    def add_wire(self, x1: int, y1: int, x2: int, y2: int, uuid: str = "") -> None:
+        w = len(self.wires)
+        self.wires.append((x1, y1, x2, y2))
+        self.wire_uuids.append(uuid)
+        self.sets.union(self.node((x1, y1)), self.node((x2, y2)))
+        cells = self._cells
+        for cx in range(min(x1, x2) // _CELL, max(x1, x2) // _CELL + 1):
+            for cy in range(min(y1, y2) // _CELL, max(y1, y2) // _CELL + 1):
+                cells.setdefault((cx, cy), []).append(w)
+
+    def add_junction(self, x: int, y: int) -> None:
+        self.junctions.append((x, y))
+        self.node((x, y))
+
+    def add_no_connect(self, x: int, y: int) -> None:
+        self.no_connects.append((x, y))
+        self.node((x, y))
+
+    def add_label(self, label: Label) -> None:
+        self.labels.append(label)
+        self.node((label.x, label.y))
+
+    def add_pin(self, pin: PlacedPin) -> None:
+        self.pins.append(pin)
+        self.node((pin.x, pin.y))
+
+    def wires_at(self, p: Point) -> Iterable[int]:
+        """The wires passing through ``p`` (ends included)."""
+        x, y = p
+        for w in self._cells.get((x // _CELL, y // _CELL), ()):
+            x1, y1, x2, y2 = self.wires[w]
+            if not (min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2)):
+                continue
+            cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+            # Within 1 IU of the line (exact for horizontal and vertical wires).
+            if cross * cross <= (x2 - x1) ** 2 + (y2 - y1) ** 2:
+                yield w
+
+    def wire_at(self, p: Point) -> Optional[int]:
+        """A wire passing through ``p`` (ends included), or None."""
+        return next(iter(self.wires_at(p)), None)
+
+    # ------------------------
+    # Resolving
+    # ------------------------
+
+    def union_geometry(self) -> None:
+        """Connect what touches on the sheet; the sets are then KiCad's
+        per-sheet subgraphs."""
+        sets = self.sets
+        # Junctions and labels connect to every wire they sit on, anywhere
+        # along it: a junction on a crossing joins both wires.
+        for p in self.junctions + [(lb.x, lb.y) for lb in self.labels]:
+            for w in self.wires_at(p):
+                x1, y1, _, _ = self.wires[w]
+                sets.union(self._nodes[p], self._nodes[(x1, y1)])
+
+    def union_names(self) -> None:
+        """Connect the subgraphs that share a net name; the sets are then nets."""
+        sets = self.sets
+        by_name: Dict[str, int] = {}
+        for lb in self.labels:
+            n = self._nodes[(lb.x, lb.y)]
+            sets.union(by_name.setdefault(lb.net_name, n), n)
+        for pin in self.pins:
+            if pin.power is not None:
+                n = self._nodes[(pin.x, pin.y)]
+                sets.union(by_name.setdefault(pin.power, n), n)
+
+    def netlist(self) -> Netlist:
+        """The nets with at least one (non-power) pin, as a Netlist."""
+        self.union_geometry()
+        self.union_names()
+        find, nodes = self.sets.find, self._nodes
+        groups: Dict[int, Tuple[List[PlacedPin], List[Tuple[int, str]]]] = {}
+        for pin in self.pins:
+            pins, names = groups.setdefault(find(nodes[(pin.x, pin.y)]), ([], []))
+            if pin.power is not None:
+                names.append((0, pin.power))
+            else:
+                pins.append(pin)
+        for lb in self.labels:
+            root = find(nodes[(lb.x, lb.y)])
+            if root in groups:
+                groups[root][1].append((1 if lb.kind == "global_label" else 2, lb.net_name))
+
+        nets = []
+        for pins, names in groups.values():
+            if not pins:
+                continue
+            pins.sort(key=lambda p: (p.ref, p.number))
+            nets.append((net_name(pins, names), pins))
+        nets.sort(key=lambda net: net[0])
+
+        result = Netlist()
+        for ref in sorted(self.components):
+            result.add_component(self.components[ref])
+        for code, (name, pins) in enumerate(nets, 1):
+            result.add_net(code, name, [(p.ref, p.number, p.name or None, p.pintype or None) for p in pins])
+        result.finish()
+        return result
+
+
+def _pin_label(pin: PlacedPin, with_pad: bool) -> str:
+    name = pin.name.replace("/", "{slash}") if pin.name not in ("", "~") else ""
+    if not name:
+        return f"{pin.ref}-Pad{pin.number}"
+    return f"{pin.ref}-{name}-Pad{pin.number}" if with_pad else f"{pin.ref}-{name}"
+
+
+def net_name(pins: List[PlacedPin], names: List[Tuple[int, str]]) -> str:
+    """KiCad's name for a net: the strongest driver's (power, then global,
+    then local labels), else one made up from a pin."""
+    if names:
+        return min(names)[1]
+    if len(pins) == 1:
+        return f"unconnected-({_pin_label(pins[0], True)})"
+    # Pins with a real name are preferred over "PadN" ones.
+    candidates = [f"Net-({_pin_label(pin, False)})" for pin in pins]
+    return min(candidates, key=lambda name: ("-Pad" in name, name))
+
+
+# ------------------------
+# Reading a schematic
+# ------------------------
+
+
+def from_items(root: List[RawExpr]) -> Connectivity:
+    conn = Connectivity()
+    conn.uuid = _text((_child(root, "uuid") or ["", ""])[1])
+    libs: Dict[str, LibSymbol] = {}
+    lib_symbols = _child(root, "lib_symbols")
+    for sym in _children(lib_symbols or [], "symbol"):
+        libs[_text(sym[1])] = read_lib_symbol(sym)
+
+    for item in root[1:]:
+        if not isinstance(item, list) or not item:
+            continue
+        kind = item[0]
+        if kind == "wire":
+            pts = list(_children(_child(item, "pts") or [], "xy"))
+            uuid = _text((_child(item, "uuid") or ["", ""])[1])
+            for a, b in zip(pts, pts[1:]):
+                conn.add_wire(to_iu(a[1]), to_iu(a[2]), to_iu(b[1]), to_iu(b[2]), uuid)
+        elif kind == "junction":
+            at = _child(item, "at")
+            conn.add_junction(to_iu(at[1]), to_iu(at[2]))
+        elif kind == "no_connect":
+            at = _child(item, "at")
+            conn.add_no_connect(to_iu(at[1]), to_iu(at[2]))
+        elif kind in ("label", "global_label", "hierarchical_label"):
+            at = _child(item, "at")
+            conn.add_label(Label(kind, _text(item[1]), to_iu(at[1]), to_iu(at[2]),
+                                 _text((_child(item, "uuid") or ["", ""])[1])))
+        elif kind == "symbol":
+            _add_symbol(conn, item, libs)
+    return conn
+
+
+def _add_symbol(conn: Connectivity, item: List[RawExpr], libs: Dict[str, LibSymbol]) -> None:
+    lib_name = _child(item, "lib_name") or _child(item, "lib_id")
+    lib = libs.get(_text(lib_name[1])) if lib_name else None
+    at = _child(item, "at")
+    if lib is None or at is None:
+        return
+    reference = None
+    for path in _children(_child(_child(item, "instances") or [], "project") or [], "path"):
+        reference = _text((_child(path, "reference") or ["", ""])[1])
+        break
+    ref = reference or _property(item, "Reference")
+    value = _property(item, "Value")
+    if not lib.power and not ref.startswith("#"):
+        lib_id = _text((_child(item, "lib_id") or ["", ""])[1])
+        nickname, _, part = lib_id.rpartition(":")
+        conn.components.setdefault(ref, Component(ref, value, _property(item, "Footprint"), nickname, part))
+
+    x, y = to_iu(at[1]), to_iu(at[2])
+    angle = round(float(at[3])) if len(at) > 3 else 0
+    mirror = _text((_child(item, "mirror") or ["", ""])[1])
+    unit = _int(_child(item, "unit"), 1)
+    body_style = _int(_child(item, "body_style") or _child(item, "convert"), 1)
+    symbol = _text((_child(item, "uuid") or ["", ""])[1])
+    pin_uuids = {_text(pin[1]): _text((_child(pin, "uuid") or ["", ""])[1])
+                 for pin in _children(item, "pin") if len(pin) > 1}
+    for lp in lib.unit_pins(unit, body_style):
+        px, py = place(lp.x, lp.y, x, y, angle, mirror)
+        conn.add_pin(PlacedPin(ref, lp.number, lp.name, lp.pintype, px, py, value if lib.power else None,
+                               lp.shape, pin_uuids.get(lp.number, ""), symbol))
+
+
+def loads(text) -> Connectivity:
+    items = parse_raw(text)
+    if not items or not isinstance(items[0], list) or items[0][:1] != ["kicad_sch"]:
+        raise ValueError("No (kicad_sch ...) list found")
+    return from_items(items[0])
+
+
+def load(path: str) -> Connectivity:
+    with open(path, "r", encoding="utf-8") as f:
+        return loads(f.read())
+
+
+# ------------------------
+# Comparing with an export
+# ------------------------
+
+
+@dataclass
+class Comparison:
+    matched: List[str] = field(default_factory=list)
+    # (exported name, derived name) of nets with the same pins
+    renamed: List[Tuple[str, str]] = field(default_factory=list)
+    # exported net -> the derived nets its pins ended up on
+    split: Dict[str, List[str]] = field(default_factory=dict)
+    # derived net -> the exported nets its pins came from
+    merged: Dict[str, List[str]] = field(default_factory=dict)
+    # pins of the export the schematic geometry does not produce
+    missing: List[Pin] = field(default_factory=list)
+
+    def differences(self) -> int:
+        return len(self.split) + len(self.merged) + len(self.missing)
+
+
+def compare(derived: Netlist, exported: Netlist) -> Comparison:
+    """How the derived nets line up with an exported netlist, by pins."""
+    result = Comparison()
+    origin: Dict[str, set] = {}
+    for code, name in zip(exported.net_codes, exported.net_names):
+        targets: Dict[str, None] = {}
+        pins = exported.pins(code)
+        for pin in pins:
+            net = derived.net_of(pin.ref, pin.pin)
+            if net is None:
+                result.missing.append(pin)
+            else:
+                targets.setdefault(net, None)
+                origin.setdefault(net, set()).add(name)
+        if len(targets) > 1:
+            result.split[name] = list(targets)
+        elif targets:
+            (net,) = targets
+            if len(derived.pins(net)) == len(pins):
+                if net == name:
+                    result.matched.append(name)
+                else:
+                    result.renamed.append((name, net))
+    for net, names in origin.items():
+        if len(names) > 1:
+            result.merged[net] = sorted(names)
+    return result
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Derive the nets of a schematic from its wires, labels and pins")
+    ap.add_argument("input", nargs="?", default='../src/device.kicad_sch')
+    ap.add_argument("--netlist", default='../src/device.net', help="Exported netlist to compare against ('' to skip)")
+    ap.add_argument("--nets", action="store_true", help="List the derived nets and their pins")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    conn = load(args.input)
+    t1 = time.perf_counter()
+    derived = conn.netlist()
+    t2 = time.perf_counter()
+    print(f"{len(conn.wires)} wires, {len(conn.junctions)} junctions, {len(conn.labels)} labels, "
+          f"{len(conn.pins)} pins -> {len(derived)} nets "
+          f"(read {(t1 - t0) * 1000:.1f} ms, connected {(t2 - t1) * 1000:.1f} ms)")
+    if args.nets:
+        for code, name in zip(derived.net_codes, derived.net_names):
+            print(f"{name}: " + " ".join(f"{p.ref}.{p.pin}" for p in derived.pins(code)))
+
+    if args.netlist:
+        report = compare(derived, load_netlist(args.netlist))
+        print(f"Against {args.netlist}: {len(report.matched)} nets identical, {len(report.renamed)} renamed, "
+              f"{len(report.split)} split, {len(report.merged)} merged, {len(report.missing)} pins missing")
+        for old, new in report.renamed:
+            print(f"  renamed: {old} -> {new}")
+        for name, nets in report.split.items():
+            print(f"  split: {name} -> {', '.join(nets)}")
+        for net, names in report.merged.items():
+            print(f"  merged: {net} <- {', '.join(names)}")
+        for pin in report.missing:
+            print(f"  missing: {pin.ref}.{pin.pin}")
+        if report.differences():
+            sys.exit(1)
@@ -0,0 +1,250 @@
+"""cst.py
+
+Concrete-syntax round-tripping for the helper scripts in misc/.
+
+sexpr.parse_raw() and sexpr.loads() throw the original formatting away, so
+writing a tree back means re-rendering all of it, and a one-token fix turns
+into a whole-file diff. The parsers here return the same trees plus a
+``SourceMap`` that remembers where every list and atom came from.
+``SourceMap.dumps()`` then copies the original text of every subtree that is
+still as it was parsed and only renders what changed:
+
+- a list whose children are all unchanged is copied verbatim, comments and
+  whitespace included;
+- a list that was edited keeps its own opening, closing and the whitespace
+  between children; unchanged children are copied from the source, new or
+  replaced ones are rendered with the caller's ``render(expr, indent)``
+  (indented to match the whitespace in front of them);
+- a list that was moved, unchanged, to another parent is still copied
+  verbatim.
+
+Changes are detected by comparing the tree against what was parsed (lists by
+identity, atoms by type and value), so callers can keep editing trees in
+place exactly as before.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from sexpr import ParseError, RawExpr, SExpr, Source, Str, Sym, as_text, lex, unescape
+
+Expr = Union[SExpr, RawExpr]
+Render = Callable[[Expr, int], str]
+
+
+class _ListSpan:
+    __slots__ = ("node", "start", "inner", "end", "kids")
+
+    def __init__(self, node: list, start: int, inner: int):
+        self.node = node
+        self.start = start
+        # Offset just after the opening '(' (the start itself for the document).
+        self.inner = inner
+        self.end = -1
+        # (child, start, end) of every child as parsed.
+        self.kids: List[Tuple[Expr, int, int]] = []
+
+
+class SourceMap:
+    def __init__(self, text: Source):
+        self.text = text
+        self._lists: Dict[int, _ListSpan] = {}
+        self._doc: Optional[_ListSpan] = None
+
+    # ------------------------
+    # Change detection
+    # ------------------------
+
+    def _record(self, node: Expr) -> Optional[_ListSpan]:
+        rec = self._lists.get(id(node))
+        return rec if rec is not None and rec.node is node else None
+
+    @staticmethod
+    def _same_atom(a: Expr, b: Expr) -> bool:
+        return type(a) is type(b) and a == b
+
+    def _is_clean(self, rec: _ListSpan, memo: Dict[int, bool]) -> bool:
+        clean = memo.get(id(rec.node))
+        if clean is not None:
+            return clean
+        # Depth first with an explicit stack of (list, its children paired
+        # with the parsed ones); ``clean`` carries the verdict of the list
+        # finished last back up to its parent.
+        stack = [(rec, self._pairs(rec))]
+        clean = True
+        while stack:
+            top, pairs = stack[-1]
+            pending = None
+            if pairs is None or not clean:
+                clean = False
+            else:
+                for child, (orig, _, _) in pairs:
+                    if isinstance(child, list):
+                        sub = self._record(child) if child is orig else None
+                        if sub is None:
+                            clean = False
+                            break
+                        known = memo.get(id(child))
+                        if known is None:
+                            pending = sub
+                            break
+                        if not known:
+                            clean = False
+                            break
+                    elif isinstance(orig, list) or not self._same_atom(child, orig):
+                        clean = False
+                        break
+            if pending is not None:
+                stack.append((pending, self._pairs(pending)))
+                continue
+            memo[id(top.node)] = clean
+            stack.pop()
+        return clean
+
+    @staticmethod
+    def _pairs(rec: _ListSpan):
+        if len(rec.node) != len(rec.kids):
+            return None
+        return zip(rec.node, rec.kids)
+
+    def _matches(self, child: Expr, orig: Expr) -> bool:
+        if isinstance(child, list):
+            return child is orig
+        return not isinstance(orig, list) and self._same_atom(child, orig)
+
+    # ------------------------
+    # Writing
+    # ------------------------
+
+    def dumps(self, items: List[Expr], render: Render) -> str:
+        """Text of the document whose top-level items are ``items``."""
+        if self._doc is None:
+            raise ValueError("SourceMap has no parsed document")
+        out: List[str] = []
+        memo: Dict[int, bool] = {}
+        # One _emit_children() generator per edited list still open; each
+        # hands back the children it can't copy itself.
+        stack = [self._emit_children(self._doc, items, out)]
+        while stack:
+            for node, gap in stack[-1]:
+                rec = self._record(node) if isinstance(node, list) else None
+                if rec is None:
+                    nl = gap.rfind("\n")
+                    indent = gap.count("\t", nl + 1) if nl >= 0 else 0
+                    out.append(render(node, indent).lstrip("\t"))
+                elif self._is_clean(rec, memo):
+                    out.append(as_text(self.text, rec.start, rec.end))
+                else:
+                    out.append(as_text(self.text, rec.start, rec.inner))
+                    stack.append(self._emit_children(rec, node, out))
+                    break
+            else:
+                stack.pop()
+        return "".join(out)
+
+    def _emit_children(self, rec: _ListSpan, node: List[Expr],
+                       out: List[str]) -> Iterator[Tuple[Expr, str]]:
+        """Write the inside of an edited list to ``out``, yielding (child,
+        gap in front of it) for every child that dumps() has to write."""
+        text, kids = self.text, rec.kids
+        gaps = []
+        prev = rec.inner
+        for _, s, e in kids:
+            gaps.append(as_text(text, prev, s))
+            prev = e
+        tail = as_text(text, prev, rec.end)
+
+        # Children that still line up with the parse at the front and at the
+        # back keep their own leading whitespace; everything in between is
+        # laid out like the original child it replaces (or the last one).
+        n, m = len(node), len(kids)
+        p = 0
+        while p < min(n, m) and self._matches(node[p], kids[p][0]):
+            p += 1
+        q = 0
+        while q < min(n, m) - p and self._matches(node[n - 1 - q], kids[m - 1 - q][0]):
+            q += 1
+
+        for i, child in enumerate(node):
+            if i < p:
+                k = i
+            elif i >= n - q:
+                k = i - n + m
+            else:
+                k = min(i, m - 1) if m else -1
+                gap = gaps[k] if k >= 0 else ""
+                if i and not gap:
+                    gap = " "
+                out.append(gap)
+                yield child, gap
+                continue
+            out.append(gaps[k])
+            if isinstance(child, list):
+                yield child, gaps[k]
+            else:
+                out.append(as_text(text, kids[k][1], kids[k][2]))
+        out.append(tail)
+
+
+# ------------------------
+# Parsing
+# ------------------------
+
+
+def _parse(text: Source, typed: bool) -> Tuple[List[Expr], SourceMap]:
+    smap = SourceMap(text)
+    lists = smap._lists
+    doc = _ListSpan([], 0, 0)
+    stack = [doc]
+    current = doc
+
+    for kind, s, e in lex(text):
+        if kind == "LPAR":
+            node: list = []
+            current.node.append(node)
+            current.kids.append((node, s, -1))
+            current = _ListSpan(node, s, e)
+            lists[id(node)] = current
+            stack.append(current)
+            continue
+        if kind == "RPAR":
+            if len(stack) == 1:
+                raise ParseError(f"Unexpected ')' at offset {s}", s)
+            current.end = e
+            stack.pop()
+            parent = stack[-1]
+            node, start, _ = parent.kids[-1]
+            parent.kids[-1] = (node, start, e)
+            current = parent
+            continue
+        if not typed:
+            atom: Expr = as_text(text, s, e)
+        elif kind == "STR":
+            atom = Str(unescape(as_text(text, s + 1, e - 1)))
+        else:
+            atom = Sym(as_text(text, s, e))
+        current.node.append(atom)
+        current.kids.append((atom, s, e))
+
+    if len(stack) > 1:
+        raise ParseError("Unclosed '(' at end of file", stack[-1].start)
+    doc.end = len(text)
+    smap._doc = doc
+    return doc.node, smap
+
+
+def parse_raw_cst(text: Source) -> Tuple[List[RawExpr], SourceMap]:
+    """Like sexpr.parse_raw(), plus a SourceMap for writing the items back."""
+    return _parse(text, typed=False)
+
+
+def loads_cst(text: Source) -> Tuple[SExpr, SourceMap]:
+    """Like sexpr.loads(), plus a SourceMap; write back with
+    ``smap.dumps([root], render)``."""
+    items, smap = _parse(text, typed=True)
+    if not items:
+        raise ParseError("No s-expression found")
+    if len(items) != 1 or not isinstance(items[0], list):
+        raise ParseError("Expected a single top-level s-expression list")
+    return items[0], smap
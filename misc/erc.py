@@ -0,0 +1,396 @@
+"""erc.py
+
+The ERC checks that come up most often, run in-process on the connectivity
+that connectivity.py derives from the schematic geometry. A full kicad-cli
+run is no longer needed just to find out that a label dangles.
+
+Checked, as kicad-cli does on a root sheet:
+
+  pin_not_connected          hierarchical labels in the root sheet (there is
+                             no parent sheet to connect to), and symbol pins
+                             whose subgraph holds nothing but that pin
+  label_dangling             labels touching nothing, and labels whose net
+                             has fewer than two pins and no no-connect
+  wire_dangling              subgraphs made of wires only
+  unconnected_wire_endpoint  wire ends touching nothing
+  endpoint_off_grid          the first off-grid end of each wire and the
+                             first off-grid pin of each symbol
+
+kicad-cli has no check of its own for one more case, reported here as
+``missing_junction``: a wire end or pin that lands on the middle of a wire
+with no junction there. It looks connected but is not.
+
+A subgraph is the set of items that touch on the sheet, before labels and
+power symbols join subgraphs into nets; connectivity.Connectivity is read
+once after each of those two steps.
+
+The output is an erc.v1 report with the uuids, positions and descriptions
+kicad-cli uses, so the two can be compared violation for violation
+(``--compare``). kicad-cli 9 writes schematic positions and lengths in units
+of 100 mm: it converts schematic internal units with the board's scale. That
+is reproduced here on purpose.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import connectivity
+from connectivity import GRID_MM, IU_PER_MM, Connectivity, Label, PlacedPin, Point
+
+SCHEMA = "https://schemas.kicad.org/erc.v1.json"
+VERSION = "erc.py"
+
+# The unit positions are written in (see the module docstring).
+_REPORT_IU = IU_PER_MM * 100
+
+SEVERITY = {
+    "pin_not_connected": "error",
+    "label_dangling": "error",
+    "wire_dangling": "error",
+    "unconnected_wire_endpoint": "warning",
+    "missing_junction": "warning",
+    "endpoint_off_grid": "warning",
+}
+
+_LABEL_KINDS = {"label": "Label", "global_label": "Global Label", "hierarchical_label": "Hierarchical Label"}
+
+_PIN_TYPES = {
+    "input": "Input", "output": "Output", "bidirectional": "Bidirectional", "tri_state": "Tri-state",
+    "passive": "Passive", "free": "Free", "unspecified": "Unspecified", "power_in": "Power input",
+    "power_out": "Power output", "open_collector": "Open collector", "open_emitter": "Open emitter",
+    "no_connect": "Unconnected",
+}
+
+_PIN_SHAPES = {
+    "line": "Line", "inverted": "Inverted", "clock": "Clock", "inverted_clock": "Inverted clock",
+    "input_low": "Input low", "clock_low": "Clock low", "output_low": "Output low",
+    "edge_clock_high": "Falling edge clock", "non_logic": "NonLogic",
+}
+
+# Pin types that are fine left unconnected.
+_UNCONNECTABLE = ("no_connect", "free")
+
+
+# ------------------------
+# Violations
+# ------------------------
+
+
+@dataclass
+class Item:
+    description: str
+    x: int
+    y: int
+    uuid: str
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"description": self.description,
+                "pos": {"x": round(self.x / _REPORT_IU, 8), "y": round(self.y / _REPORT_IU, 8)},
+                "uuid": self.uuid}
+
+
+@dataclass
+class Violation:
+    type: str
+    description: str
+    items: List[Item] = field(default_factory=list)
+
+    @property
+    def severity(self) -> str:
+        return SEVERITY[self.type]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"description": self.description, "items": [item.to_json() for item in self.items],
+                "severity": self.severity, "type": self.type}
+
+
+def _length(iu: float) -> str:
+    return f"{iu / _REPORT_IU:.4f}".rstrip("0").rstrip(".") + " mm"
+
+
+def label_item(label: Label) -> Item:
+    return Item(f"{_LABEL_KINDS[label.kind]} '{label.text}'", label.x, label.y, label.uuid)
+
+
+def wire_item(conn: Connectivity, w: int, p: Point) -> Item:
+    x1, y1, x2, y2 = conn.wires[w]
+    kind = "Horizontal Wire" if y1 == y2 else "Vertical Wire" if x1 == x2 else "Wire"
+    length = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+    return Item(f"{kind}, length {_length(length)}", p[0], p[1], conn.wire_uuids[w])
+
+
+def pin_item(pin: PlacedPin) -> Item:
+    kind = _PIN_TYPES.get(pin.pintype, pin.pintype)
+    shape = _PIN_SHAPES.get(pin.shape, pin.shape)
+    # As in KiCad, the name is left out when it is hidden ("~") or repeats the number.
+    if pin.name not in ("", "~", pin.number):
+        detail = f"[{pin.name}, {kind}, {shape}]"
+    else:
+        detail = f"[{kind}, {shape}]"
+    return Item(f"Symbol {pin.ref} Pin {pin.number} {detail}", pin.x, pin.y, pin.uuid)
+
+
+# ------------------------
+# Subgraphs and nets
+# ------------------------
+
+
+class Context:
+    """What the checks share: every item's subgraph and net, and tallies of
+    both, computed once."""
+
+    def __init__(self, conn: Connectivity, grid_mm: float = GRID_MM):
+        self.conn = conn
+        self.grid = round(grid_mm * IU_PER_MM)
+        find, node = conn.sets.find, conn.node
+
+        conn.union_geometry()
+        self.subgraph = array("i", (find(n) for n in range(len(conn.sets))))
+        conn.union_names()
+        self.net = array("i", (find(n) for n in range(len(conn.sets))))
+        sub, net = self.subgraph, self.net
+
+        # subgraph -> its pins / labels / wires, and the subgraphs and nets
+        # with a no-connect marker
+        self.pins: Dict[int, List[PlacedPin]] = {}
+        self.labels: Dict[int, List[Label]] = {}
+        self.wires: Dict[int, List[int]] = {}
+        self.nc_subgraphs: Set[int] = set()
+        self.nc_nets: Set[int] = set()
+        self.net_pins: Counter = Counter()
+        for pin in conn.pins:
+            n = node((pin.x, pin.y))
+            self.pins.setdefault(sub[n], []).append(pin)
+            self.net_pins[net[n]] += 1
+        for label in conn.labels:
+            self.labels.setdefault(sub[node((label.x, label.y))], []).append(label)
+        for w, (x1, y1, _, _) in enumerate(conn.wires):
+            self.wires.setdefault(sub[node((x1, y1))], []).append(w)
+        for p in conn.no_connects:
+            self.nc_subgraphs.add(sub[node(p)])
+            self.nc_nets.add(net[node(p)])
+
+        # Points a wire end connects to when it lands on them.
+        self.wire_ends: Counter = Counter()
+        for x1, y1, x2, y2 in conn.wires:
+            self.wire_ends[(x1, y1)] += 1
+            self.wire_ends[(x2, y2)] += 1
+        self.anchors: Set[Point] = set(conn.junctions)
+        self.anchors.update(conn.no_connects)
+        self.anchors.update((pin.x, pin.y) for pin in conn.pins)
+        self.anchors.update((label.x, label.y) for label in conn.labels)
+
+    def mid_wires(self, p: Point) -> List[int]:
+        """Wires ``p`` lies on the middle of (their ends excluded)."""
+        wires = self.conn.wires
+        return [w for w in self.conn.wires_at(p)
+                if p != (wires[w][0], wires[w][1]) and p != (wires[w][2], wires[w][3])]
+
+    def floating(self, sub: int) -> bool:
+        """A subgraph of wires (and junctions) only."""
+        return sub in self.wires and sub not in self.pins and sub not in self.labels \
+            and sub not in self.nc_subgraphs
+
+    def off_grid(self, x: int, y: int) -> bool:
+        return x % self.grid != 0 or y % self.grid != 0
+
+
+# ------------------------
+# Checks
+# ------------------------
+
+
+def check_hierarchical_labels(ctx: Context) -> Iterable[Violation]:
+    # The schematic is checked as a root sheet: it has no parent sheet pins.
+    for label in ctx.conn.labels:
+        if label.kind == "hierarchical_label":
+            yield Violation("pin_not_connected",
+                            f'Hierarchical label "{label.text}" in root sheet cannot be connected to '
+                            f'non-existent parent sheet', [label_item(label)])
+
+
+def check_labels(ctx: Context) -> Iterable[Violation]:
+    node = ctx.conn.node
+    for sub, labels in ctx.labels.items():
+        if sub not in ctx.wires and sub not in ctx.pins and sub not in ctx.nc_subgraphs:
+            # Touching nothing; as in KiCad, once per subgraph.
+            yield Violation("label_dangling", "Label not connected to anything", [label_item(labels[0])])
+            continue
+        if sub in ctx.nc_subgraphs:
+            continue
+        for label in labels:
+            net = ctx.net[node((label.x, label.y))]
+            pins = ctx.net_pins[net]
+            if pins == 0 or (pins == 1 and net not in ctx.nc_nets):
+                yield Violation("label_dangling", "Label not connected to anything", [label_item(label)])
+
+
+def check_pins(ctx: Context) -> Iterable[Violation]:
+    for sub, pins in ctx.pins.items():
+        if sub in ctx.labels or sub in ctx.nc_subgraphs:
+            continue
+        # Stacked pins (same symbol, same place) count as one.
+        if len({(pin.symbol, pin.x, pin.y) for pin in pins}) > 1:
+            continue
+        pin = next((p for p in pins if p.power is not None), pins[0])
+        if pin.pintype not in _UNCONNECTABLE:
+            yield Violation("pin_not_connected", "Pin not connected", [pin_item(pin)])
+
+
+def check_wires(ctx: Context) -> Iterable[Violation]:
+    conn = ctx.conn
+    floating = set()
+    for sub, wires in ctx.wires.items():
+        if ctx.floating(sub):
+            floating.update(wires)
+            x1, y1, _, _ = conn.wires[wires[0]]
+            yield Violation("wire_dangling", "Wires not connected to anything",
+                            [wire_item(conn, wires[0], (x1, y1))])
+    for w, (x1, y1, x2, y2) in enumerate(conn.wires):
+        if w in floating or (x1, y1) == (x2, y2):
+            continue
+        for p in ((x1, y1), (x2, y2)):
+            if ctx.wire_ends[p] > 1 or p in ctx.anchors or ctx.mid_wires(p):
+                continue
+            yield Violation("unconnected_wire_endpoint", "Unconnected wire endpoint", [wire_item(conn, w, p)])
+
+
+def check_junctions(ctx: Context) -> Iterable[Violation]:
+    conn = ctx.conn
+    junctions = set(conn.junctions)
+    touching: Dict[Point, Item] = {}
+    for w, (x1, y1, x2, y2) in enumerate(conn.wires):
+        touching.setdefault((x1, y1), wire_item(conn, w, (x1, y1)))
+        touching.setdefault((x2, y2), wire_item(conn, w, (x2, y2)))
+    for pin in conn.pins:
+        touching.setdefault((pin.x, pin.y), pin_item(pin))
+    for p, item in touching.items():
+        if p in junctions:
+            continue
+        for w in ctx.mid_wires(p):
+            yield Violation("missing_junction", "Wire end or pin on the middle of a wire without a junction",
+                            [item, wire_item(conn, w, p)])
+
+
+def check_grid(ctx: Context) -> Iterable[Violation]:
+    conn = ctx.conn
+    description = "Symbol pin or wire end off connection grid"
+    for w, (x1, y1, x2, y2) in enumerate(conn.wires):
+        for p in ((x1, y1), (x2, y2)):
+            if ctx.off_grid(*p):
+                yield Violation("endpoint_off_grid", description, [wire_item(conn, w, p)])
+                break
+    reported = set()
+    for pin in conn.pins:
+        if pin.symbol not in reported and ctx.off_grid(pin.x, pin.y):
+            reported.add(pin.symbol)
+            yield Violation("endpoint_off_grid", description, [pin_item(pin)])
+
+
+CHECKS: List[Callable[[Context], Iterable[Violation]]] = [
+    check_hierarchical_labels,
+    check_labels,
+    check_pins,
+    check_wires,
+    check_junctions,
+    check_grid,
+]
+
+
+def check(conn: Connectivity, grid_mm: float = GRID_MM) -> List[Violation]:
+    ctx = Context(conn, grid_mm)
+    return [v for fn in CHECKS for v in fn(ctx)]
+
+
+# ------------------------
+# Reports
+# ------------------------
+
+
+def report(conn: Connectivity, violations: List[Violation], source: str) -> Dict[str, Any]:
+    """The erc.v1 report for a root sheet."""
+    return {
+        "$schema": SCHEMA,
+        "coordinate_units": "mm",
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "kicad_version": VERSION,
+        "sheets": [{"path": "/", "uuid_path": "/" + conn.uuid,
+                    "violations": [v.to_json() for v in violations]}],
+        "source": source,
+    }
+
+
+def violation_key(violation: Dict[str, Any]) -> Tuple:
+    """What identifies a violation in an erc.v1 report: its type and items."""
+    return (violation.get("type"),) + tuple(
+        (item.get("uuid"), round(item["pos"]["x"], 6), round(item["pos"]["y"], 6))
+        for item in violation.get("items", []))
+
+
+def compare_reports(ours: Dict[str, Any], theirs: Dict[str, Any]) -> Tuple[List[Tuple], List[Tuple], int]:
+    """(missing, extra, not checked): violations of ``theirs`` that ``ours``
+    lacks, the reverse, and how many of ``theirs`` are of types not checked
+    here."""
+    def keys(rep: Dict[str, Any], types: Optional[Set[str]] = None) -> Counter:
+        return Counter(violation_key(v) for sheet in rep.get("sheets", [])
+                       for v in sheet.get("violations", []) if types is None or v.get("type") in types)
+
+    checked = set(SEVERITY)
+    mine, other = keys(ours), keys(theirs, checked)
+    skipped = sum(keys(theirs).values()) - sum(other.values())
+    return list((other - mine).elements()), list((mine - other).elements()), skipped
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run the common ERC checks in-process and write an erc.v1 report")
+    ap.add_argument("input", nargs="?", default='../src/device.kicad_sch')
+    ap.add_argument("-o", "--output", default=None, help="Write the erc.v1 report here ('-' for stdout)")
+    ap.add_argument("--grid", type=float, default=GRID_MM, help="Connection grid in mm (default: %(default)s)")
+    ap.add_argument("--compare", default=None, help="kicad-cli erc.v1 report to compare against")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    conn = connectivity.load(args.input)
+    t1 = time.perf_counter()
+    violations = check(conn, args.grid)
+    t2 = time.perf_counter()
+    result = report(conn, violations, os.path.basename(args.input))
+
+    if args.output == "-":
+        print(json.dumps(result, indent=4))
+    else:
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=4)
+        for v in violations:
+            print(f"{v.severity} {v.type}: {v.description}")
+            for item in v.items:
+                pos = item.to_json()["pos"]
+                print(f"  @({pos['x']}, {pos['y']}): {item.description}")
+    counts = Counter(v.type for v in violations)
+    print(f"{len(violations)} violations ({', '.join(f'{n} {t}' for t, n in sorted(counts.items())) or 'none'}) "
+          f"(read {(t1 - t0) * 1000:.1f} ms, checked {(t2 - t1) * 1000:.1f} ms)",
+          file=sys.stderr if args.output == "-" else sys.stdout)
+
+    failed = any(v.severity == "error" for v in violations)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            missing, extra, skipped = compare_reports(result, json.load(f))
+        print(f"Against {args.compare}: {len(missing)} missing, {len(extra)} extra, "
+              f"{skipped} of types not checked here")
+        for key in missing:
+            print(f"  missing: {key}")
+        for key in extra:
+            print(f"  extra: {key}")
+        failed = failed or bool(missing or extra)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,120 @@
+"""erc_cache.py
+
+Persistent, content-addressed cache of kicad-cli ERC probe results.
+
+Entries are keyed by a hash of the exact candidate text handed to kicad-cli
+plus the kicad-cli version string, and store whether the file loaded and the
+erc.v1 JSON report it produced. Each entry is one small JSON file in the cache
+directory; the least recently used ones are evicted once the directory grows
+past ``max_bytes``. Recency is tracked through file mtimes, so it survives
+across runs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# mkstemp creates its files 0600; saved files get the usual 0644 less the
+# umask. Reading the umask means setting it, so that is done once, here.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kicad_erc_probes")
+
+
+class ProbeCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def key(text: str, version: str) -> str:
+        h = hashlib.sha256()
+        h.update(version.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def _load_index(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    def get(self, key: str) -> Optional[Tuple[bool, Optional[Dict[str, Any]]]]:
+        """Return (loaded_ok, erc_report) for ``key``, or None on a miss."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return bool(entry["ok"]), entry.get("erc")
+
+    def put(self, key: str, ok: bool, erc: Optional[Dict[str, Any]]) -> None:
+        data = json.dumps({"ok": ok, "erc": erc}).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644 & ~_UMASK)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._forget(key)
+            self._index[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total -= size
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
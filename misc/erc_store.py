@@ -0,0 +1,211 @@
+"""erc_store.py
+
+Index of erc.v1 reports, from kicad-cli or erc.py, for comparing runs rather
+than reading them by eye.
+
+Every violation of every loaded report is filed under the key
+(type, item uuids, sheet path). The uuids are those of the items the
+violation names, usually one. This key stays the same from run to run as long
+as the item does, whatever else moved in the report. With one dict per run:
+
+  - ``diff(old, new)`` sorts violations into new, fixed and unchanged in a
+    single pass over the two key sets;
+  - ``counts()`` aggregates violations by type, per run and over all runs;
+  - ``find(uuid)`` lists every run's violations naming an item;
+  - ``join(run, schematic)`` finds, for each violation, the item of the
+    schematic that owns its uuid and the top-level item around it (a pin
+    and its symbol), through uuid_index.py.
+
+A key seen several times in one run (two markers on the same item) counts
+once per marker.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import uuid_index
+from uuid_index import UuidSpan
+
+# (type, item uuids, sheet path)
+Key = Tuple[str, Tuple[str, ...], str]
+
+
+@dataclass
+class Violation:
+    type: str
+    severity: str
+    description: str
+    sheet: str
+    items: List[Dict[str, Any]]
+
+    @property
+    def key(self) -> Key:
+        return self.type, tuple(item.get("uuid", "") for item in self.items), self.sheet
+
+
+class Run:
+    """One report, indexed by key and by item uuid."""
+
+    def __init__(self, name: str, report: Dict[str, Any]):
+        self.name = name
+        self.source = report.get("source", "")
+        self.date = report.get("date", "")
+        self.kicad_version = report.get("kicad_version", "")
+        self.violations: Dict[Key, List[Violation]] = {}
+        self.by_uuid: Dict[str, List[Key]] = {}
+        for sheet in report.get("sheets", []):
+            path = sheet.get("path", "/")
+            for v in sheet.get("violations", []):
+                violation = Violation(v.get("type", ""), v.get("severity", ""), v.get("description", ""),
+                                      path, v.get("items", []))
+                key = violation.key
+                same = self.violations.setdefault(key, [])
+                if not same:
+                    for uuid in key[1]:
+                        self.by_uuid.setdefault(uuid, []).append(key)
+                same.append(violation)
+
+    def __len__(self) -> int:
+        return sum(len(vs) for vs in self.violations.values())
+
+    def __iter__(self) -> Iterable[Violation]:
+        for vs in self.violations.values():
+            yield from vs
+
+    def counts(self) -> Counter:
+        """Violations by type."""
+        result: Counter = Counter()
+        for key, vs in self.violations.items():
+            result[key[0]] += len(vs)
+        return result
+
+
+@dataclass
+class Diff:
+    new: List[Violation] = field(default_factory=list)
+    fixed: List[Violation] = field(default_factory=list)
+    unchanged: List[Violation] = field(default_factory=list)
+
+
+def diff(old: Run, new: Run) -> Diff:
+    result = Diff()
+    for key, vs in new.violations.items():
+        before = len(old.violations.get(key, ()))
+        result.unchanged.extend(vs[:before])
+        result.new.extend(vs[before:])
+    for key, vs in old.violations.items():
+        result.fixed.extend(vs[len(new.violations.get(key, ())):])
+    return result
+
+
+class ErcStore:
+    def __init__(self):
+        # name -> run, in the order they were added
+        self.runs: Dict[str, Run] = {}
+
+    def add(self, report: Dict[str, Any], name: Optional[str] = None) -> Run:
+        name = name or report.get("source") or f"run{len(self.runs)}"
+        run = self.runs[name] = Run(name, report)
+        return run
+
+    def load(self, path: str) -> Run:
+        with open(path, "r", encoding="utf-8") as f:
+            return self.add(json.load(f), path)
+
+    def counts(self) -> Tuple[Dict[str, Counter], Counter]:
+        """(violations by type per run, violations by type over all runs)."""
+        per_run = {name: run.counts() for name, run in self.runs.items()}
+        total: Counter = Counter()
+        for counts in per_run.values():
+            total.update(counts)
+        return per_run, total
+
+    def find(self, uuid: str) -> List[Tuple[str, Violation]]:
+        """(run name, violation) for every violation naming ``uuid``."""
+        found = []
+        for name, run in self.runs.items():
+            for key in run.by_uuid.get(uuid, ()):
+                found.extend((name, v) for v in run.violations[key])
+        return found
+
+
+# ------------------------
+# Joining with a schematic
+# ------------------------
+
+
+def join(run: Run, schematic: str) -> List[Tuple[Violation, List[Optional[UuidSpan]]]]:
+    """Each violation of ``run`` with where each of its items is in the
+    schematic at path ``schematic`` (None for a uuid it does not contain)."""
+    index = uuid_index.load(schematic)
+    result = []
+    for v in run:
+        spans = [index.find(uuid) for uuid in v.key[1]]
+        result.append((v, [found[0] if found else None for found in spans]))
+    return result
+
+
+def _describe(v: Violation) -> str:
+    items = "; ".join(item.get("description", "") for item in v.items)
+    return f"{v.severity} {v.type} [{v.sheet}]: {items}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Index erc.v1 reports: counts by type, run-to-run diffs, uuid lookups")
+    ap.add_argument("reports", nargs="+", help="erc.v1 JSON reports, oldest first")
+    ap.add_argument("--diff", action="store_true", help="Diff each report against the one before it")
+    ap.add_argument("--uuid", action="append", default=[], help="List the violations naming this item uuid")
+    ap.add_argument("--join", metavar="SCHEMATIC", default=None,
+                    help="Locate the items of the last report's violations in this schematic")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    store = ErcStore()
+    runs = [store.load(path) for path in args.reports]
+    t1 = time.perf_counter()
+
+    per_run, total = store.counts()
+    types = sorted(total)
+    width = max([len(t) for t in types] + [5])
+    print(f"{'type':<{width}} " + " ".join(f"{os.path.basename(r.name)[:14]:>14}" for r in runs)
+          + (f" {'total':>8}" if len(runs) > 1 else ""))
+    for t in types:
+        print(f"{t:<{width}} " + " ".join(f"{per_run[r.name][t]:>14}" for r in runs)
+              + (f" {total[t]:>8}" if len(runs) > 1 else ""))
+    print(f"Loaded {sum(len(r) for r in runs)} violations from {len(runs)} report(s) in {(t1 - t0) * 1000:.1f} ms")
+
+    if args.diff:
+        for old, new in zip(runs, runs[1:]):
+            d = diff(old, new)
+            print(f"{old.name} -> {new.name}: {len(d.new)} new, {len(d.fixed)} fixed, {len(d.unchanged)} unchanged")
+            for v in d.new:
+                print(f"  + {_describe(v)}")
+            for v in d.fixed:
+                print(f"  - {_describe(v)}")
+
+    for uuid in args.uuid:
+        found = store.find(uuid)
+        print(f"{uuid}: {len(found)} violation(s)")
+        for name, v in found:
+            print(f"  {name}: {_describe(v)}")
+
+    if args.join:
+        joined = join(runs[-1], args.join)
+        unowned = 0
+        for v, items in joined:
+            where = ", ".join("(not in schematic)" if o is None else f"{o.line}:{o.col} ({o.head})"
+                              if o.start == o.item_start else f"{o.line}:{o.col} ({o.head} in {o.item} at line {o.item_line})"
+                              for o in items)
+            unowned += sum(o is None for o in items)
+            print(f"{args.join}: {where}: {_describe(v)}")
+        if unowned:
+            print(f"{unowned} item uuid(s) not found in {args.join}")
+            sys.exit(1)
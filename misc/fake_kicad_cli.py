@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""fake_kicad_cli.py
+
+Stand-in for ``kicad-cli sch erc`` so isolate_error.py can be exercised where
+KiCad is not installed:
+
+    python3 isolate_error.py --validator "python3 fake_kicad_cli.py" FILE
+
+It "loads" the schematic with the shared sexpr parser and exits 0 when the
+file parses to a (kicad_sch ...) document, 1 otherwise, writing an empty
+erc.v1 report to --output on success. Set FAKE_KICAD_CLI_REJECT to a regex to
+also reject every document it matches, which is handy for planting "bad"
+items in a copy of a schematic. ``version`` prints a version string that
+includes that regex, so cached probe results don't leak between settings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import List
+
+from sexpr import ParseError, Sym, loads
+
+VERSION = "9.0.6"
+
+
+def main(argv: List[str]) -> int:
+    if argv[:1] == ["version"]:
+        print(f"{VERSION}-fake {os.environ.get('FAKE_KICAD_CLI_REJECT', '')}".rstrip())
+        return 0
+
+    ap = argparse.ArgumentParser(description="Minimal kicad-cli stand-in for testing")
+    ap.add_argument("group", choices=["sch"])
+    ap.add_argument("command", choices=["erc"])
+    ap.add_argument("input", type=Path)
+    ap.add_argument("--format", default="json")
+    ap.add_argument("--output", type=Path, default=None)
+    args = ap.parse_args(argv)
+
+    try:
+        text = args.input.read_text(encoding="utf-8")
+        root = loads(text)
+    except (OSError, ParseError) as e:
+        print(f"Failed to load schematic: {e}", file=sys.stderr)
+        return 1
+    if not (isinstance(root, list) and root and root[0] == Sym("kicad_sch")):
+        print("Failed to load schematic: not a kicad_sch file", file=sys.stderr)
+        return 1
+
+    reject = os.environ.get("FAKE_KICAD_CLI_REJECT")
+    if reject and re.search(reject, text):
+        print("Failed to load schematic: rejected by FAKE_KICAD_CLI_REJECT", file=sys.stderr)
+        return 1
+
+    if args.output is not None:
+        report = {
+            "$schema": "https://schemas.kicad.org/erc.v1.json",
+            "coordinate_units": "mm",
+            "kicad_version": VERSION,
+            "sheets": [{"path": "/", "violations": []}],
+            "source": args.input.name,
+        }
+        args.output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
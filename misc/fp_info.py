@@ -0,0 +1,320 @@
+"""fp_info.py
+
+Indexed, searchable view of KiCad's fp-info-cache.
+
+The cache is a timestamp line followed by one 7-line record per footprint:
+library nickname, footprint name, description, tags (keywords), order
+number, pad count and unique pad count. ``FootprintIndex`` streams it into
+columns instead of one object per record:
+
+    libs        List[str]      interned library nicknames
+    lib         array('I')     library of each footprint (index into libs)
+    names, descriptions, tags  List[str]
+    order, pads, unique_pads   array('I')
+
+plus an inverted index from lowercased tag/description words to footprint
+numbers. Name globs (KiCad footprint-filter style, ``*`` and ``?``, case
+insensitive, matched against ``lib:name`` when the pattern has a ':') run as
+one regex over a newline-joined block of all names rather than one fnmatch
+per footprint.
+
+The built index is saved to a binary sidecar next to the cache
+(``fp-info-cache.idx``) that is only reused while the cache's leading
+timestamp line is unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+
+_SIDECAR_MAGIC = b"FPIDX 1\n"
+
+# mkstemp creates its files 0600; saved files get the usual 0644 less the
+# umask. Reading the umask means setting it, so that is done once, here.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@dataclass
+class Footprint:
+    lib: str
+    name: str
+    description: str
+    tags: str
+    order: int
+    pads: int
+    unique_pads: int
+
+    @property
+    def id(self) -> str:
+        return f"{self.lib}:{self.name}"
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Regex source for a footprint-filter glob, confined to one line."""
+    return "".join("[^\n]*" if ch == "*" else "[^\n]" if ch == "?" else re.escape(ch) for ch in pattern)
+
+
+def words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class FootprintIndex:
+    def __init__(self, timestamp: str = ""):
+        self.timestamp = timestamp
+        self.libs: List[str] = []
+        self.lib = array("I")
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.tags: List[str] = []
+        self.order = array("I")
+        self.pads = array("I")
+        self.unique_pads = array("I")
+        # word -> footprint numbers, ascending
+        self.postings: Dict[str, array] = {}
+
+        self._lib_ids: Dict[str, int] = {}
+        self._by_id: Optional[Dict[str, int]] = None
+        self._blobs: Dict[bool, tuple] = {}
+
+    # ------------------------
+    # Building
+    # ------------------------
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "FootprintIndex":
+        it = iter(lines)
+        index = cls(next(it, "").rstrip("\n"))
+        for record in zip(*[it] * 7):
+            index._add(*(field.rstrip("\n") for field in record))
+        return index
+
+    def _add(self, lib: str, name: str, description: str, tags: str, order: str, pads: str, unique_pads: str) -> None:
+        n = len(self.names)
+        lib_id = self._lib_ids.get(lib)
+        if lib_id is None:
+            lib_id = self._lib_ids[lib] = len(self.libs)
+            self.libs.append(lib)
+        self.lib.append(lib_id)
+        self.names.append(name)
+        self.descriptions.append(description)
+        self.tags.append(tags)
+        self.order.append(int(order or 0))
+        self.pads.append(int(pads or 0))
+        self.unique_pads.append(int(unique_pads or 0))
+        postings = self.postings
+        for word in set(words(tags)) | set(words(description)):
+            posting = postings.get(word)
+            if posting is None:
+                posting = postings[word] = array("I")
+            posting.append(n)
+
+    # ------------------------
+    # Queries
+    # ------------------------
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, n: int) -> Footprint:
+        return Footprint(self.libs[self.lib[n]], self.names[n], self.descriptions[n], self.tags[n],
+                         self.order[n], self.pads[n], self.unique_pads[n])
+
+    def full_id(self, n: int) -> str:
+        return f"{self.libs[self.lib[n]]}:{self.names[n]}"
+
+    def find(self, footprint_id: str) -> Optional[int]:
+        """Number of the footprint ``lib:name``, or None."""
+        if self._by_id is None:
+            self._by_id = {self.full_id(n): n for n in range(len(self.names))}
+        return self._by_id.get(footprint_id)
+
+    def blob(self, with_lib: bool):
+        """(text, starts): every (lowercased) name, or ``lib:name``, on a line
+        of its own after a leading newline, and the offset each line starts at."""
+        hit = self._blobs.get(with_lib)
+        if hit is None:
+            keys = [self.full_id(n) for n in range(len(self.names))] if with_lib else self.names
+            starts = array("I")
+            pos = 1
+            for key in keys:
+                starts.append(pos)
+                pos += len(key) + 1
+            hit = self._blobs[with_lib] = ("\n" + "\n".join(keys).lower() + "\n", starts)
+        return hit
+
+    def glob(self, pattern: str) -> List[int]:
+        """Footprints matching a footprint-filter glob, in cache order."""
+        core = pattern.lower().strip("*")
+        if not core:
+            return list(range(len(self.names)))
+        text, starts = self.blob(":" in pattern)
+        # Anchors are spelled as the newlines around each line, so every
+        # pattern starts with a literal the regex engine can scan ahead for.
+        rx = re.compile(("" if pattern.startswith("*") else "\n") + glob_to_regex(core)
+                        + ("" if pattern.endswith("*") else "(?=\n)"))
+        hits: List[int] = []
+        for m in rx.finditer(text):
+            n = bisect_right(starts, m.end() - 1) - 1
+            if not hits or hits[-1] != n:
+                hits.append(n)
+        return hits
+
+    def search(self, *terms: str) -> List[int]:
+        """Footprints whose tags or description contain every term's words."""
+        result = None
+        for term in terms:
+            for word in words(term):
+                posting = self.postings.get(word)
+                if posting is None:
+                    return []
+                result = set(posting) if result is None else result.intersection(posting)
+                if not result:
+                    return []
+        return sorted(result) if result is not None else []
+
+    # ------------------------
+    # Sidecar
+    # ------------------------
+
+    def save(self, path: str) -> None:
+        """Write the index to ``path`` atomically."""
+        def strings(items: List[str]) -> bytes:
+            return "\0".join(items).encode("utf-8")
+
+        words_sorted = sorted(self.postings)
+        offsets = array("I", [0])
+        flat = array("I")
+        for word in words_sorted:
+            flat.extend(self.postings[word])
+            offsets.append(len(flat))
+        blocks = [
+            strings(self.libs), self.lib.tobytes(),
+            strings(self.names), strings(self.descriptions), strings(self.tags),
+            self.order.tobytes(), self.pads.tobytes(), self.unique_pads.tobytes(),
+            strings(words_sorted), offsets.tobytes(), flat.tobytes(),
+        ]
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_SIDECAR_MAGIC)
+            f.write(self.timestamp.encode("utf-8") + b"\n")
+            for block in blocks:
+                f.write(struct.pack("<Q", len(block)))
+                f.write(block)
+        os.chmod(tmp, 0o644 & ~_UMASK)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_sidecar(cls, path: str, timestamp: str) -> Optional["FootprintIndex"]:
+        """The index saved at ``path``, or None if it is missing, unreadable
+        or was built from a cache with another timestamp."""
+        try:
+            with open(path, "rb") as f:
+                if f.readline() != _SIDECAR_MAGIC:
+                    return None
+                if f.readline().rstrip(b"\n").decode("utf-8") != timestamp:
+                    return None
+                data = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        blocks = []
+        pos = 0
+        while pos + 8 <= len(data):
+            (size,) = struct.unpack_from("<Q", data, pos)
+            pos += 8
+            blocks.append(data[pos:pos + size])
+            pos += size
+        # A truncated file leaves a short last block or a partial length.
+        if len(blocks) != 11 or pos != len(data):
+            return None
+
+        def strings(block: bytes) -> List[str]:
+            return block.decode("utf-8").split("\0") if block else []
+
+        def numbers(block: bytes) -> array:
+            a = array("I")
+            a.frombytes(block)
+            return a
+
+        index = cls(timestamp)
+        try:
+            index.libs = strings(blocks[0])
+            index._lib_ids = {lib: i for i, lib in enumerate(index.libs)}
+            index.lib = numbers(blocks[1])
+            index.names, index.descriptions, index.tags = (strings(b) for b in blocks[2:5])
+            index.order, index.pads, index.unique_pads = (numbers(b) for b in blocks[5:8])
+            words_sorted, offsets, flat = strings(blocks[8]), numbers(blocks[9]), numbers(blocks[10])
+        except (UnicodeDecodeError, ValueError):
+            return None
+        columns = (index.lib, index.descriptions, index.tags, index.order, index.pads, index.unique_pads)
+        if any(len(column) != len(index.names) for column in columns):
+            return None
+        if len(offsets) != len(words_sorted) + 1 or offsets[-1] != len(flat):
+            return None
+        index.postings = {word: flat[offsets[i]:offsets[i + 1]] for i, word in enumerate(words_sorted)}
+        return index
+
+
+def sidecar_path(cache_path: str) -> str:
+    return cache_path + ".idx"
+
+
+def load(cache_path: str, sidecar: Optional[str] = "") -> FootprintIndex:
+    """Index of ``cache_path``; reuses or refreshes the sidecar (default
+    ``<cache>.idx``, None to skip it)."""
+    if sidecar == "":
+        sidecar = sidecar_path(cache_path)
+    with open(cache_path, "r", encoding="utf-8") as f:
+        timestamp = f.readline().rstrip("\n")
+        if sidecar is not None:
+            index = FootprintIndex.load_sidecar(sidecar, timestamp)
+            if index is not None:
+                return index
+        f.seek(0)
+        index = FootprintIndex.from_lines(f)
+    if sidecar is not None:
+        try:
+            index.save(sidecar)
+        except OSError:
+            pass
+    return index
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Search KiCad's fp-info-cache by footprint glob or tag/description words")
+    ap.add_argument("pattern", nargs="*", help="Footprint filter glob, e.g. '*AANI*CH*0070*' or 'RF_Antenna:*'")
+    ap.add_argument("--cache", default='../src/fp-info-cache')
+    ap.add_argument("--tag", action="append", default=[], help="Word(s) that must appear in tags or description")
+    ap.add_argument("--no-sidecar", action="store_true", help="Neither read nor write the .idx sidecar")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    index = load(args.cache, None if args.no_sidecar else "")
+    t1 = time.perf_counter()
+    print(f"{len(index)} footprints in {len(index.libs)} libraries (loaded in {(t1 - t0) * 1000:.1f} ms)")
+
+    for pattern in args.pattern:
+        t = time.perf_counter()
+        hits = index.glob(pattern)
+        print(f"{pattern}: {len(hits)} match(es) in {(time.perf_counter() - t) * 1000:.1f} ms")
+        for n in hits:
+            print(f"  {index.full_id(n)} ({index.pads[n]} pads)")
+    if args.tag:
+        t = time.perf_counter()
+        hits = index.search(*args.tag)
+        print(f"tags {' '.join(args.tag)}: {len(hits)} match(es) in {(time.perf_counter() - t) * 1000:.1f} ms")
+        for n in hits:
+            print(f"  {index.full_id(n)} ({index.pads[n]} pads)")
@@ -1,111 +1,24 @@
-import sys
-import subprocess
+import argparse
+import json
 import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Reuse tokenizer/parser/dumper
-def tokenize(s):
-    tokens = []
-    i = 0
-    n = len(s)
-    current_token = []
-    in_string = False
-    escaped = False
-    while i < n:
-        c = s[i]
-        if in_string:
-            if escaped:
-                current_token.append(c)
-                escaped = False
-            elif c == '\\':
-                escaped = True
-                current_token.append(c)
-            elif c == '"':
-                current_token.append(c)
-                in_string = False
-                tokens.append("".join(current_token))
-                current_token = []
-            else:
-                current_token.append(c)
-        else:
-            if c == '(': 
-                if current_token:
-                    tokens.append("".join(current_token))
-                    current_token = []
-                tokens.append('(')
-            elif c == ')':
-                if current_token:
-                    tokens.append("".join(current_token))
-                    current_token = []
-                tokens.append(')')
-            elif c == '"':
-                if current_token:
-                    tokens.append("".join(current_token))
-                    current_token = []
-                current_token.append(c)
-                in_string = True
-            elif c.isspace():
-                if current_token:
-                    tokens.append("".join(current_token))
-                    current_token = []
-            else:
-                current_token.append(c)
-        i += 1
-    if current_token:
-         tokens.append("".join(current_token))
-    return tokens
-
-def parse_tokens(tokens):
-    stack = [[]]
-    for token in tokens:
-        if token == '(': 
-            l = []
-            stack[-1].append(l)
-            stack.append(l)
-        elif token == ')':
-            if len(stack) > 1:
-                stack.pop()
-            else:
-                raise ValueError("Too many closing parentheses")
-        else:
-            stack[-1].append(token)
-    return stack[0]
-
-def dump_kicad(sexp, indent=0):
-    if not isinstance(sexp, list):
-        return str(sexp)
-    if not sexp: return "()"
-    head = sexp[0]
-    s = "\t" * indent + "(" + str(head)
-    
-    # Simple dump
-    is_complex = False
-    for item in sexp[1:]:
-        if isinstance(item, list):
-            is_complex = True
-            break
-    if not is_complex:
-        for item in sexp[1:]:
-            s += " " + str(item)
-        s += ")"
-        return s
-    
-    for item in sexp[1:]:
-        if not isinstance(item, list):
-            s += " " + str(item)
-            
-    for item in sexp[1:]:
-        if isinstance(item, list):
-            s += "\n" + dump_kicad(item, indent + 1)
-            
-    s += "\n" + "\t" * indent + ")"
-    return s
+from erc_cache import DEFAULT_MAX_BYTES, ProbeCache, default_cache_dir
+from kicad_sch_debug_fix import check_item, check_lib_symbol
+from sexpr import dump_kicad, from_raw, parse_raw, write_kicad
 
-def test_file(filepath):
-    # Run kicad-cli
+def test_file(filepath, command=('kicad-cli',)):
+    # Run kicad-cli (or a stand-in such as fake_kicad_cli.py)
     try:
-        res = subprocess.run(['kicad-cli', 'sch', 'erc', filepath, '--format', 'json', '--output', filepath + '.json'], capture_output=True)
+        res = subprocess.run(list(command) + ['sch', 'erc', filepath, '--format', 'json', '--output', filepath + '.json'], capture_output=True)
     except FileNotFoundError:
-        print("kicad-cli not found!")
+        print(f"{command[0]} not found!")
         return False
         
     if res.returncode != 0:
@@ -119,143 +32,400 @@ def test_file(filepath):
     # We didn't set --exit-code-violations, so 0 means OK, non-zero means Error.
     return res.returncode == 0
 
-def main(filepath):
-    with open(filepath, 'r') as f:
-        content = f.read()
-    
-    tokens = tokenize(content)
-    sexps = parse_tokens(tokens)
-    
-    # We assume sexps is a list of top-level items. Usually just one (kicad_sch ...)
-    root = sexps[0]
-    if root[0] != 'kicad_sch':
-        print("Not a kicad_sch file")
-        return
+def tool_version(command=('kicad-cli',)):
+    """Version string reported by the validator, '' if it can't be run."""
+    try:
+        res = subprocess.run(list(command) + ['version'], capture_output=True, text=True)
+    except FileNotFoundError:
+        return ''
+    return res.stdout.strip() if res.returncode == 0 else ''
+
+def read_report(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Top-level items that every candidate document keeps.
+HEADER_TAGS = ['version', 'generator', 'generator_version', 'uuid', 'paper', 'title_block']
+
+# Categories in the order they are added on top of the base document.
+CATEGORIES = ['lib_symbols', 'wires', 'labels', 'instances', 'others']
+
+class Validator:
+    """Renders candidate documents and asks kicad-cli whether they load.
+
+    Every worker thread writes its candidates into its own temp directory, so
+    with ``jobs > 1`` independent probes run concurrently through ``map()``.
+    A prefilter (e.g. StructuralPrefilter) gets the first say on every
+    candidate; candidates are then rendered from cached per-item fragments
+    and, with a ProbeCache, looked up by that text and the kicad-cli version.
+    Counts the kicad-cli invocations so each run can report what it cost.
+    """
+
+    def __init__(self, command=('kicad-cli',), jobs=1, cache=None, prefilter=None):
+        self.command = tuple(command)
+        self.jobs = jobs
+        self.calls = 0
+        self.cache = cache
+        self.prefilter = prefilter
+        self.fragments = FragmentCache()
+        self.version = tool_version(self.command) if cache is not None else ''
+        if not self.version:
+            # Without a version we can't tell results of different tools apart.
+            self.cache = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dirs = []
+        self._pool = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    def _workdir(self):
+        workdir = getattr(self._local, 'workdir', None)
+        if workdir is None:
+            workdir = tempfile.mkdtemp(prefix='isolate_error_')
+            self._local.workdir = workdir
+            with self._lock:
+                self._dirs.append(workdir)
+        return workdir
+
+    def probe(self, root):
+        """Return (loaded_ok, erc_report) for a candidate document."""
+        if self.prefilter is not None and not self.prefilter(root):
+            return False, None
+        text = self.fragments.render(root)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(text, self.version)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        path = os.path.join(self._workdir(), 'iso_test.kicad_sch')
+        with open(path, 'w') as f:
+            f.write(text)
+        if os.path.exists(path + '.json'):
+            os.remove(path + '.json')
+        with self._lock:
+            self.calls += 1
+        ok = test_file(path, self.command)
+        erc = read_report(path + '.json') if ok else None
+        if key is not None:
+            self.cache.put(key, ok, erc)
+        return ok, erc
+
+    def __call__(self, root):
+        return self.probe(root)[0]
+
+    def map(self, fn, iterable):
+        """Like the builtin map(), but fanned out over the worker pool."""
+        if self._pool is None:
+            return map(fn, iterable)
+        return self._pool.map(fn, iterable)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        for workdir in self._dirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+        self._dirs = []
+
+class FragmentCache:
+    """Renders candidate documents from cached per-item text.
+
+    Probes keep reusing the same item objects (the base, the accepted items
+    and the chunk under test), so each item is dumped once, at the
+    indentation it sits at, and a candidate is just the join of its items'
+    fragments. Only the (kicad_sch ...) root and the (lib_symbols ...)
+    wrapper, which build_root() creates afresh for every probe, are laid
+    out each time. The result is identical to dump_kicad(root).
+    """
+
+    def __init__(self):
+        self._memo = {}
+        self.rendered = 0
+
+    def fragment(self, item, indent):
+        hit = self._memo.get((id(item), indent))
+        if hit is None:
+            # Keep the item alive alongside its text so the id stays valid.
+            hit = (item, dump_kicad(item, indent))
+            self._memo[(id(item), indent)] = hit
+            self.rendered += 1
+        return hit[1]
 
-    # Categories
+    def render(self, root):
+        parts = []
+        self._emit(root, 0, parts)
+        return "".join(parts)
+
+    def _emit(self, node, indent, parts):
+        lists = [x for x in node if isinstance(x, list)]
+        if not lists:
+            parts.append(dump_kicad(node, indent))
+            return
+        parts.append("\t" * indent + "(" + " ".join(x for x in node if not isinstance(x, list)))
+        for child in lists:
+            parts.append("\n")
+            if indent == 0 and child and child[0] == 'lib_symbols':
+                self._emit(child, 1, parts)
+            else:
+                parts.append(self.fragment(child, indent + 1))
+        parts.append("\n" + "\t" * indent + ")")
+
+class StructuralPrefilter:
+    """In-process stand-in for the cheap half of kicad-cli's loader.
+
+    Runs the load-error rules of kicad_sch_debug_fix.py over a candidate and
+    rejects it without launching kicad-cli if any item is known to be
+    unloadable. Verdicts are memoized per item object, so a probe costs one
+    dict lookup per top-level item.
+    """
+
+    def __init__(self):
+        self._memo = {}
+        self.rejected = 0
+
+    def _item_ok(self, item, check):
+        hit = self._memo.get(id(item))
+        if hit is None:
+            # Keep the item alive alongside its verdict so the id stays valid.
+            hit = (item, not check(from_raw(item)))
+            self._memo[id(item)] = hit
+        return hit[1]
+
+    def __call__(self, root):
+        ok = True
+        for item in root[1:]:
+            if isinstance(item, list) and item and item[0] == 'lib_symbols':
+                ok = all(self._item_ok(sym, check_lib_symbol) for sym in item[1:])
+            else:
+                ok = self._item_ok(item, check_item)
+            if not ok:
+                break
+        if not ok:
+            self.rejected += 1
+        return ok
+
+def categorize(root):
+    """Split the children of (kicad_sch ...) into the header, sheet_instances
+    and the per-category lists of items that isolation works on."""
     header_items = []
-    lib_symbols = None
-    wires = []
-    labels = []
-    instances = []
     sheet_instances = None
-    others = []
+    groups = {cat: [] for cat in CATEGORIES}
 
     for item in root[1:]:
         if isinstance(item, list):
             tag = item[0]
             if tag == 'lib_symbols':
-                lib_symbols = item
+                groups['lib_symbols'] += [s for s in item[1:] if isinstance(s, list)]
             elif tag == 'wire':
-                wires.append(item)
+                groups['wires'].append(item)
             elif tag == 'label':
-                labels.append(item)
+                groups['labels'].append(item)
             elif tag == 'symbol':
-                instances.append(item)
+                groups['instances'].append(item)
             elif tag == 'sheet_instances':
                 sheet_instances = item
-            elif tag in ['version', 'generator', 'generator_version', 'uuid', 'paper', 'title_block']:
+            elif tag in HEADER_TAGS:
                 header_items.append(item)
             else:
-                others.append(item)
-    
-    # Construct base
+                groups['others'].append(item)
+
     base_root = ['kicad_sch'] + header_items
     if sheet_instances:
         base_root.append(sheet_instances)
-    
-    # Test base
-    print("Testing base...")
-    with open('iso_test.kicad_sch', 'w') as f:
-        f.write(dump_kicad(base_root))
-    if not test_file('iso_test.kicad_sch'):
-        print("Base failed!")
-        return
-
-    # Add lib_symbols
-    if lib_symbols:
-        print("Testing lib_symbols...")
-        # Check if lib_symbols has many symbols
-        symbols = [s for s in lib_symbols[1:] if isinstance(s, list)]
-        # Add symbols one by one?
-        # Let's try adding all first
-        current_lib = ['lib_symbols'] + symbols
-        current_root = base_root + [current_lib]
-        with open('iso_test.kicad_sch', 'w') as f:
-             f.write(dump_kicad(current_root))
-        if not test_file('iso_test.kicad_sch'):
-            print("lib_symbols failed! Testing individual symbols...")
-            valid_symbols = []
-            for sym in symbols:
-                test_lib = ['lib_symbols'] + valid_symbols + [sym]
-                current_root = base_root + [test_lib]
-                with open('iso_test.kicad_sch', 'w') as f:
-                     f.write(dump_kicad(current_root))
-                if test_file('iso_test.kicad_sch'):
-                    valid_symbols.append(sym)
-                else:
-                    print(f"Symbol {sym[1]} failed!")
-            
-            # Use valid symbols for next steps
-            base_root.append(['lib_symbols'] + valid_symbols)
-        else:
-            base_root.append(current_lib)
-
-    # Add wires
-    if wires:
-        print("Testing wires...")
-        current_root = base_root + wires
-        with open('iso_test.kicad_sch', 'w') as f:
-             f.write(dump_kicad(current_root))
-        if not test_file('iso_test.kicad_sch'):
-             print("Wires failed!")
-             # Bisect wires?
-             valid_wires = []
-             for w in wires:
-                 current_root = base_root + valid_wires + [w]
-                 with open('iso_test.kicad_sch', 'w') as f:
-                     f.write(dump_kicad(current_root))
-                 if test_file('iso_test.kicad_sch'):
-                     valid_wires.append(w)
-                 else:
-                     print("A wire failed!")
-             base_root += valid_wires
-        else:
-             base_root += wires
-
-    # Add labels
-    if labels:
-        print("Testing labels...")
-        current_root = base_root + labels
-        with open('iso_test.kicad_sch', 'w') as f:
-             f.write(dump_kicad(current_root))
-        if not test_file('iso_test.kicad_sch'):
-             print("Labels failed!")
+    return base_root, groups
+
+def build_root(base_root, selection):
+    """Assemble a candidate document from the base and (category, item) pairs.
+
+    Library symbols are gathered into a single (lib_symbols ...) block placed
+    right after the base, everything else follows in selection order.
+    """
+    lib = [item for cat, item in selection if cat == 'lib_symbols']
+    rest = [item for cat, item in selection if cat != 'lib_symbols']
+    root = list(base_root)
+    if lib:
+        root.append(['lib_symbols'] + lib)
+    return root + rest
+
+def describe(item):
+    """Short human-readable name for a top-level item or lib symbol."""
+    for child in item[1:]:
+        if isinstance(child, list) and child and child[0] == 'uuid' and len(child) > 1:
+            return f"{item[0]} {child[1]}"
+    if len(item) > 1 and not isinstance(item[1], list):
+        return f"{item[0]} {item[1]}"
+    return str(item[0])
+
+def split_failures(items, passes, accepted=(), pmap=None):
+    """Binary-split group testing.
+
+    Tries to add ``items`` on top of ``accepted``; chunks that pass are kept,
+    chunks that fail are halved until the offending single items are found.
+    Needs O(k log n) calls to ``passes`` for k bad items out of n, instead of
+    one call per item. Returns (valid, failed), both in original order.
+
+    With ``pmap`` (a parallel map()), every chunk of a bisection round is
+    probed at once against ``accepted`` alone. The union of the passing
+    chunks is re-checked at the end and bisected serially if items only fail
+    in combination.
+    """
+    accepted = list(accepted)
+    if pmap is not None:
+        return _split_failures_rounds(items, passes, accepted, pmap)
+    valid = []
+    failed = []
+    pending = [items]
+    while pending:
+        chunk = pending.pop()
+        if passes(accepted + valid + chunk):
+            valid += chunk
+        elif len(chunk) == 1:
+            failed += chunk
         else:
-             base_root += labels
-             
-    # Add instances
-    if instances:
-        print("Testing instances...")
-        current_root = base_root + instances
-        with open('iso_test.kicad_sch', 'w') as f:
-             f.write(dump_kicad(current_root))
-        if not test_file('iso_test.kicad_sch'):
-             print("Instances failed! Testing individual instances...")
-             valid_instances = []
-             for inst in instances:
-                 current_root = base_root + valid_instances + [inst]
-                 with open('iso_test.kicad_sch', 'w') as f:
-                     f.write(dump_kicad(current_root))
-                 if test_file('iso_test.kicad_sch'):
-                     valid_instances.append(inst)
-                 else:
-                     print(f"Instance {inst[1]} failed!")
-             base_root += valid_instances
+            mid = len(chunk) // 2
+            # Pushed right-first so the left half is tried first.
+            pending.append(chunk[mid:])
+            pending.append(chunk[:mid])
+    return valid, failed
+
+def _split_failures_rounds(items, passes, accepted, pmap):
+    valid_idx = []
+    failed_idx = []
+    pending = [list(range(len(items)))]
+    bisected = False
+    while pending:
+        probes = [accepted + [items[i] for i in chunk] for chunk in pending]
+        next_round = []
+        for chunk, ok in zip(pending, pmap(passes, probes)):
+            if ok:
+                valid_idx += chunk
+            elif len(chunk) == 1:
+                failed_idx += chunk
+            else:
+                mid = len(chunk) // 2
+                next_round += [chunk[:mid], chunk[mid:]]
+                bisected = True
+        pending = next_round
+    valid = [items[i] for i in sorted(valid_idx)]
+    failed = [items[i] for i in sorted(failed_idx)]
+    if bisected and valid and not passes(accepted + valid):
+        # Chunks that pass on their own can still clash with each other;
+        # settle those with the serial search.
+        order = {id(item): i for i, item in enumerate(items)}
+        valid, clashing = split_failures(valid, passes, accepted)
+        failed = sorted(failed + clashing, key=lambda item: order[id(item)])
+    return valid, failed
+
+def ddmin(items, fails, pmap=map):
+    """Zeller's delta debugging: shrink ``items`` to a 1-minimal subset for
+    which ``fails(subset)`` is still true. ``fails(items)`` must hold.
+
+    The subsets (and complements) of one granularity step are independent,
+    so they are evaluated through ``pmap``; the builtin map() keeps the
+    serial early exit.
+    """
+    n = 2
+    while len(items) >= 2:
+        size = -(-len(items) // n)
+        subsets = [items[i:i + size] for i in range(0, len(items), size)]
+        reduced = False
+        for subset, bad in zip(subsets, pmap(fails, subsets)):
+            if bad:
+                items, n, reduced = subset, 2, True
+                break
+        if not reduced and len(subsets) > 2:
+            complements = [[x for j, s in enumerate(subsets) if j != i for x in s] for i in range(len(subsets))]
+            for complement, bad in zip(complements, pmap(fails, complements)):
+                if bad:
+                    items, n, reduced = complement, max(n - 1, 2), True
+                    break
+        if not reduced:
+            if n >= len(items):
+                break
+            n = min(n * 2, len(items))
+    return items
+
+def isolate_phased(base_root, groups, validate):
+    """Add each category on top of the known-good base, bisecting the ones
+    that fail. Returns the final valid document."""
+    accepted = []
+    for cat in CATEGORIES:
+        items = [(cat, item) for item in groups[cat]]
+        if not items:
+            continue
+        print(f"Testing {cat} ({len(items)})...")
+        pmap = validate.map if validate.jobs > 1 else None
+        valid, failed = split_failures(items, lambda sel: validate(build_root(base_root, sel)), accepted, pmap)
+        for _, item in failed:
+            print(f"  {cat}: {describe(item)} failed!")
+        accepted += valid
+    return build_root(base_root, accepted)
+
+def isolate_ddmin(base_root, groups, validate):
+    """Find a 1-minimal set of items, across all categories, that makes the
+    document fail to load on top of the base. Returns that set."""
+    selection = [(cat, item) for cat in CATEGORIES for item in groups[cat]]
+    if validate(build_root(base_root, selection)):
+        print("Full document loads; nothing to isolate.")
+        return []
+    culprits = ddmin(selection, lambda sel: not validate(build_root(base_root, sel)), validate.map)
+    print(f"Minimal failing set ({len(culprits)} items):")
+    for cat, item in culprits:
+        print(f"  {cat}: {describe(item)}")
+    return culprits
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Isolate the items that stop kicad-cli from loading a .kicad_sch file")
+    ap.add_argument("input", help="Input .kicad_sch file")
+    ap.add_argument("--ddmin", action="store_true", help="Search for a minimal failing item set across all categories instead of adding categories one by one")
+    ap.add_argument("-j", "--jobs", type=int, default=1, help="Number of concurrent kicad-cli probes (default: 1, one at a time)")
+    ap.add_argument("--validator", default="kicad-cli", help="Command used in place of kicad-cli, e.g. 'python3 fake_kicad_cli.py'")
+    ap.add_argument("--cache-dir", default=default_cache_dir(), help="Directory of the persistent probe result cache")
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Evict least recently used cache entries beyond this size")
+    ap.add_argument("--no-cache", action="store_true", help="Always run kicad-cli, ignoring the probe cache")
+    ap.add_argument("--no-prefilter", action="store_true", help="Send every candidate to kicad-cli, even ones the in-process checker rejects")
+    ap.add_argument("-o", "--output", default="iso_test.kicad_sch", help="Where to write the final valid document (default: iso_test.kicad_sch)")
+    args = ap.parse_args(argv)
+
+    with open(args.input, 'r') as f:
+        content = f.read()
+    
+    sexps = parse_raw(content)
+    
+    # We assume sexps is a list of top-level items. Usually just one (kicad_sch ...)
+    root = sexps[0]
+    if root[0] != 'kicad_sch':
+        print("Not a kicad_sch file")
+        return 1
+
+    base_root, groups = categorize(root)
+    cache = None if args.no_cache else ProbeCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    prefilter = None if args.no_prefilter else StructuralPrefilter()
+    validate = Validator(shlex.split(args.validator), max(args.jobs, 1), cache, prefilter)
+    try:
+        # Test base
+        print("Testing base...")
+        if not validate(base_root):
+            print("Base failed!")
+            return 1
+
+        if args.ddmin:
+            isolate_ddmin(base_root, groups, validate)
         else:
-             base_root += instances
-             
-    print("Done. Final valid file is src/iso_test.kicad_sch")
+            final_root = isolate_phased(base_root, groups, validate)
+            with open(args.output, 'w') as f:
+                write_kicad(f, final_root)
+            print(f"Done. Final valid file is {args.output}")
+        print(f"kicad-cli calls: {validate.calls}")
+        if validate.cache is not None:
+            print(f"Cache hits: {validate.cache.hits}")
+        if prefilter is not None:
+            print(f"kicad-cli calls avoided by pre-filter: {prefilter.rejected}")
+    finally:
+        validate.close()
+    return 0
 
 if __name__ == '__main__':
-    main(sys.argv[1])
+    raise SystemExit(main(sys.argv[1:]))
@@ -7,7 +7,8 @@ S-expression issues based ONLY on KiCad's dev docs:
 - S-expression Schematic format
 
 It:
-1) Parses the file as an s-expression (handles strings + ;; comments).
+1) Parses the file as an s-expression (handles strings + ;; comments) using the
+   shared lexer in sexpr.py.
 2) Prints diagnostics for a few high-signal structural issues.
 3) Applies a few *obvious* auto-fixes:
    - Unquote generator argument if it is a valid token (lowercase/digits/_)
@@ -16,33 +17,30 @@ It:
    - For schematic items whose grammar shows a trailing UNIQUE_IDENTIFIER,
      unwrap a final (uuid ...) list into a bare UUID atom.
 
+Several inputs (files, directories or globs) are diagnosed in parallel
+across a process pool and summarised in one report, as text or JSON, with
+per-file timings.
+
 This is NOT a full KiCad schematic writer.
 """
 
 from __future__ import annotations
 
 import argparse
+import glob
+import json
 import re
 import sys
-from dataclasses import dataclass
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple, Union
-
-
-# ------------------------
-# Tokenization / parsing
-# ------------------------
-
-@dataclass
-class Sym:
-    v: str
-
-@dataclass
-class Str:
-    v: str
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-Atom = Union[Sym, Str]
-SExpr = Union[Atom, List["SExpr"]]
+from cst import loads_cst
+from sexpr import Atom, ParseError, SExpr, Str, Sym, open_source
 
 
 _TOKEN_SAFE_RE = re.compile(r"^[a-z0-9_]+$")
@@ -59,124 +57,6 @@ _KNOWN_PAPER_SIZES = {
 }
 
 
-class ParseError(Exception):
-    pass
-
-
-def tokenize(text: str) -> Iterable[Tuple[str, str, int, int]]:
-    """Yield (kind, value, line, col). kind in: LPAR, RPAR, SYM, STR."""
-    i = 0
-    line = 1
-    col = 1
-    n = len(text)
-
-    def advance(ch: str):
-        nonlocal line, col
-        if ch == "\n":
-            line += 1
-            col = 1
-        else:
-            col += 1
-
-    while i < n:
-        ch = text[i]
-
-        # Whitespace
-        if ch.isspace():
-            advance(ch)
-            i += 1
-            continue
-
-        # ;; comment to end-of-line (shown in schematic header example)
-        if ch == ";" and i + 1 < n and text[i + 1] == ";":
-            # consume until newline or EOF
-            while i < n and text[i] != "\n":
-                advance(text[i])
-                i += 1
-            continue
-
-        if ch == "(":
-            yield ("LPAR", ch, line, col)
-            advance(ch)
-            i += 1
-            continue
-        if ch == ")":
-            yield ("RPAR", ch, line, col)
-            advance(ch)
-            i += 1
-            continue
-
-        if ch == '"':
-            start_line, start_col = line, col
-            i += 1
-            advance('"')
-            buf = []
-            esc = False
-            while i < n:
-                c = text[i]
-                if esc:
-                    buf.append(c)
-                    esc = False
-                elif c == "\\":
-                    esc = True
-                elif c == '"':
-                    # end string
-                    i += 1
-                    advance('"')
-                    yield ("STR", "".join(buf), start_line, start_col)
-                    break
-                else:
-                    buf.append(c)
-                advance(c)
-                i += 1
-            else:
-                raise ParseError(f"Unterminated string at {start_line}:{start_col}")
-            continue
-
-        # Symbol / atom
-        start_line, start_col = line, col
-        buf = []
-        while i < n and (not text[i].isspace()) and text[i] not in '()"':
-            buf.append(text[i])
-            advance(text[i])
-            i += 1
-        yield ("SYM", "".join(buf), start_line, start_col)
-
-
-def parse(tokens: Iterable[Tuple[str, str, int, int]]) -> SExpr:
-    stack: List[List[SExpr]] = []
-    current: List[SExpr] = []
-    started = False
-
-    for kind, val, line, col in tokens:
-        if kind == "LPAR":
-            started = True
-            stack.append(current)
-            current = []
-        elif kind == "RPAR":
-            if not stack:
-                raise ParseError(f"Unexpected ')' at {line}:{col}")
-            finished = current
-            current = stack.pop()
-            current.append(finished)
-        elif kind == "SYM":
-            current.append(Sym(val))
-        elif kind == "STR":
-            current.append(Str(val))
-        else:
-            raise ParseError(f"Unknown token kind {kind}")
-
-    if stack:
-        raise ParseError("Unclosed '(' at end of file")
-    if not started:
-        raise ParseError("No s-expression found")
-
-    # Typical KiCad files have a single top-level list.
-    if len(current) != 1 or not isinstance(current[0], list):
-        raise ParseError("Expected a single top-level s-expression list")
-    return current[0]
-
-
 # ------------------------
 # Helpers
 # ------------------------
@@ -200,10 +80,97 @@ def strval(expr: SExpr) -> Optional[str]:
 
 
 def walk(expr: SExpr) -> Iterable[SExpr]:
-    yield expr
-    if isinstance(expr, list):
-        for ch in expr:
-            yield from walk(ch)
+    """Every node of ``expr``, lists before their children (document order)."""
+    stack = [iter((expr,))]
+    while stack:
+        for node in stack[-1]:
+            yield node
+            if isinstance(node, list):
+                stack.append(iter(node))
+                break
+        else:
+            stack.pop()
+
+
+# ------------------------
+# Rule engine
+# ------------------------
+#
+# Every check and fix below is a node rule: a function called as
+# ``rule(node, parents, out)`` for each list whose head it was registered for
+# ("*" for every list, headless ones included), with ``parents`` the lists
+# above ``node`` (root first) and ``out`` the list the rule appends its
+# findings to. A RuleSet dispatches all of its rules from one iterative
+# traversal, so adding a rule adds no pass over the tree. Each rule keeps its
+# own output list and the results are concatenated in registration order,
+# so findings come out grouped by rule, and within a rule in document order.
+
+NodeRule = Callable[[List[SExpr], List[List[SExpr]], list], None]
+
+
+class RuleSet:
+    def __init__(self, post_order: bool = False):
+        self.rules: List[NodeRule] = []
+        self.by_head: Dict[str, List[Tuple[int, NodeRule]]] = {}
+        # Visit a list after its children (for rules that rewrite them).
+        self.post_order = post_order
+
+    def rule(self, *heads: str) -> Callable[[NodeRule], NodeRule]:
+        def register(fn: NodeRule) -> NodeRule:
+            idx = len(self.rules)
+            self.rules.append(fn)
+            for h in heads or ("*",):
+                self.by_head.setdefault(h, []).append((idx, fn))
+            return fn
+        return register
+
+    def __add__(self, other: "RuleSet") -> "RuleSet":
+        if other.post_order != self.post_order:
+            raise ValueError("Cannot combine pre-order and post-order rule sets")
+        combined = RuleSet(self.post_order)
+        for rules in (self, other):
+            for h, entries in rules.by_head.items():
+                combined.by_head.setdefault(h, []).extend(
+                    (idx + len(combined.rules), fn) for idx, fn in entries)
+            combined.rules.extend(rules.rules)
+        return combined
+
+    def run(self, root: SExpr, parents: Iterable[List[SExpr]] = ()) -> list:
+        """Apply every rule to ``root`` and the lists below it; ``parents``
+        stands in for the lists above ``root`` when checking a subtree."""
+        if root.__class__ is not list:
+            return []
+        outs: List[list] = [[] for _ in self.rules]
+        every = self.by_head.get("*", ())
+        by_head = self.by_head
+        post_order = self.post_order
+        path = list(parents)
+
+        def visit(node: List[SExpr]) -> None:
+            for idx, fn in every:
+                fn(node, path, outs[idx])
+            if node and node[0].__class__ is Sym:
+                for idx, fn in by_head.get(node[0].v, ()):
+                    fn(node, path, outs[idx])
+
+        if not post_order:
+            visit(root)
+        path.append(root)
+        stack = [iter(root)]
+        while stack:
+            for child in stack[-1]:
+                if child.__class__ is list:
+                    if not post_order:
+                        visit(child)
+                    path.append(child)
+                    stack.append(iter(child))
+                    break
+            else:
+                stack.pop()
+                node = path.pop()
+                if post_order:
+                    visit(node)
+        return [found for out in outs for found in out]
 
 
 # ------------------------
@@ -216,78 +183,277 @@ class Issue:
     message: str
 
 
-def collect_issues(root: SExpr) -> List[Issue]:
-    issues: List[Issue] = []
+STYLE_RULES = RuleSet()
 
-    if head(root) != "kicad_sch":
-        issues.append(Issue("E_ROOT", "Top-level list head is not 'kicad_sch' (required header token)."))
-        return issues
 
+def _find_child_list(root: List[SExpr], token_name: str) -> Optional[List[SExpr]]:
+    for item in root[1:]:
+        if isinstance(item, list) and head(item) == token_name:
+            return item
+    return None
+
+
+@STYLE_RULES.rule("kicad_sch")
+def _header_rule(root: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
     # header contains (version VERSION) and (generator GENERATOR)
-    def find_child_list(token_name: str) -> Optional[List[SExpr]]:
-        if not isinstance(root, list):
-            return None
-        for item in root[1:]:
-            if isinstance(item, list) and head(item) == token_name:
-                return item
-        return None
-
-    ver = find_child_list("version")
+    if parents:
+        return
+    ver = _find_child_list(root, "version")
     if not ver or len(ver) < 2 or not isinstance(ver[1], Sym) or not re.fullmatch(r"\d{8}", ver[1].v):
         issues.append(Issue("E_VERSION", "Missing/invalid (version YYYYMMDD) in header."))
 
-    gen = find_child_list("generator")
+    gen = _find_child_list(root, "generator")
     if not gen or len(gen) < 2:
         issues.append(Issue("E_GENERATOR", "Missing (generator GENERATOR) in header."))
     elif isinstance(gen[1], Str):
         issues.append(Issue("W_GENERATOR_QUOTED", "(generator ...) argument is quoted; docs show it as an unquoted token."))
 
-    pap = find_child_list("paper")
+    pap = _find_child_list(root, "paper")
     if pap and len(pap) >= 2 and isinstance(pap[1], Str):
         issues.append(Issue("W_PAPER_QUOTED", "(paper ...) argument is quoted; docs show paper sizes as unquoted tokens."))
 
+
+@STYLE_RULES.rule()
+def _token_case_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
     # Token names must be lowercase (s-expression intro)
-    for node in walk(root):
-        if isinstance(node, list) and node and isinstance(node[0], Sym):
-            t = node[0].v
-            if any(c.isupper() for c in t):
-                issues.append(Issue("W_TOKEN_CASE", f"Token '{t}' contains uppercase letters; token names should be lowercase."))
-
-    # uuid usage
-    for node in walk(root):
-        if isinstance(node, list) and head(node) == "uuid":
-            if len(node) != 2:
-                issues.append(Issue("W_UUID_ARITY", "(uuid ...) does not have exactly one attribute."))
-            elif isinstance(node[1], Str):
-                issues.append(Issue("W_UUID_QUOTED", "(uuid ...) attribute is quoted; docs show UUID attribute unquoted."))
-
-    # For some schematic sections, docs show a trailing UNIQUE_IDENTIFIER (bare), not (uuid ...)
-    bare_uuid_end_tokens = {
-        "junction",
-        "no_connect",
-        "bus_entry",
-        "wire",
-        "bus",
-        "polyline",
-        "text",
-        "label",
-        "global_label",
-        "hierarchical_label",
-        "symbol",
-        "sheet",
-    }
-    for node in walk(root):
-        if isinstance(node, list) and head(node) in bare_uuid_end_tokens and node:
-            last = node[-1]
-            if isinstance(last, list) and head(last) == "uuid":
-                issues.append(Issue("W_UUID_WRAPPED", f"{head(node)} ends with (uuid ...); docs show a trailing UNIQUE_IDENTIFIER atom."))
+    if node and isinstance(node[0], Sym):
+        t = node[0].v
+        if any(c.isupper() for c in t):
+            issues.append(Issue("W_TOKEN_CASE", f"Token '{t}' contains uppercase letters; token names should be lowercase."))
+
+
+@STYLE_RULES.rule("uuid")
+def _uuid_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    if len(node) != 2:
+        issues.append(Issue("W_UUID_ARITY", "(uuid ...) does not have exactly one attribute."))
+    elif isinstance(node[1], Str):
+        issues.append(Issue("W_UUID_QUOTED", "(uuid ...) attribute is quoted; docs show UUID attribute unquoted."))
+
+
+# For some schematic sections, docs show a trailing UNIQUE_IDENTIFIER (bare), not (uuid ...)
+_BARE_UUID_END_TOKENS = (
+    "junction",
+    "no_connect",
+    "bus_entry",
+    "wire",
+    "bus",
+    "polyline",
+    "text",
+    "label",
+    "global_label",
+    "hierarchical_label",
+    "symbol",
+    "sheet",
+)
+
+
+@STYLE_RULES.rule(*_BARE_UUID_END_TOKENS)
+def _uuid_wrapped_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    last = node[-1]
+    if isinstance(last, list) and head(last) == "uuid":
+        issues.append(Issue("W_UUID_WRAPPED", f"{head(node)} ends with (uuid ...); docs show a trailing UNIQUE_IDENTIFIER atom."))
+
+
+def collect_issues(root: SExpr) -> List[Issue]:
+    if head(root) != "kicad_sch":
+        return [Issue("E_ROOT", "Top-level list head is not 'kicad_sch' (required header token).")]
+    return DIAGNOSTICS.run(root)
+
+
+# ------------------------
+# Load errors
+# ------------------------
+#
+# Grammar violations that make KiCad's parser give up on the whole file (as
+# opposed to the style warnings above). These are deliberately limited to
+# things the schematic format pins down exactly, so a file that passes may
+# still fail to load, but one that fails never would.
+
+_NUMBER_RE = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$")
+
+# token -> (min, max) number of numeric attributes
+_NUMERIC_ARITY = {
+    "at": (2, 3),
+    "xy": (2, 2),
+    "size": (2, 2),
+    "start": (2, 2),
+    "mid": (2, 2),
+    "end": (2, 2),
+    "center": (2, 2),
+    "length": (1, 1),
+    "diameter": (1, 1),
+    "width": (1, 1),
+    "radius": (1, 1),
+    "thickness": (1, 1),
+}
+
+_PIN_ELECTRICAL_TYPES = {
+    "input", "output", "bidirectional", "tri_state", "passive", "free",
+    "unspecified", "power_in", "power_out", "open_collector", "open_emitter",
+    "no_connect",
+}
+_PIN_GRAPHIC_STYLES = {
+    "line", "inverted", "clock", "inverted_clock", "input_low", "clock_low",
+    "output_low", "edge_clock_high", "non_logic",
+}
+
+# Stand-ins for the lists above a subtree checked on its own.
+_SCH_PARENTS = [[Sym("kicad_sch")]]
+_LIB_SYMBOL_PARENTS = _SCH_PARENTS + [[Sym("lib_symbols")]]
+
+LOAD_RULES = RuleSet()
+
+
+def _child_lists(expr: List[SExpr], token_name: str) -> List[List[SExpr]]:
+    return [x for x in expr[1:] if isinstance(x, list) and head(x) == token_name]
+
+
+def _is_lib_symbol(sym: SExpr) -> bool:
+    return head(sym) == "symbol" and len(sym) >= 2 and not isinstance(sym[1], list)
+
+
+def _item_checked(parents: List[List[SExpr]]) -> bool:
+    """Whether a list below the root (parents non-empty) gets node checks:
+    not inside a top-level entry or lib symbol that is already reported as
+    malformed."""
+    if len(parents) < 2:
+        return len(parents) == 1
+    item = parents[1]
+    if head(item) is None:
+        return False
+    return len(parents) < 3 or head(item) != "lib_symbols" or _is_lib_symbol(parents[2])
+
+
+@LOAD_RULES.rule("kicad_sch")
+def _top_level_atoms_rule(root: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    if not parents:
+        issues.extend(Issue("E_HEAD", "Top-level entry is not a (token ...) list.")
+                      for item in root[1:] if not isinstance(item, list))
+
+
+@LOAD_RULES.rule()
+def _entry_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    """Top-level entries and lib_symbols entries."""
+    depth = len(parents)
+    if depth == 1:
+        if head(node) is None:
+            issues.append(Issue("E_HEAD", "Top-level entry is not a (token ...) list."))
+        elif head(node) == "lib_symbols":
+            issues.extend(Issue("E_LIB_SYMBOL", "lib_symbols entries must be (symbol \"NAME\" ...).")
+                          for sym in node[1:] if not isinstance(sym, list))
+    elif depth == 2 and head(parents[1]) == "lib_symbols" and not _is_lib_symbol(node):
+        issues.append(Issue("E_LIB_SYMBOL", "lib_symbols entries must be (symbol \"NAME\" ...)."))
+
+
+@LOAD_RULES.rule()
+def _node_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    """Token heads and numeric attributes of every list inside an item."""
+    if not parents or not _item_checked(parents):
+        return
+    t = head(node)
+    if t is None:
+        # Headless entries themselves are reported by _entry_rule.
+        if len(parents) > 2 or (len(parents) == 2 and head(parents[1]) != "lib_symbols"):
+            issues.append(Issue("E_HEAD", "List does not start with a token name."))
+        return
+    arity = _NUMERIC_ARITY.get(t)
+    if arity is None:
+        return
+    args = node[1:]
+    if not arity[0] <= len(args) <= arity[1]:
+        issues.append(Issue("E_ARITY", f"({t} ...) takes {arity[0]}..{arity[1]} attributes, found {len(args)}."))
+    elif not all(isinstance(a, Sym) and _NUMBER_RE.match(a.v) for a in args):
+        issues.append(Issue("E_NUMBER", f"({t} ...) attributes must be unquoted numbers."))
+
+
+def _top_level(rule: Callable[[List[SExpr]], List[Issue]]) -> NodeRule:
+    """Node rule running an item check on top-level entries only."""
+    def run(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+        if len(parents) == 1:
+            issues.extend(rule(node))
+    run.__name__ = rule.__name__
+    return run
+
+
+@LOAD_RULES.rule("wire", "bus")
+@_top_level
+def _check_wire(item: List[SExpr]) -> List[Issue]:
+    pts = _child_lists(item, "pts")
+    if len(pts) != 1 or len(_child_lists(pts[0], "xy")) != 2 or len(pts[0]) != 3:
+        return [Issue("E_WIRE_PTS", f"({head(item)} ...) needs exactly one (pts (xy X Y) (xy X Y)).")]
+    return []
+
+
+@LOAD_RULES.rule("label", "global_label", "hierarchical_label", "text")
+@_top_level
+def _check_text_item(item: List[SExpr]) -> List[Issue]:
+    issues: List[Issue] = []
+    if len(item) < 2 or isinstance(item[1], list):
+        issues.append(Issue("E_LABEL_TEXT", f"({head(item)} ...) is missing its text."))
+    if not _child_lists(item, "at"):
+        issues.append(Issue("E_AT", f"({head(item)} ...) is missing (at X Y ANGLE)."))
+    return issues
+
+
+def _check_positioned(item: List[SExpr]) -> List[Issue]:
+    if not _child_lists(item, "at"):
+        return [Issue("E_AT", f"({head(item)} ...) is missing (at X Y).")]
+    return []
+
+
+LOAD_RULES.rule("junction", "no_connect", "bus_entry")(_top_level(_check_positioned))
+
 
+@LOAD_RULES.rule("symbol")
+@_top_level
+def _check_symbol_instance(item: List[SExpr]) -> List[Issue]:
+    issues = _check_positioned(item)
+    lib_id = _child_lists(item, "lib_id")
+    if len(lib_id) != 1 or len(lib_id[0]) != 2 or isinstance(lib_id[0][1], list):
+        issues.append(Issue("E_LIB_ID", "Symbol instance needs exactly one (lib_id \"LIB:NAME\")."))
     return issues
 
 
+@LOAD_RULES.rule("pin")
+def _lib_pin_rule(node: List[SExpr], parents: List[List[SExpr]], issues: List[Issue]) -> None:
+    if len(parents) < 3 or head(parents[1]) != "lib_symbols" or not _item_checked(parents):
+        return
+    if (len(node) < 3 or symval(node[1]) not in _PIN_ELECTRICAL_TYPES
+            or symval(node[2]) not in _PIN_GRAPHIC_STYLES):
+        issues.append(Issue("E_PIN_TYPE", f"Pin in lib symbol '{parents[2][1].v}' needs (pin ELECTRICAL_TYPE GRAPHIC_STYLE ...)."))
+
+
+DIAGNOSTICS = STYLE_RULES + LOAD_RULES
+
+
+def check_lib_symbol(sym: SExpr) -> List[Issue]:
+    """Load errors for one (symbol "NAME" ...) entry of (lib_symbols ...)."""
+    if not isinstance(sym, list):
+        return [Issue("E_LIB_SYMBOL", "lib_symbols entries must be (symbol \"NAME\" ...).")]
+    return LOAD_RULES.run(sym, _LIB_SYMBOL_PARENTS)
+
+
+def check_item(item: SExpr) -> List[Issue]:
+    """Load errors for one top-level child of (kicad_sch ...)."""
+    if not isinstance(item, list):
+        return [Issue("E_HEAD", "Top-level entry is not a (token ...) list.")]
+    return LOAD_RULES.run(item, _SCH_PARENTS)
+
+
+def collect_load_errors(root: SExpr) -> List[Issue]:
+    if head(root) != "kicad_sch":
+        return [Issue("E_ROOT", "Top-level list head is not 'kicad_sch' (required header token).")]
+    return LOAD_RULES.run(root)
+
+
 # ------------------------
 # Auto-fixes (conservative)
 # ------------------------
+#
+# Fix rules append a description of what they changed. They run after the
+# lists below them, so a rule may replace any child of the node it is given.
+
+FIXES = RuleSet(post_order=True)
 
 
 def _maybe_unquote_to_sym(a: Atom) -> Atom:
@@ -297,66 +463,54 @@ def _maybe_unquote_to_sym(a: Atom) -> Atom:
     return a
 
 
-def fix_in_place(root: SExpr) -> Tuple[SExpr, List[str]]:
-    """Return (fixed_root, applied_fixes)."""
-    applied: List[str] = []
-
-    if not isinstance(root, list) or head(root) != "kicad_sch":
-        return root, applied
-
+@FIXES.rule("generator")
+def _fix_generator(item: List[SExpr], parents: List[List[SExpr]], applied: List[str]) -> None:
     # Fix header generator quoting
-    for item in root[1:]:
-        if isinstance(item, list) and head(item) == "generator" and len(item) >= 2 and isinstance(item[1], Str):
-            new_atom = _maybe_unquote_to_sym(item[1])
-            if isinstance(new_atom, Sym) and new_atom.v != item[1].v:
-                # same value, type changes
-                pass
-            if isinstance(new_atom, Sym):
-                item[1] = new_atom
-                applied.append("Unquoted (generator \"...\") -> (generator ...) when safe")
+    if len(parents) == 1 and len(item) >= 2 and isinstance(item[1], Str):
+        new_atom = _maybe_unquote_to_sym(item[1])
+        if isinstance(new_atom, Sym):
+            item[1] = new_atom
+            applied.append("Unquoted (generator \"...\") -> (generator ...) when safe")
 
+
+@FIXES.rule("paper")
+def _fix_paper(item: List[SExpr], parents: List[List[SExpr]], applied: List[str]) -> None:
     # Fix header paper quoting for known sizes
-    for item in root[1:]:
-        if isinstance(item, list) and head(item) == "paper" and len(item) >= 2 and isinstance(item[1], Str):
-            if item[1].v in _KNOWN_PAPER_SIZES:
-                item[1] = Sym(item[1].v)
-                applied.append("Unquoted (paper \"A4\") -> (paper A4) for known paper sizes")
+    if len(parents) == 1 and len(item) >= 2 and isinstance(item[1], Str):
+        if item[1].v in _KNOWN_PAPER_SIZES:
+            item[1] = Sym(item[1].v)
+            applied.append("Unquoted (paper \"A4\") -> (paper A4) for known paper sizes")
+
 
+@FIXES.rule("uuid")
+def _fix_uuid_quoted(node: List[SExpr], parents: List[List[SExpr]], applied: List[str]) -> None:
     # Unquote all (uuid "...") -> (uuid ...)
-    for node in walk(root):
-        if isinstance(node, list) and head(node) == "uuid" and len(node) == 2 and isinstance(node[1], Str):
-            if _UUID_RE.fullmatch(node[1].v):
-                node[1] = Sym(node[1].v)
-                applied.append("Unquoted UUID attribute in (uuid ...)")
+    if len(node) == 2 and isinstance(node[1], Str):
+        if _UUID_RE.fullmatch(node[1].v):
+            node[1] = Sym(node[1].v)
+            applied.append("Unquoted UUID attribute in (uuid ...)")
 
+
+@FIXES.rule(*_BARE_UUID_END_TOKENS)
+def _fix_uuid_wrapped(node: List[SExpr], parents: List[List[SExpr]], applied: List[str]) -> None:
     # Unwrap trailing (uuid ...) into bare UUID for tokens whose grammar shows UNIQUE_IDENTIFIER
-    bare_uuid_end_tokens = {
-        "junction",
-        "no_connect",
-        "bus_entry",
-        "wire",
-        "bus",
-        "polyline",
-        "text",
-        "label",
-        "global_label",
-        "hierarchical_label",
-        "symbol",
-        "sheet",
-    }
+    if len(node) < 2:
+        return
+    last = node[-1]
+    if isinstance(last, list) and head(last) == "uuid" and len(last) == 2:
+        uuid_atom = last[1]
+        if isinstance(uuid_atom, Str) and _UUID_RE.fullmatch(uuid_atom.v):
+            uuid_atom = Sym(uuid_atom.v)
+        if isinstance(uuid_atom, (Sym, Str)):
+            node[-1] = uuid_atom
+            applied.append(f"Unwrapped trailing (uuid ...) into bare UNIQUE_IDENTIFIER for '{head(node)}'")
 
-    for node in walk(root):
-        if isinstance(node, list) and head(node) in bare_uuid_end_tokens and len(node) >= 2:
-            last = node[-1]
-            if isinstance(last, list) and head(last) == "uuid" and len(last) == 2:
-                uuid_atom = last[1]
-                if isinstance(uuid_atom, Str) and _UUID_RE.fullmatch(uuid_atom.v):
-                    uuid_atom = Sym(uuid_atom.v)
-                if isinstance(uuid_atom, (Sym, Str)):
-                    node[-1] = uuid_atom
-                    applied.append(f"Unwrapped trailing (uuid ...) into bare UNIQUE_IDENTIFIER for '{head(node)}'")
 
-    return root, applied
+def fix_in_place(root: SExpr) -> Tuple[SExpr, List[str]]:
+    """Return (fixed_root, applied_fixes)."""
+    if not isinstance(root, list) or head(root) != "kicad_sch":
+        return root, []
+    return root, FIXES.run(root)
 
 
 # ------------------------
@@ -368,88 +522,279 @@ def _escape_str(s: str) -> str:
     return s.replace("\\", "\\\\").replace('"', '\\"')
 
 
-def render(expr: SExpr, indent: int = 0) -> str:
-    sp = "\t" * indent
-
+def _render_atom(expr: Atom) -> str:
     if isinstance(expr, Sym):
         return expr.v
-    if isinstance(expr, Str):
-        return '"' + _escape_str(expr.v) + '"'
-
-    assert isinstance(expr, list)
-    if not expr:
-        return sp + "()"
-
-    # decide compact vs expanded
-    # compact if all children are atoms and list is short
-    all_atoms = all(isinstance(x, (Sym, Str)) for x in expr)
-    if all_atoms and len(expr) <= 5:
-        inside = " ".join(render(x, 0) for x in expr)
-        return sp + f"({inside})"
-
-    # expanded
-    out = [sp + "("]
-    for i, child in enumerate(expr):
-        if i == 0 and isinstance(child, Sym):
-            # token name: keep on same line if next items small?
-            out[-1] = sp + f"({child.v}"
-            continue
-        out.append(render(child, indent + 1))
-    # close paren
-    if out:
-        # if first line already has '(token', close it on its own line
-        out.append(sp + ")")
-    return "\n".join(out)
+    return '"' + _escape_str(expr.v) + '"'
+
+
+def render(expr: SExpr, indent: int = 0) -> str:
+    # Every list is either one line, or its opening line, one or more lines
+    # per child and a closing line; the lines are collected flat and joined
+    # once. Atoms on lines of their own are not indented.
+    lines: List[str] = []
+    # (children still to render, their indent, closing line of the list)
+    stack: List[Tuple[Iterator[SExpr], int, Optional[str]]] = [(iter((expr,)), indent, None)]
+    while stack:
+        it, level, closing = stack[-1]
+        for node in it:
+            if not isinstance(node, list):
+                lines.append(_render_atom(node))
+                continue
+            sp = "\t" * level
+            if not node:
+                lines.append(sp + "()")
+                continue
+
+            # decide compact vs expanded
+            # compact if all children are atoms and list is short
+            if len(node) <= 5 and all(isinstance(x, (Sym, Str)) for x in node):
+                lines.append(sp + "(" + " ".join(_render_atom(x) for x in node) + ")")
+                continue
+
+            # expanded: token name stays on the opening line
+            children = iter(node)
+            if isinstance(node[0], Sym):
+                lines.append(sp + "(" + node[0].v)
+                next(children)
+            else:
+                lines.append(sp + "(")
+            stack.append((children, level + 1, sp + ")"))
+            break
+        else:
+            stack.pop()
+            if closing is not None:
+                lines.append(closing)
+    return "\n".join(lines)
 
 
 # ------------------------
-# CLI
+# Batch processing
 # ------------------------
 
 
-def main(argv: List[str]) -> int:
-    ap = argparse.ArgumentParser(description="Diagnose and apply conservative fixes to KiCad .kicad_sch s-expr files")
-    ap.add_argument("input", type=Path, help="Input .kicad_sch file")
-    ap.add_argument("-o", "--output", type=Path, default=None, help="Output path (default: input.fixed.kicad_sch)")
-    ap.add_argument("--no-write", action="store_true", help="Only print diagnostics; do not write output")
-    args = ap.parse_args(argv)
-
-    text = args.input.read_text(encoding="utf-8", errors="replace")
+@dataclass
+class FileReport:
+    path: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    issues: List[Issue] = field(default_factory=list)
+    applied: List[str] = field(default_factory=list)
+    # phase -> milliseconds (read, parse, diagnose, fix, write, total)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def default_output(path: Path) -> Path:
+    return path.with_suffix(".fixed.kicad_sch")
+
+
+def expand_inputs(specs: Iterable[str]) -> List[Path]:
+    """Files named by ``specs``: paths, directories (their *.kicad_sch) and
+    globs, in order and without repeats. Outputs of an earlier run for
+    another file in the list (X.fixed.kicad_sch next to X.kicad_sch) are
+    left out when they only came in through a directory or glob."""
+    found: Dict[Path, bool] = {}
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            matches, explicit = sorted(path.glob("*.kicad_sch")), False
+        elif path.exists():
+            matches, explicit = [path], True
+        elif glob.has_magic(spec):
+            matches, explicit = [Path(p) for p in sorted(glob.glob(spec, recursive=True))], False
+        else:
+            raise FileNotFoundError(spec)
+        for match in matches:
+            if match.is_file():
+                found[match] = found.get(match, False) or explicit
+    outputs = {default_output(p).resolve() for p in found}
+    return [p for p, explicit in found.items() if explicit or p.resolve() not in outputs]
+
+
+def process_file(path: Path, out_path: Optional[Path] = None, write: bool = True,
+                 use_mmap: bool = False, rerender: bool = False) -> FileReport:
+    """Diagnose and fix one schematic; runs in a worker process in batch mode."""
+    report = FileReport(str(path))
+    timings = report.timings
+    t_start = t = time.perf_counter()
+
+    def lap(phase: str) -> None:
+        nonlocal t
+        now = time.perf_counter()
+        timings[phase] = (now - t) * 1000
+        t = now
 
     try:
-        root = parse(tokenize(text))
-    except ParseError as e:
-        print(f"PARSE ERROR: {e}", file=sys.stderr)
-        return 2
+        with ExitStack() as stack:
+            if use_mmap:
+                text = stack.enter_context(open_source(path))
+            else:
+                text = path.read_text(encoding="utf-8", errors="replace")
+            lap("read")
+            try:
+                root, smap = loads_cst(text)
+            except ParseError as e:
+                report.error = f"PARSE ERROR: {e}"
+                return report
+            lap("parse")
+
+            report.issues = collect_issues(root)
+            lap("diagnose")
+            fixed_root, report.applied = fix_in_place(root)
+            lap("fix")
+
+            if write:
+                if out_path is None:
+                    out_path = default_output(path)
+                # By default only the edited items are rendered; everything else is
+                # copied from the input so the diff shows just the fixes.
+                if rerender:
+                    out_text = render(fixed_root) + "\n"
+                else:
+                    out_text = smap.dumps([fixed_root], render)
+                out_path.write_text(out_text, encoding="utf-8")
+                report.output = str(out_path)
+                lap("write")
+    except OSError as e:
+        report.error = f"I/O ERROR: {e}"
+    finally:
+        timings["total"] = (time.perf_counter() - t_start) * 1000
+    return report
+
 
-    issues = collect_issues(root)
-    if issues:
+def _process_args(args: Tuple[Path, Optional[Path], bool, bool, bool]) -> FileReport:
+    return process_file(*args)
+
+
+def run_batch(paths: List[Path], jobs: int, write: bool = True, use_mmap: bool = False,
+              rerender: bool = False) -> List[FileReport]:
+    """process_file() for every path, across ``jobs`` worker processes."""
+    work = [(path, None, write, use_mmap, rerender) for path in paths]
+    if jobs <= 1 or len(work) <= 1:
+        return [_process_args(w) for w in work]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+        return list(pool.map(_process_args, work))
+
+
+# ------------------------
+# Reports
+# ------------------------
+
+
+def print_file_report(report: FileReport) -> None:
+    """The detailed single-file output."""
+    if report.issues:
         print("Diagnostics:")
-        for it in issues:
+        for it in report.issues:
             print(f"  [{it.code}] {it.message}")
     else:
         print("No issues detected by this limited checker.")
 
-    fixed_root, applied = fix_in_place(root)
-
-    if applied:
+    if report.applied:
         print("\nApplied fixes:")
-        for s in sorted(set(applied)):
+        for s in sorted(set(report.applied)):
             print(f"  - {s}")
     else:
         print("\nNo auto-fixes applied.")
 
-    if args.no_write:
-        return 0
 
-    out_path = args.output
-    if out_path is None:
-        out_path = args.input.with_suffix(".fixed.kicad_sch")
+def print_batch_report(reports: List[FileReport], wall_ms: float) -> None:
+    for report in reports:
+        t = report.timings
+        if report.error:
+            print(f"{report.path}: {report.error} [{t.get('total', 0):.1f} ms]")
+            continue
+        phases = ", ".join(f"{phase} {t[phase]:.1f}" for phase in ("parse", "diagnose", "fix", "write") if phase in t)
+        written = f" -> {report.output}" if report.output else ""
+        print(f"{report.path}: {len(report.issues)} issue(s), {len(report.applied)} fix(es)"
+              f" [{phases}; total {t['total']:.1f} ms]{written}")
+        for code, count in Counter(it.code for it in report.issues).items():
+            print(f"  [{code}] x{count}")
+    failed = sum(1 for r in reports if r.error)
+    print(f"\n{len(reports)} file(s), {sum(len(r.issues) for r in reports)} issue(s), "
+          f"{sum(len(r.applied) for r in reports)} fix(es), {failed} failed; "
+          f"{wall_ms:.1f} ms wall, {sum(r.timings.get('total', 0) for r in reports):.1f} ms in workers")
+
+
+def json_report(reports: List[FileReport], wall_ms: float) -> dict:
+    return {
+        "files": [
+            {
+                "path": r.path,
+                "output": r.output,
+                "error": r.error,
+                "issues": [asdict(it) for it in r.issues],
+                "fixes": sorted(set(r.applied)),
+                "timings_ms": {phase: round(ms, 3) for phase, ms in r.timings.items()},
+            }
+            for r in reports
+        ],
+        "summary": {
+            "files": len(reports),
+            "failed": sum(1 for r in reports if r.error),
+            "issues": sum(len(r.issues) for r in reports),
+            "fixes": sum(len(r.applied) for r in reports),
+            "wall_ms": round(wall_ms, 3),
+        },
+    }
+
+
+# ------------------------
+# CLI
+# ------------------------
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Diagnose and apply conservative fixes to KiCad .kicad_sch s-expr files")
+    ap.add_argument("input", nargs="+", help="Input .kicad_sch file(s), directories or globs")
+    ap.add_argument("-o", "--output", type=Path, default=None,
+                    help="Output path for a single input (default: input.fixed.kicad_sch)")
+    ap.add_argument("--no-write", action="store_true", help="Only print diagnostics; do not write output")
+    ap.add_argument("--mmap", action="store_true", help="Lex a memory map of the input instead of reading it into a str")
+    ap.add_argument("--rerender", action="store_true",
+                    help="Re-render the whole file instead of only the items that were fixed")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="Number of worker processes for several inputs (default: 1, in this process)")
+    ap.add_argument("--json", metavar="PATH", default=None,
+                    help="Also write the consolidated report as JSON ('-' for stdout instead of the text report)")
+    args = ap.parse_args(argv)
+
+    try:
+        paths = expand_inputs(args.input)
+    except FileNotFoundError as e:
+        ap.error(f"no such file, directory or matching glob: {e}")
+    if not paths:
+        ap.error("no .kicad_sch files found")
+    single = len(paths) == 1 and len(args.input) == 1 and Path(args.input[0]).is_file()
+    if args.output is not None and not single:
+        ap.error("-o/--output needs exactly one input file")
+
+    t0 = time.perf_counter()
+    if single:
+        reports = [process_file(paths[0], args.output, not args.no_write, args.mmap, args.rerender)]
+    else:
+        reports = run_batch(paths, args.jobs, not args.no_write, args.mmap, args.rerender)
+    wall_ms = (time.perf_counter() - t0) * 1000
+
+    if args.json == "-":
+        json.dump(json_report(reports, wall_ms), sys.stdout, indent=2)
+        print()
+    elif single:
+        report = reports[0]
+        if report.error:
+            print(report.error, file=sys.stderr)
+            return 2
+        print_file_report(report)
+        if report.output:
+            print(f"\nWrote: {report.output}")
+    else:
+        print_batch_report(reports, wall_ms)
+    if args.json not in (None, "-"):
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(json_report(reports, wall_ms), f, indent=2)
+            f.write("\n")
 
-    out_text = render(fixed_root) + "\n"
-    out_path.write_text(out_text, encoding="utf-8")
-    print(f"\nWrote: {out_path}")
-    return 0
+    return 2 if any(r.error for r in reports) else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+"""netlist.py
+
+Indexed loader for KiCad netlist exports (.net).
+
+Reads both the S-expression export (``(export (version "E") ...)``, as in
+src/device.net) and the legacy XML export (``<export version="D">``, as in
+misc/device.net) into one ``Netlist``. The file is parsed once; pins are then
+kept in flat arrays grouped by net, with a second grouping by component,
+so that:
+
+    netlist.component("U2")         ref -> component           O(1)
+    netlist.pins("VDD_nRF")         net -> its pins            O(degree)
+    netlist.net_of("U2", "39")      (ref, pin) -> net name     O(1)
+    netlist.nets_of("U2")           nets touching a component  O(degree)
+
+Net names can be given as exported ("/VDD_nRF") or without the root sheet
+prefix ("VDD_nRF"); a net code works too.
+"""
+
+from __future__ import annotations
+
+import argparse
+import xml.etree.ElementTree as ET
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sexpr import RawExpr, parse_raw, unescape
+
+
+@dataclass
+class Component:
+    ref: str
+    value: str = ""
+    footprint: str = ""
+    lib: str = ""
+    part: str = ""
+    properties: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Pin:
+    ref: str
+    pin: str
+    pinfunction: Optional[str] = None
+    pintype: Optional[str] = None
+
+
+NetKey = Union[str, int]
+
+
+class Netlist:
+    def __init__(self):
+        self.components: List[Component] = []
+        self.net_names: List[str] = []
+        self.net_codes = array("i")
+        # Pins, grouped by net: net i owns pins net_first[i]:net_first[i + 1].
+        # Pin names, functions and types are indices into self.strings.
+        self.net_first = array("i", [0])
+        self.pin_comp = array("i")
+        self.pin_net = array("i")
+        self.pin_name = array("i")
+        self.pin_func = array("i")
+        self.pin_type = array("i")
+        # The same pins grouped by component: comp_pins[comp_first[c]:comp_first[c + 1]].
+        self.comp_first = array("i")
+        self.comp_pins = array("i")
+        self.strings: List[str] = []
+
+        self._string_ids: Dict[str, int] = {}
+        self._comp_by_ref: Dict[str, int] = {}
+        self._net_by_name: Dict[str, int] = {}
+        self._net_by_code: Dict[int, int] = {}
+        self._net_by_pin: Dict[Tuple[int, str], int] = {}
+
+    # ------------------------
+    # Building
+    # ------------------------
+
+    def _intern(self, s: Optional[str]) -> int:
+        if s is None:
+            return -1
+        idx = self._string_ids.get(s)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(s)
+            self._string_ids[s] = idx
+        return idx
+
+    def _comp_index(self, ref: str) -> int:
+        idx = self._comp_by_ref.get(ref)
+        if idx is None:
+            # Pins may name a component the components section left out.
+            idx = len(self.components)
+            self.components.append(Component(ref))
+            self._comp_by_ref[ref] = idx
+        return idx
+
+    def add_component(self, comp: Component) -> None:
+        idx = self._comp_by_ref.get(comp.ref)
+        if idx is None:
+            self._comp_by_ref[comp.ref] = len(self.components)
+            self.components.append(comp)
+        else:
+            self.components[idx] = comp
+
+    def add_net(self, code: int, name: str, pins: Iterable[Tuple[str, str, Optional[str], Optional[str]]]) -> None:
+        net = len(self.net_names)
+        self.net_names.append(name)
+        self.net_codes.append(code)
+        self._net_by_code[code] = net
+        self._net_by_name[name] = net
+        if name.startswith("/") and name.count("/") == 1:
+            self._net_by_name.setdefault(name[1:], net)
+        for ref, pin, func, ptype in pins:
+            comp = self._comp_index(ref)
+            self.pin_comp.append(comp)
+            self.pin_net.append(net)
+            self.pin_name.append(self._intern(pin))
+            self.pin_func.append(self._intern(func))
+            self.pin_type.append(self._intern(ptype))
+            self._net_by_pin[(comp, pin)] = net
+        self.net_first.append(len(self.pin_comp))
+
+    def finish(self) -> None:
+        """Build the per-component grouping (a counting sort of the pins)."""
+        ncomp = len(self.components)
+        counts = array("i", bytes(4 * (ncomp + 1)))
+        for comp in self.pin_comp:
+            counts[comp + 1] += 1
+        for c in range(ncomp):
+            counts[c + 1] += counts[c]
+        self.comp_first = array("i", counts)
+        fill = array("i", counts[:ncomp])
+        self.comp_pins = array("i", bytes(4 * len(self.pin_comp)))
+        for p, comp in enumerate(self.pin_comp):
+            self.comp_pins[fill[comp]] = p
+            fill[comp] += 1
+
+    # ------------------------
+    # Queries
+    # ------------------------
+
+    def __len__(self) -> int:
+        return len(self.net_names)
+
+    def component(self, ref: str) -> Optional[Component]:
+        idx = self._comp_by_ref.get(ref)
+        return self.components[idx] if idx is not None else None
+
+    def find_net(self, key: NetKey) -> Optional[int]:
+        """Index of the net with the given name or code, or None."""
+        if isinstance(key, int):
+            return self._net_by_code.get(key)
+        return self._net_by_name.get(key)
+
+    def _pin(self, p: int) -> Pin:
+        strings = self.strings
+        func, ptype = self.pin_func[p], self.pin_type[p]
+        return Pin(self.components[self.pin_comp[p]].ref, strings[self.pin_name[p]],
+                   strings[func] if func >= 0 else None, strings[ptype] if ptype >= 0 else None)
+
+    def pins(self, key: NetKey) -> List[Pin]:
+        """Pins on a net, in export order; empty for an unknown net."""
+        net = self.find_net(key)
+        if net is None:
+            return []
+        return [self._pin(p) for p in range(self.net_first[net], self.net_first[net + 1])]
+
+    def net_of(self, ref: str, pin: str) -> Optional[str]:
+        comp = self._comp_by_ref.get(ref)
+        net = self._net_by_pin.get((comp, pin)) if comp is not None else None
+        return self.net_names[net] if net is not None else None
+
+    def component_pins(self, ref: str) -> List[Tuple[Pin, str]]:
+        """(pin, net name) for every connected pin of a component."""
+        comp = self._comp_by_ref.get(ref)
+        if comp is None or not self.comp_first:
+            return []
+        return [(self._pin(p), self.net_names[self.pin_net[p]])
+                for p in self.comp_pins[self.comp_first[comp]:self.comp_first[comp + 1]]]
+
+    def nets_of(self, ref: str) -> List[str]:
+        """Names of the nets touching a component, without repeats."""
+        seen = {}
+        for _, net in self.component_pins(ref):
+            seen.setdefault(net, None)
+        return list(seen)
+
+
+# ------------------------
+# Readers
+# ------------------------
+
+
+def _find(expr: RawExpr, token_name: str) -> Optional[List[RawExpr]]:
+    for child in expr:
+        if isinstance(child, list) and child and child[0] == token_name:
+            return child
+    return None
+
+
+def _find_all(expr: Optional[RawExpr], token_name: str) -> List[List[RawExpr]]:
+    if expr is None:
+        return []
+    return [child for child in expr if isinstance(child, list) and child and child[0] == token_name]
+
+
+def _value(expr: Optional[RawExpr], default: Optional[str] = "") -> Optional[str]:
+    """The first attribute of ``(token value)`` with quotes and escapes resolved."""
+    if expr is None or len(expr) < 2 or isinstance(expr[1], list):
+        return default
+    atom = expr[1]
+    return unescape(atom[1:-1]) if atom.startswith('"') else atom
+
+
+def _read_sexpr(text: str) -> Netlist:
+    netlist = Netlist()
+    items = parse_raw(text)
+    if not items or not isinstance(items[0], list):
+        raise ValueError("No (export ...) list found")
+    root = items[0]
+
+    for comp in _find_all(_find(root, "components"), "comp"):
+        libsource = _find(comp, "libsource") or []
+        netlist.add_component(Component(
+            ref=_value(_find(comp, "ref")),
+            value=_value(_find(comp, "value")),
+            footprint=_value(_find(comp, "footprint")),
+            lib=_value(_find(libsource, "lib")),
+            part=_value(_find(libsource, "part")),
+            properties={_value(_find(prop, "name")): _value(_find(prop, "value"))
+                        for prop in _find_all(comp, "property")},
+        ))
+
+    for net in _find_all(_find(root, "nets"), "net"):
+        pins = [(_value(_find(node, "ref")), _value(_find(node, "pin")),
+                 _value(_find(node, "pinfunction"), None), _value(_find(node, "pintype"), None))
+                for node in _find_all(net, "node")]
+        netlist.add_net(int(_value(_find(net, "code")) or 0), _value(_find(net, "name")), pins)
+
+    netlist.finish()
+    return netlist
+
+
+def _read_xml(text: str) -> Netlist:
+    netlist = Netlist()
+    root = ET.fromstring(text)
+
+    for comp in root.iterfind("components/comp"):
+        libsource = comp.find("libsource")
+        netlist.add_component(Component(
+            ref=comp.get("ref", ""),
+            value=comp.findtext("value", ""),
+            footprint=comp.findtext("footprint", ""),
+            lib=libsource.get("lib", "") if libsource is not None else "",
+            part=libsource.get("part", "") if libsource is not None else "",
+            properties={p.get("name", ""): p.get("value", "") for p in comp.iterfind("property")},
+        ))
+
+    for net in root.iterfind("nets/net"):
+        pins = [(node.get("ref", ""), node.get("pin", ""), node.get("pinfunction"), node.get("pintype"))
+                for node in net.iterfind("node")]
+        netlist.add_net(int(net.get("code", "0")), net.get("name", ""), pins)
+
+    netlist.finish()
+    return netlist
+
+
+def loads(text: str) -> Netlist:
+    """Parse a netlist export, S-expression or XML."""
+    if text.lstrip().startswith("<"):
+        return _read_xml(text)
+    return _read_sexpr(text)
+
+
+def load(path: str) -> Netlist:
+    with open(path, "r", encoding="utf-8") as f:
+        return loads(f.read())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Query the connectivity of a KiCad netlist export")
+    ap.add_argument("input", nargs="?", default='../src/device.net')
+    ap.add_argument("--ref", action="append", default=[], help="List the pins and nets of a component")
+    ap.add_argument("--net", action="append", default=[], help="List the pins on a net (name or code)")
+    args = ap.parse_args()
+
+    netlist = load(args.input)
+    for ref in args.ref:
+        comp = netlist.component(ref)
+        if comp is None:
+            print(f"{ref}: no such component")
+            continue
+        print(f"{ref} ({comp.value}):")
+        for pin, net in netlist.component_pins(ref):
+            func = f" {pin.pinfunction}" if pin.pinfunction else ""
+            print(f"  pin {pin.pin}{func}: {net}")
+    for key in args.net:
+        net = netlist.find_net(int(key) if key.isdigit() else key)
+        if net is None:
+            print(f"{key}: no such net")
+            continue
+        print(f"{netlist.net_names[net]} (code {netlist.net_codes[net]}):")
+        for pin in netlist.pins(netlist.net_codes[net]):
+            func = f" ({pin.pinfunction})" if pin.pinfunction else ""
+            print(f"  {pin.ref}.{pin.pin}{func}")
+    if not args.ref and not args.net:
+        npins = len(netlist.pin_comp)
+        print(f"{len(netlist.components)} components, {len(netlist)} nets, {npins} pins")
@@ -0,0 +1,369 @@
+"""sch_diff.py
+
+Structural diff of two revisions of a schematic, independent of formatting.
+
+Both files are parsed with sexpr.parse_raw and every subtree gets a content
+hash, computed bottom-up (a Merkle tree) in one pass. An atom is hashed by
+its value: ``"x"`` and ``x`` are the same, and so are ``1.270`` and ``1.27``.
+A list hashes its atoms and its child lists as two sequences, so where atoms
+sit among the lists does not count either. Indentation, line breaks, quoting
+and number formatting therefore never show up as changes. reformat_kicad.py's
+reflow is invisible.
+
+Top-level items are matched by their uuid. Items without one are matched by
+head (``paper``, ``title_block``), and lib_symbols by symbol name. Matched
+items with equal hashes are unchanged and are not looked into. Only the
+subtrees whose hashes differ are descended into, pairing children by head,
+and by name where a head repeats (``property "Value"``, ``pin "3"``), to
+find what changed. An item whose own position (its ``at`` or ``pts``)
+changed is reported as moved when every other change is a field following
+it: KiCad keeps field positions in sheet coordinates, so moving a symbol, or
+a label with an Intersheetrefs field, rewrites each field's ``at`` by the
+same shift, turned about the item's origin if the item was rotated. Any
+other change, including moving a field on its own, makes the item modified.
+The whole diff is linear in the size of the two files.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sexpr import RawExpr, parse_raw, unescape
+
+# Heads whose change is a change of position.
+POSITION_HEADS = ("at", "pts", "xy")
+
+_LABELS = ("label", "global_label", "hierarchical_label")
+
+Key = Tuple[str, ...]
+
+
+def atom_value(atom: str) -> str:
+    """What an atom means, whatever way it is written."""
+    if atom.startswith('"'):
+        return unescape(atom[1:-1])
+    if atom[:1] in "+-.0123456789":
+        try:
+            return format(float(atom), ".10g")
+        except ValueError:
+            pass
+    return atom
+
+
+def subtree_hashes(root: RawExpr) -> Dict[int, bytes]:
+    """id(list) -> content hash of that list, for every list in ``root``."""
+    hashes: Dict[int, bytes] = {}
+    # raw atom -> its hashed form; the same atoms come up over and over
+    encoded: Dict[str, bytes] = {}
+    blake2b = hashlib.blake2b
+    # (list, children already hashed?)
+    stack: List[Tuple[list, bool]] = [(root, False)] if isinstance(root, list) else []
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node if isinstance(child, list))
+            continue
+        # Atoms, then lists: where atoms sit between the lists is layout too.
+        parts = []
+        lists = []
+        for child in node:
+            if isinstance(child, list):
+                lists.append(hashes[id(child)])
+                continue
+            atom = encoded.get(child)
+            if atom is None:
+                value = atom_value(child).encode("utf-8")
+                atom = encoded[child] = b"'" + len(value).to_bytes(4, "little") + value
+            parts.append(atom)
+        parts.append(b"(")
+        parts.extend(lists)
+        hashes[id(node)] = blake2b(b"".join(parts), digest_size=16).digest()
+    return hashes
+
+
+def _head(expr: RawExpr) -> str:
+    return expr[0] if isinstance(expr, list) and expr and isinstance(expr[0], str) else ""
+
+
+def _child(expr: list, head: str) -> Optional[list]:
+    for child in expr:
+        if isinstance(child, list) and child and child[0] == head:
+            return child
+    return None
+
+
+def _name(expr: list) -> str:
+    """The name of a list among same-head siblings: its second atom unless
+    that is a number, as in (property "Value" ...) or (pin "3" ...)."""
+    if len(expr) < 2 or isinstance(expr[1], list):
+        return ""
+    atom = expr[1]
+    return atom_value(atom) if atom.startswith('"') or atom[:1] not in "+-.0123456789" else ""
+
+
+def _keyed(expr: list, named: Set[str]) -> Dict[Key, list]:
+    """The list children of ``expr`` by (head, name, occurrence); only the
+    heads in ``named`` have names, the others are told apart by order."""
+    result: Dict[Key, list] = {}
+    seen: Counter = Counter()
+    for child in expr[1:]:
+        if not isinstance(child, list):
+            continue
+        head = _head(child)
+        base = (head, _name(child) if head in named else "")
+        result[base + (str(seen[base]),)] = child
+        seen[base] += 1
+    return result
+
+
+def _repeated_heads(*exprs: list) -> Set[str]:
+    heads: Set[str] = set()
+    for expr in exprs:
+        counts = Counter(_head(child) for child in expr[1:] if isinstance(child, list))
+        heads.update(head for head, n in counts.items() if n > 1)
+    return heads
+
+
+def _label(key: Key) -> str:
+    head, name, n = key
+    text = f'{head} "{name}"' if name else head
+    return text if n == "0" else f"{text}[{n}]"
+
+
+def _atoms(expr: list) -> List[str]:
+    return [atom_value(a) for a in expr[1:] if not isinstance(a, list)]
+
+
+# ------------------------
+# Items
+# ------------------------
+
+
+@dataclass
+class Item:
+    kind: str
+    key: Key
+    expr: list
+
+    @property
+    def name(self) -> str:
+        expr = self.expr
+        if self.kind in _LABELS or self.kind == "lib_symbol":
+            return atom_value(expr[1]) if len(expr) > 1 and isinstance(expr[1], str) else ""
+        if self.kind == "symbol":
+            for prop in expr:
+                if _head(prop) == "property" and len(prop) > 2 and atom_value(prop[1]) == "Reference":
+                    return atom_value(prop[2])
+        if self.kind in ("wire", "bus"):
+            pts = [c for c in _child(expr, "pts") or [] if _head(c) == "xy"]
+            if pts:
+                return " ".join(f"({' '.join(_atoms(p))})" for p in (pts[0], pts[-1]))
+        at = _child(expr, "at")
+        return f"({' '.join(_atoms(at))})" if at else ""
+
+
+def items(root: list) -> Dict[Key, Item]:
+    """The top-level items of a (kicad_sch ...) by match key, lib symbols
+    included one by one."""
+    result: Dict[Key, Item] = {}
+    seen: Counter = Counter()
+
+    def add(kind: str, base: Key, expr: list) -> None:
+        key = base + (str(seen[base]),)
+        seen[base] += 1
+        result[key] = Item(kind, key, expr)
+
+    for expr in root[1:]:
+        if not isinstance(expr, list) or not expr:
+            continue
+        head = _head(expr)
+        if head == "lib_symbols":
+            for sym in expr[1:]:
+                if _head(sym) == "symbol" and len(sym) > 1:
+                    add("lib_symbol", ("lib_symbol", atom_value(sym[1])), sym)
+            continue
+        uuid = _child(expr, "uuid")
+        if uuid is not None and len(uuid) > 1 and isinstance(uuid[1], str):
+            add(head, (head, atom_value(uuid[1])), expr)
+        else:
+            add(head, (head,), expr)
+    return result
+
+
+# ------------------------
+# Diff
+# ------------------------
+
+
+@dataclass
+class Change:
+    status: str  # added, removed, moved, modified
+    kind: str
+    name: str
+    key: Key
+    # what differs inside a moved or modified item, one line each
+    details: List[str] = field(default_factory=list)
+
+
+def changes_within(a: list, b: list, ha: Dict[int, bytes], hb: Dict[int, bytes]) -> List[Tuple[List[str], str]]:
+    """(path, description) of every difference between two lists, descending
+    only into child lists whose hashes differ. Lists that hold the same
+    children in another order are reported as reordered."""
+    found: List[Tuple[List[str], str]] = []
+    stack: List[Tuple[list, list, List[str]]] = [(a, b, [])]
+    while stack:
+        x, y, path = stack.pop()
+        ax, ay = _atoms(x), _atoms(y)
+        if ax != ay:
+            found.append((path, f"{' '.join(ax)} -> {' '.join(ay)}"))
+        named = _repeated_heads(x, y)
+        kx, ky = _keyed(x, named), _keyed(y, named)
+        nested = []
+        for key, cx in kx.items():
+            cy = ky.get(key)
+            if cy is None:
+                found.append((path + [_label(key)], "removed"))
+            elif ha[id(cx)] != hb[id(cy)]:
+                nested.append((cx, cy, path + [_label(key)]))
+        for key in ky:
+            if key not in kx:
+                found.append((path + [_label(key)], "added"))
+        if ax == ay and not nested and len(kx) == len(ky) and all(key in kx for key in ky):
+            found.append((path, "reordered"))
+        stack.extend(reversed(nested))
+    return found
+
+
+def _base_head(label: str) -> str:
+    return label.split(" ")[0].split("[")[0]
+
+
+def _numbers(at: Optional[list]) -> Optional[List[float]]:
+    try:
+        return [float(atom_value(a)) for a in at[1:]] if at is not None else None
+    except ValueError:
+        return None
+
+
+def _placement(old_at: Optional[list], new_at: Optional[list]) -> Optional[Callable[[List[float]], List[float]]]:
+    """Where a point of the item ends up when the item goes from ``old_at``
+    to ``new_at``: the same shift, turned by the change of angle about the
+    item's origin (counter-clockwise on the sheet, whose y axis points down)."""
+    old, new = _numbers(old_at), _numbers(new_at)
+    if not old or not new or len(old) < 2 or len(new) < 2:
+        return None
+    turn = math.radians((new[2] if len(new) > 2 else 0) - (old[2] if len(old) > 2 else 0))
+    cos, sin = round(math.cos(turn), 9), round(math.sin(turn), 9)
+
+    def place(point: List[float]) -> List[float]:
+        dx, dy = point[0] - old[0], point[1] - old[1]
+        return [new[0] + dx * cos + dy * sin, new[1] - dx * sin + dy * cos]
+
+    return place
+
+
+def _moved_only(old: list, new: list, found: List[Tuple[List[str], str]]) -> bool:
+    """Whether the item was only moved: its own position changed, and any
+    other change is a field (property ...) whose ``at`` followed the item.
+    Field positions are absolute, so KiCad rewrites them on every move."""
+    own = [path for path, _ in found if path and _base_head(path[0]) in POSITION_HEADS]
+    if not own:
+        return False
+    rest = [(path, what) for path, what in found if not (path and _base_head(path[0]) in POSITION_HEADS)]
+    if not rest:
+        return True
+    place = _placement(_child(old, "at"), _child(new, "at"))
+    if place is None:
+        return False
+    named = _repeated_heads(old, new)
+    fields_old, fields_new = _keyed(old, named), _keyed(new, named)
+    by_label = {_label(key): key for key in fields_old if key[0] == "property"}
+    turned = _numbers(_child(old, "at"))[2:] != _numbers(_child(new, "at"))[2:]
+    for path, what in rest:
+        key = by_label.get(path[0]) if len(path) == 2 and path[1] == "at" else None
+        if key is None or key not in fields_new:
+            return False
+        before = _numbers(_child(fields_old[key], "at"))
+        after = _numbers(_child(fields_new[key], "at"))
+        if not before or not after or len(before) < 2 or len(after) < 2:
+            return False
+        expected = place(before)
+        if abs(expected[0] - after[0]) > 1e-6 or abs(expected[1] - after[1]) > 1e-6:
+            return False
+        # Unless the item turned, the field keeps its own angle.
+        if not turned and before[2:] != after[2:]:
+            return False
+    return True
+
+
+def diff(old: list, new: list) -> Tuple[List[Change], int]:
+    """(changes, number of unchanged items) between two (kicad_sch ...) trees."""
+    ha, hb = subtree_hashes(old), subtree_hashes(new)
+    before, after = items(old), items(new)
+    changes: List[Change] = []
+    unchanged = 0
+    for key, item in after.items():
+        prev = before.get(key)
+        if prev is None:
+            changes.append(Change("added", item.kind, item.name, key))
+        elif ha[id(prev.expr)] == hb[id(item.expr)]:
+            unchanged += 1
+        else:
+            found = changes_within(prev.expr, item.expr, ha, hb)
+            status = "moved" if _moved_only(prev.expr, item.expr, found) else "modified"
+            details = [f"{'/'.join(path) or '.'}: {what}" for path, what in found]
+            changes.append(Change(status, item.kind, item.name, key, details))
+    for key, item in before.items():
+        if key not in after:
+            changes.append(Change("removed", item.kind, item.name, key))
+    return changes, unchanged
+
+
+def load_tree(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        parsed = parse_raw(f.read())
+    if not parsed or _head(parsed[0]) != "kicad_sch":
+        raise ValueError(f"{path}: no (kicad_sch ...) list found")
+    return parsed[0]
+
+
+_MARKS = {"added": "+", "removed": "-", "moved": ">", "modified": "~"}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Diff two schematic revisions item by item, ignoring formatting")
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Show what changed inside each item")
+    ap.add_argument("--summary", action="store_true", help="Only print the counts")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    old, new = load_tree(args.old), load_tree(args.new)
+    t1 = time.perf_counter()
+    changes, unchanged = diff(old, new)
+    t2 = time.perf_counter()
+
+    if not args.summary:
+        for change in changes:
+            ident = change.key[1] if len(change.key) > 2 and change.kind != "lib_symbol" else ""
+            name = f" {change.name}" if change.name else ""
+            print(f"{_MARKS[change.status]} {change.status:<8} {change.kind}{name}" + (f" [{ident}]" if ident else ""))
+            if args.verbose:
+                for line in change.details:
+                    print(f"      {line}")
+    counts = Counter((c.kind, c.status) for c in changes)
+    kinds = sorted({kind for kind, _ in counts})
+    for kind in kinds:
+        print(f"{kind:<18} " + ", ".join(f"{counts[kind, s]} {s}" for s in _MARKS if counts[kind, s]))
+    print(f"{len(changes)} changed, {unchanged} unchanged items "
+          f"(parsed {(t1 - t0) * 1000:.1f} ms, diffed {(t2 - t1) * 1000:.1f} ms)")
+    if changes:
+        sys.exit(1)
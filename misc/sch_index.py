@@ -0,0 +1,149 @@
+"""sch_index.py
+
+Lazy index of the top-level items of a .kicad_sch file.
+
+Most tools only need to know where each child of (kicad_sch ...) starts and
+ends and what its head is. ItemIndex records exactly that in one
+balanced-paren scan and parses an item's subtree only when asked for it.
+Edits can then be applied as byte splices with ``splice()``, leaving every
+other item exactly as it was written.
+
+The same index works on any list, not just the root: ``children(item)``
+indexes the children of one item (e.g. the symbols inside lib_symbols).
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterator, List, Optional
+
+from sexpr import ParseError, RawExpr, SExpr, Source, as_text, loads, parse_raw
+
+
+# Structure-only version of the sexpr lexer: it stops at parens (capturing the
+# token name that follows an opening one), quoted strings and ';;' comments,
+# and lets the regex engine skip over every other atom.
+_SCAN_PATTERN = r"""
+    "[^"\\]*(?:\\.[^"\\]*)*"
+  | (?<![^\s()]);;[^\n]*
+  | (\()\s*([^\s()"]*)
+  | (\))
+  | (")
+"""
+_SCAN_RE = re.compile(_SCAN_PATTERN, re.VERBOSE | re.DOTALL)
+_SCAN_RE_B = re.compile(_SCAN_PATTERN.encode(), re.VERBOSE | re.DOTALL)
+
+
+class ItemSpan:
+    __slots__ = ("head", "start", "end")
+
+    def __init__(self, head: Optional[str], start: int, end: int):
+        self.head = head
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"ItemSpan({self.head!r}, {self.start}, {self.end})"
+
+
+class ItemIndex:
+    def __init__(self, text: Source, start: int = 0, end: Optional[int] = None):
+        self.text = text
+        self.items: List[ItemSpan] = []
+        self.root_head: Optional[str] = None
+        self.root_start = -1
+        self.root_end = -1
+        self._parsed: Dict[int, RawExpr] = {}
+        self._scan(start, len(text) if end is None else end)
+
+    def _scan(self, start: int, end: int) -> None:
+        text = self.text
+        scan_re = _SCAN_RE if isinstance(text, str) else _SCAN_RE_B
+        items = self.items
+        depth = 0
+        item_start = -1
+        item_head: Optional[str] = None
+
+        for m in scan_re.finditer(text, start, end):
+            group = m.lastindex
+            if group == 2:
+                depth += 1
+                if depth == 2:
+                    item_start = m.start()
+                    item_head = m.group(2)
+                elif depth == 1:
+                    self.root_start = m.start()
+                    self.root_head = m.group(2)
+            elif group == 3:
+                if depth == 2:
+                    items.append(ItemSpan(item_head, item_start, m.end()))
+                elif depth == 1:
+                    self.root_end = m.end()
+                    break
+                depth -= 1
+            elif group == 4:
+                raise ParseError(f"Unterminated string at offset {m.start()}", m.start())
+
+        if self.root_start < 0:
+            raise ParseError("No s-expression found")
+        if self.root_end < 0:
+            raise ParseError("Unclosed '(' at end of file", self.root_start)
+        if not isinstance(text, str):
+            self.root_head = self.root_head.decode("utf-8", errors="replace")
+            for item in items:
+                item.head = item.head.decode("utf-8", errors="replace")
+        if self.root_head == "":
+            self.root_head = None
+        for item in items:
+            if item.head == "":
+                item.head = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[ItemSpan]:
+        return iter(self.items)
+
+    def __getitem__(self, k: int) -> ItemSpan:
+        return self.items[k]
+
+    def find(self, head: str) -> Optional[ItemSpan]:
+        for item in self.items:
+            if item.head == head:
+                return item
+        return None
+
+    def find_all(self, head: str) -> List[ItemSpan]:
+        return [item for item in self.items if item.head == head]
+
+    def raw(self, item: ItemSpan) -> str:
+        """Source text of ``item``, exactly as written."""
+        return as_text(self.text, item.start, item.end)
+
+    def parse(self, item: ItemSpan) -> RawExpr:
+        """Raw-token tree of ``item`` (see sexpr.parse_raw), parsed on first use."""
+        tree = self._parsed.get(item.start)
+        if tree is None:
+            tree = parse_raw(self.raw(item))[0]
+            self._parsed[item.start] = tree
+        return tree
+
+    def typed(self, item: ItemSpan) -> SExpr:
+        """Typed Sym/Str tree of ``item``; not cached."""
+        return loads(self.raw(item))
+
+    def children(self, item: ItemSpan) -> "ItemIndex":
+        """Index of the children of ``item``."""
+        return ItemIndex(self.text, item.start, item.end)
+
+    def splice(self, replacements: Dict[ItemSpan, str]) -> str:
+        """Return the source with each item in ``replacements`` swapped for
+        the given text; everything else is copied through untouched."""
+        pieces = []
+        pos = 0
+        for item in sorted(replacements, key=lambda it: it.start):
+            pieces.append(as_text(self.text, pos, item.start))
+            pieces.append(replacements[item])
+            pos = item.end
+        pieces.append(as_text(self.text, pos, len(self.text)))
+        return "".join(pieces)
@@ -0,0 +1,370 @@
+"""sexpr.py
+
+Shared S-expression lexer/parser for the KiCad helper scripts in misc/.
+
+The whole file is scanned by a single compiled regex (``_LEX_RE``) so tokenizing
+a ~160 KB schematic happens at native regex speed instead of a per-character
+Python loop. Two tree flavours are offered on top of the same lexer:
+
+- ``tokenize()`` / ``parse()``: typed atoms (``Sym`` for bare tokens, ``Str``
+  for quoted strings with escapes resolved) plus (line, col) positions. This is
+  what kicad_sch_debug_fix.py uses.
+- ``raw_tokens()`` / ``parse_tokens()`` / ``parse_raw()``: nested lists of the
+  raw token text, with quoted strings kept verbatim (quotes and escapes
+  included) so they can be dumped back unchanged. This is what the
+  reformat/strip/isolate scripts use, writing trees back out with
+  ``dump_kicad()`` / ``write_kicad()``.
+
+Everything accepts either a str or a bytes-like buffer; ``open_source()``
+hands out a read-only mmap of a file so large inputs are lexed in place.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+
+@dataclass
+class Sym:
+    v: str
+
+
+@dataclass
+class Str:
+    v: str
+
+
+Atom = Union[Sym, Str]
+SExpr = Union[Atom, List["SExpr"]]
+RawExpr = Union[str, List["RawExpr"]]
+Source = Union[str, bytes, mmap.mmap]
+
+
+class ParseError(Exception):
+    def __init__(self, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.offset = offset
+
+
+# Leading whitespace is folded into every match, so finditer() only ever stops
+# on real tokens. ';;' comments are only recognised at a token boundary (as in
+# the schematic header example of the docs); a lone '"' means the string was
+# never terminated. Strings use the unrolled "[^"\\]*(?:\\.[^"\\]*)*" form so a
+# long string doesn't cost the regex engine one backtrack point per character.
+_LEX_PATTERN = r"""\s*(?:
+        (?P<COMMENT>;;[^\n]*)
+      | (?P<LPAR>\()
+      | (?P<RPAR>\))
+      | (?P<STR>"[^"\\]*(?:\\.[^"\\]*)*")
+      | (?P<SYM>[^\s()"]+)
+      | (?P<BAD>")
+    )"""
+_RAW_TOKEN_PATTERN = r'"[^"\\]*(?:\\.[^"\\]*)*"?|[()]|[^\s()"]+'
+
+# Every pattern is compiled twice: for str input and for bytes-like input
+# (bytes or an mmap, see open_source()), which is scanned in place.
+_LEX_RE = re.compile(_LEX_PATTERN, re.VERBOSE | re.DOTALL)
+_LEX_RE_B = re.compile(_LEX_PATTERN.encode(), re.VERBOSE | re.DOTALL)
+_RAW_TOKEN_RE = re.compile(_RAW_TOKEN_PATTERN, re.DOTALL)
+_RAW_TOKEN_RE_B = re.compile(_RAW_TOKEN_PATTERN.encode(), re.DOTALL)
+_NEWLINE_RE = re.compile("\n")
+_NEWLINE_RE_B = re.compile(b"\n")
+_UNESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+
+
+def unescape(body: str) -> str:
+    """Resolve backslash escapes inside a quoted string body."""
+    if "\\" not in body:
+        return body
+    return _UNESCAPE_RE.sub(r"\1", body)
+
+
+@contextmanager
+def open_source(path: Union[str, "os.PathLike[str]"], use_mmap: bool = True) -> Iterator[Source]:
+    """Yield the contents of ``path`` for the lexer.
+
+    With ``use_mmap`` this is a read-only memory map of the file, so lexing
+    works on the page cache without a decoded copy of the whole file; only
+    the tokens a caller actually looks at get decoded (see as_text()).
+    Otherwise the file is read into a str as usual.
+    """
+    if not use_mmap:
+        with open(path, "r", encoding="utf-8") as f:
+            yield f.read()
+        return
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files.
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def as_text(text: Source, start: int, end: int) -> str:
+    """``text[start:end]`` as a str, decoding it if ``text`` is bytes-like."""
+    if isinstance(text, str):
+        return text[start:end]
+    return text[start:end].decode("utf-8", errors="replace")
+
+
+def literal(text: Source, s: str) -> Union[str, bytes]:
+    """``s`` in the same flavour as ``text``, for slice comparisons."""
+    return s if isinstance(text, str) else s.encode()
+
+
+class LineIndex:
+    """Maps offsets to 1-based (line, col).
+
+    Line start offsets are collected in one pass; each lookup bisects over
+    them, so positions can be resolved lazily for just the tokens that are
+    reported instead of being tracked for every character. For bytes-like
+    input offsets and columns are in bytes.
+    """
+
+    def __init__(self, text: Source):
+        newline_re = _NEWLINE_RE if isinstance(text, str) else _NEWLINE_RE_B
+        self.starts = array("L", [0])
+        self.starts.extend(m.end() for m in newline_re.finditer(text))
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self.starts, offset)
+
+    def line_col(self, offset: int) -> Tuple[int, int]:
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+
+def lex(text: Source, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Tuple[str, int, int]]:
+    """Yield (kind, start, end) offsets. kind in: LPAR, RPAR, SYM, STR.
+
+    Comments are skipped. STR spans include the surrounding quotes. Only
+    ``text[pos:endpos]`` is scanned, but offsets stay relative to ``text``.
+    """
+    lex_re = _LEX_RE if isinstance(text, str) else _LEX_RE_B
+    if endpos is None:
+        endpos = len(text)
+    for m in lex_re.finditer(text, pos, endpos):
+        kind = m.lastgroup
+        if kind == "COMMENT":
+            continue
+        start = m.start(kind)
+        if kind == "BAD":
+            raise ParseError(f"Unterminated string at offset {start}", start)
+        yield (kind, start, m.end())
+
+
+def tokenize(text: Source) -> Iterator[Tuple[str, str, int, int]]:
+    """Yield (kind, value, line, col). kind in: LPAR, RPAR, SYM, STR.
+
+    STR values have their quotes stripped and escapes resolved. Lines and
+    columns are 1-based; columns count characters (bytes for bytes-like
+    input).
+    """
+    lex_re = _LEX_RE if isinstance(text, str) else _LEX_RE_B
+    starts = LineIndex(text).starts
+    line = 1
+    nlines = len(starts)
+    next_start = starts[1] if nlines > 1 else len(text) + 1
+    for m in lex_re.finditer(text):
+        kind = m.lastgroup
+        start = m.start(kind)
+        while start >= next_start:
+            line += 1
+            next_start = starts[line] if line < nlines else len(text) + 1
+        col = start - starts[line - 1] + 1
+        if kind == "COMMENT":
+            continue
+        if kind == "STR":
+            yield ("STR", unescape(as_text(text, start + 1, m.end() - 1)), line, col)
+        elif kind == "SYM":
+            yield ("SYM", as_text(text, start, m.end()), line, col)
+        elif kind == "BAD":
+            raise ParseError(f"Unterminated string at {line}:{col}", start)
+        else:
+            yield (kind, "(" if kind == "LPAR" else ")", line, col)
+
+
+def parse(tokens: Iterable[Tuple[str, str, int, int]]) -> SExpr:
+    stack: List[List[SExpr]] = []
+    current: List[SExpr] = []
+    started = False
+
+    for kind, val, line, col in tokens:
+        if kind == "LPAR":
+            started = True
+            stack.append(current)
+            current = []
+        elif kind == "RPAR":
+            if not stack:
+                raise ParseError(f"Unexpected ')' at {line}:{col}")
+            finished = current
+            current = stack.pop()
+            current.append(finished)
+        elif kind == "SYM":
+            current.append(Sym(val))
+        elif kind == "STR":
+            current.append(Str(val))
+        else:
+            raise ParseError(f"Unknown token kind {kind}")
+
+    if stack:
+        raise ParseError("Unclosed '(' at end of file")
+    if not started:
+        raise ParseError("No s-expression found")
+
+    # Typical KiCad files have a single top-level list.
+    if len(current) != 1 or not isinstance(current[0], list):
+        raise ParseError("Expected a single top-level s-expression list")
+    return current[0]
+
+
+def loads(text: Source) -> SExpr:
+    """Parse ``text`` into a typed (Sym/Str) tree."""
+    return parse(tokenize(text))
+
+
+# ------------------------
+# Raw-token trees
+# ------------------------
+
+
+def raw_tokens(text: Source) -> Iterable[str]:
+    """Return the raw token strings of ``text``: '(', ')', barewords and
+    quoted strings with their quotes and escapes kept verbatim.
+
+    Bytes-like input is decoded one token at a time as it is consumed.
+    """
+    if isinstance(text, str):
+        return _RAW_TOKEN_RE.findall(text)
+    return (m.group().decode("utf-8", errors="replace") for m in _RAW_TOKEN_RE_B.finditer(text))
+
+
+def parse_tokens(tokens: Iterable[str]) -> List[RawExpr]:
+    """Build nested lists from raw tokens; returns the list of top-level items."""
+    stack: List[List[RawExpr]] = [[]]
+    current = stack[0]
+    for token in tokens:
+        if token == "(":
+            child: List[RawExpr] = []
+            current.append(child)
+            stack.append(child)
+            current = child
+        elif token == ")":
+            if len(stack) > 1:
+                stack.pop()
+                current = stack[-1]
+            else:
+                raise ValueError("Too many closing parentheses")
+        else:
+            current.append(token)
+    if len(stack) > 1:
+        raise ValueError("Too many opening parentheses")
+    return stack[0]
+
+
+def parse_raw(text: Source) -> List[RawExpr]:
+    """Parse ``text`` into raw-token lists; returns the list of top-level items."""
+    return parse_tokens(raw_tokens(text))
+
+
+def from_raw(expr: RawExpr) -> SExpr:
+    """Convert a raw-token tree (see parse_raw) into a typed Sym/Str tree."""
+    if not isinstance(expr, list):
+        return Str(unescape(expr[1:-1])) if expr.startswith('"') else Sym(expr)
+    root: List[SExpr] = []
+    # (raw list being read, typed list being filled) for every open list
+    stack = [(iter(expr), root)]
+    while stack:
+        it, dest = stack[-1]
+        for x in it:
+            if x.__class__ is list:
+                sub: List[SExpr] = []
+                dest.append(sub)
+                stack.append((iter(x), sub))
+                break
+            dest.append(Str(unescape(x[1:-1])) if x.startswith('"') else Sym(x))
+        else:
+            stack.pop()
+    return root
+
+
+# ------------------------
+# Writing raw-token trees
+# ------------------------
+
+# KiCad 9 packs the (xy ...) points of a (pts ...) list onto shared lines,
+# starting a new line once the current one has reached this column.
+_XY_WRAP_COLUMN = 99
+
+
+def _emit_kicad(expr: RawExpr, indent: int, write: Callable[[str], object]) -> None:
+    if not isinstance(expr, list):
+        write(expr)
+        return
+    for x in expr:
+        if x.__class__ is list:
+            break
+    else:
+        write("\t" * indent + "(" + " ".join(expr) + ")")
+        return
+
+    write("\t" * indent + "(" + " ".join([x for x in expr if x.__class__ is not list]))
+    # One frame per list still open: [its children, its indent, whether its
+    # (xy ...) children are packed, column reached on the current line or -1].
+    stack = [[iter(expr), indent, expr[0] == "pts", -1]]
+    while stack:
+        frame = stack[-1]
+        it, level, pack_xy, column = frame
+        pad = "\t" * (level + 1)
+        for child in it:
+            if child.__class__ is not list:
+                continue
+            # Atom-only children (most of them) are written here without
+            # opening a frame.
+            for x in child:
+                if x.__class__ is list:
+                    break
+            else:
+                line = "(" + " ".join(child) + ")"
+                if pack_xy and child and child[0] == "xy":
+                    if 0 <= column < _XY_WRAP_COLUMN:
+                        write(" " + line)
+                        column += 1 + len(line)
+                        continue
+                    column = len(pad) + len(line)
+                else:
+                    column = -1
+                write("\n" + pad + line)
+                continue
+            write("\n" + pad + "(" + " ".join([x for x in child if x.__class__ is not list]))
+            frame[3] = -1
+            stack.append([iter(child), level + 1, child[0] == "pts", -1])
+            break
+        else:
+            stack.pop()
+            write("\n" + "\t" * level + ")")
+
+
+def dump_kicad(expr: RawExpr, indent: int = 0) -> str:
+    """Render a raw-token tree the way KiCad 9 lays out its files.
+
+    Lists of atoms only go on one line; otherwise the atoms follow the head
+    and every child list gets a line of its own, one tab deeper, with the
+    closing paren back at the list's own indentation.
+    """
+    parts: List[str] = []
+    _emit_kicad(expr, indent, parts.append)
+    return "".join(parts)
+
+
+def write_kicad(f: TextIO, expr: RawExpr, indent: int = 0) -> None:
+    """Stream ``dump_kicad(expr, indent)`` to the text file ``f``."""
+    _emit_kicad(expr, indent, f.write)
@@ -0,0 +1,373 @@
+"""uuid_index.py
+
+uuid -> where it is, for every .kicad_sch and .net file of the project.
+
+ERC reports, kicad_sch_debug_fix.py's uuid diagnostics and isolate_error.py
+all name items by uuid. ``scan()`` indexes a file in one pass, using the same
+kind of structure-only regex scan as sch_index.py. Each ``(uuid ...)``, and
+each netlist ``(tstamps ...)`` (``<tstamp>`` in the legacy XML export), is
+recorded with:
+
+    head, start, end, line, col    the list that holds it, e.g. a (pin ...)
+                                   of a placed symbol, with its byte span and
+                                   where it starts (1-based line and byte
+                                   column)
+    item, item_start, item_end,    the top-level item containing it, e.g.
+    item_line                      that (symbol ...); for the sheet's own
+                                   (uuid ...), the root (kicad_sch ...)
+
+Sheet paths (``"/uuid/uuid"``) are references, not items, and are skipped. A
+truncated file is indexed as far as it goes; lists left open end at EOF.
+
+The index is kept in a binary sidecar next to each file (``<file>.uuidx``).
+The sidecar is reused only while the SHA-256 of the file's content matches
+the one it was built from. ``ProjectIndex`` loads every file under the given
+paths and flags duplicate uuids: the same uuid in two schematics (or twice in
+one), or twice in one netlist. A netlist repeating its schematic's symbol
+uuids is how exports link back, so that is not flagged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EXTENSIONS = (".kicad_sch", ".net")
+
+_SIDECAR_MAGIC = b"uuidx 2\n"
+
+# mkstemp creates its files 0600; saved files get the usual 0644 less the
+# umask. Reading the umask means setting it, so that is done once, here.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_SCAN_RE = re.compile(rb"""
+    "[^"\\]*(?:\\.[^"\\]*)*"
+  | (?<![^\s()]);;[^\n]*
+  | \(\s*([^\s()"]*)
+  | (\))
+""", re.VERBOSE | re.DOTALL)
+
+# The value after (uuid / (tstamps: a uuid or a legacy 8-digit timestamp.
+_UUID_VALUE = rb'([0-9A-Fa-f]{8}(?:-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12}|[0-9A-Fa-f]{8})'
+_VALUE_RE = re.compile(rb'\s*"?' + _UUID_VALUE + rb'"?\s*\)')
+_XML_RE = re.compile(rb"<(/?)([A-Za-z_][\w.:-]*)[^>]*?(/?)>")
+_XML_VALUE_RE = re.compile(rb"\s*" + _UUID_VALUE + rb"\s*<")
+
+UUID_HEADS = (b"uuid", b"tstamp", b"tstamps")
+
+
+@dataclass
+class UuidSpan:
+    uuid: str
+    head: str
+    start: int
+    end: int
+    line: int
+    col: int
+    item: str
+    item_start: int
+    item_end: int
+    item_line: int
+
+
+class UuidIndex:
+    # Columns, one row per uuid occurrence in file order; heads are interned.
+    _NUMBERS = ("head", "start", "end", "line", "col", "item", "item_start", "item_end", "item_line")
+
+    def __init__(self, digest: str = ""):
+        self.digest = digest
+        self.uuids: List[str] = []
+        self.heads: List[str] = []
+        self._head_ids: Dict[str, int] = {}
+        for name in self._NUMBERS:
+            setattr(self, name, array("I"))
+        self._rows: Optional[Dict[str, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    def _head_id(self, head: str) -> int:
+        n = self._head_ids.get(head)
+        if n is None:
+            n = self._head_ids[head] = len(self.heads)
+            self.heads.append(head)
+        return n
+
+    def __getitem__(self, n: int) -> UuidSpan:
+        return UuidSpan(self.uuids[n], self.heads[self.head[n]], self.start[n], self.end[n], self.line[n],
+                        self.col[n], self.heads[self.item[n]], self.item_start[n], self.item_end[n],
+                        self.item_line[n])
+
+    def rows(self) -> Dict[str, List[int]]:
+        """uuid -> its rows, built on first use."""
+        if self._rows is None:
+            self._rows = {}
+            for n, uuid in enumerate(self.uuids):
+                self._rows.setdefault(uuid, []).append(n)
+        return self._rows
+
+    def find(self, uuid: str) -> List[UuidSpan]:
+        return [self[n] for n in self.rows().get(uuid.lower(), ())]
+
+    # ------------------------
+    # Sidecar
+    # ------------------------
+
+    def save(self, path: str) -> None:
+        """Write the index to ``path`` atomically."""
+        blocks = ["\0".join(self.uuids).encode("ascii"), "\0".join(self.heads).encode("utf-8")]
+        blocks.extend(getattr(self, name).tobytes() for name in self._NUMBERS)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_SIDECAR_MAGIC)
+            f.write(self.digest.encode("ascii") + b"\n")
+            for block in blocks:
+                f.write(struct.pack("<Q", len(block)))
+                f.write(block)
+        os.chmod(tmp, 0o644 & ~_UMASK)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_sidecar(cls, path: str, digest: str) -> Optional["UuidIndex"]:
+        """The index saved at ``path``, or None if it is missing, unreadable
+        or was built from other content."""
+        try:
+            with open(path, "rb") as f:
+                if f.readline() != _SIDECAR_MAGIC:
+                    return None
+                if f.readline().rstrip(b"\n").decode("ascii") != digest:
+                    return None
+                data = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        blocks = []
+        pos = 0
+        while pos + 8 <= len(data):
+            (size,) = struct.unpack_from("<Q", data, pos)
+            pos += 8
+            blocks.append(data[pos:pos + size])
+            pos += size
+        # A truncated file leaves a short last block or a partial length.
+        if len(blocks) != 2 + len(cls._NUMBERS) or pos != len(data):
+            return None
+
+        index = cls(digest)
+        try:
+            index.uuids = blocks[0].decode("ascii").split("\0") if blocks[0] else []
+            index.heads = blocks[1].decode("utf-8").split("\0") if blocks[1] else []
+            index._head_ids = {head: n for n, head in enumerate(index.heads)}
+            for name, block in zip(cls._NUMBERS, blocks[2:]):
+                numbers = array("I")
+                numbers.frombytes(block)
+                if len(numbers) != len(index.uuids):
+                    return None
+                setattr(index, name, numbers)
+        except (UnicodeDecodeError, ValueError):
+            return None
+        return index
+
+
+# ------------------------
+# Scanning
+# ------------------------
+
+
+def _finish(index: UuidIndex, data: bytes, found: List[Tuple[bytes, list, list]]) -> UuidIndex:
+    """Fill the index from (uuid, owner frame, top-level frame) triples, a
+    frame being [head, start, end]."""
+    newlines = array("I", (m.start() for m in re.finditer(rb"\n", data)))
+
+    def line_col(offset: int) -> Tuple[int, int]:
+        line = bisect_right(newlines, offset - 1)
+        return line + 1, offset - (newlines[line - 1] if line else -1)
+
+    size = len(data)
+    for value, owner, top in found:
+        index.uuids.append(value.decode("ascii").lower())
+        line, col = line_col(owner[1])
+        index.head.append(index._head_id(owner[0].decode("utf-8", errors="replace")))
+        index.start.append(owner[1])
+        index.end.append(owner[2] if owner[2] >= 0 else size)
+        index.line.append(line)
+        index.col.append(col)
+        index.item.append(index._head_id(top[0].decode("utf-8", errors="replace")))
+        index.item_start.append(top[1])
+        index.item_end.append(top[2] if top[2] >= 0 else size)
+        index.item_line.append(line_col(top[1])[0])
+    return index
+
+
+def _scan_sexpr(data: bytes) -> List[Tuple[bytes, list, list]]:
+    found = []
+    # Open lists, outermost first; each is [head, start, end].
+    stack: List[list] = []
+    for m in _SCAN_RE.finditer(data):
+        group = m.lastindex
+        if group == 1:
+            head = m.group(1)
+            if head in UUID_HEADS and stack:
+                value = _VALUE_RE.match(data, m.end())
+                if value:
+                    # A uuid directly under the root is the file's own.
+                    found.append((value.group(1), stack[-1], stack[1] if len(stack) > 1 else stack[0]))
+            stack.append([head, m.start(), -1])
+        elif group == 2 and stack:
+            stack.pop()[2] = m.end()
+    return found
+
+
+def _scan_xml(data: bytes) -> List[Tuple[bytes, list, list]]:
+    found = []
+    stack: List[list] = []
+    for m in _XML_RE.finditer(data):
+        closing, tag, empty = m.group(1), m.group(2), m.group(3)
+        if closing:
+            # Close up to the matching tag; unbalanced ones end here too.
+            while stack:
+                frame = stack.pop()
+                frame[2] = m.end()
+                if frame[0] == tag:
+                    break
+        elif not empty:
+            if tag in UUID_HEADS and stack:
+                value = _XML_VALUE_RE.match(data, m.end())
+                if value:
+                    found.append((value.group(1), stack[-1], stack[1] if len(stack) > 1 else stack[0]))
+            stack.append([tag, m.start(), -1])
+    return found
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def scan(data: bytes, file_digest: str = "") -> UuidIndex:
+    """Index of one .kicad_sch or .net file's content (S-expression or XML)."""
+    index = UuidIndex(file_digest or digest(data))
+    xml = data.lstrip()[:1] == b"<"
+    return _finish(index, data, _scan_xml(data) if xml else _scan_sexpr(data))
+
+
+def sidecar_path(path: str) -> str:
+    return path + ".uuidx"
+
+
+def load(path: str, sidecar: Optional[str] = "") -> UuidIndex:
+    """Index of ``path``; reuses or refreshes the sidecar (default
+    ``<path>.uuidx``, None to skip it)."""
+    if sidecar == "":
+        sidecar = sidecar_path(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    file_digest = digest(data)
+    if sidecar is not None:
+        index = UuidIndex.load_sidecar(sidecar, file_digest)
+        if index is not None:
+            return index
+    index = scan(data, file_digest)
+    if sidecar is not None:
+        try:
+            index.save(sidecar)
+        except OSError:
+            pass
+    return index
+
+
+# ------------------------
+# Project
+# ------------------------
+
+
+def project_files(paths: Iterable[str]) -> List[str]:
+    """The .kicad_sch/.net files among ``paths``, directories searched
+    recursively (hidden ones skipped)."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for directory, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            files.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith(EXTENSIONS))
+    return files
+
+
+class ProjectIndex:
+    def __init__(self, paths: Iterable[str], sidecars: bool = True):
+        self.files: Dict[str, UuidIndex] = {}
+        for path in project_files(paths):
+            self.files[os.path.normpath(path)] = load(path, "" if sidecars else None)
+        self._where: Optional[Dict[str, List[Tuple[str, int]]]] = None
+
+    def where(self) -> Dict[str, List[Tuple[str, int]]]:
+        """uuid -> (file, row) of every occurrence, built on first use."""
+        if self._where is None:
+            self._where = {}
+            for path, index in self.files.items():
+                for n, uuid in enumerate(index.uuids):
+                    self._where.setdefault(uuid, []).append((path, n))
+        return self._where
+
+    def find(self, uuid: str) -> List[Tuple[str, UuidSpan]]:
+        return [(path, self.files[path][n]) for path, n in self.where().get(uuid.lower(), ())]
+
+    def duplicates(self) -> Dict[str, List[Tuple[str, int]]]:
+        """uuid -> its occurrences, for the uuids used more than once."""
+        result = {}
+        for uuid, places in self.where().items():
+            if len(places) < 2:
+                continue
+            schematics = [p for p in places if p[0].endswith(".kicad_sch")]
+            netlists = [path for path, _ in places if not path.endswith(".kicad_sch")]
+            if len(schematics) > 1 or len(set(netlists)) < len(netlists):
+                result[uuid] = places
+        return result
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Index every uuid of the project's .kicad_sch/.net files and flag duplicates")
+    ap.add_argument("paths", nargs="*", default=[".."], help="Files or directories (default: the project)")
+    ap.add_argument("--find", action="append", default=[], metavar="UUID", help="Locate this uuid")
+    ap.add_argument("--no-sidecar", action="store_true", help="Neither read nor write the .uuidx sidecars")
+    ap.add_argument("-v", "--verbose", action="store_true", help="List every duplicate uuid")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    project = ProjectIndex(args.paths, not args.no_sidecar)
+    t1 = time.perf_counter()
+    total = sum(len(index) for index in project.files.values())
+    print(f"{total} uuids in {len(project.files)} files (indexed in {(t1 - t0) * 1000:.1f} ms)")
+
+    for uuid in args.find:
+        found = project.find(uuid)
+        print(f"{uuid}: {len(found) or 'not found'}")
+        for path, span in found:
+            inside = f" in ({span.item} ...) at line {span.item_line}" if span.item_start != span.start else ""
+            print(f"  {path}:{span.line}:{span.col}: ({span.head} ...) bytes {span.start}-{span.end}{inside}")
+
+    dups = project.duplicates()
+    if dups:
+        pairs: Dict[Tuple[str, ...], int] = {}
+        for places in dups.values():
+            key = tuple(sorted({path for path, _ in places}))
+            pairs[key] = pairs.get(key, 0) + 1
+        print(f"{len(dups)} duplicate uuids:")
+        for files, count in sorted(pairs.items(), key=lambda kv: -kv[1]):
+            print(f"  {count:6} shared by {', '.join(files)}")
+        if args.verbose:
+            for uuid, places in dups.items():
+                print(f"  {uuid}: " + ", ".join(f"{path}:{project.files[path].line[n]}" for path, n in places))
+        sys.exit(1)